@@ -118,6 +118,8 @@ st.markdown("""
 # Importer les modules existants
 from week2_architect_agent import analyze_csv, generate_report_plan
 from table_formatter import TableFormatter
+from dataset_handle import read_dataset
+from data_profiler import profile_dataframe, get_dataset_profile
 
 
 # Workflow Manager
@@ -208,6 +210,7 @@ try:
     from e2b_session_manager import (
         get_sandbox_for_user,
         execute_python_code,
+        prefetch_sandbox_for_user,
         display_session_status_in_streamlit,
         session_manager
     )
@@ -420,8 +423,7 @@ def json_to_editable_text(plan: dict) -> str:
 def text_to_json_with_ai(text: str) -> dict:
     """Parse le texte modifié et génère un JSON valide avec l'IA"""
     
-    from google.genai import Client as GminiClient
-    from langchain_anthropic import ChatAnthropic
+    from llm_providers import get_provider
     
     # AGENT PARSER
     parse_prompt = f"""
@@ -469,35 +471,18 @@ Retourne UNIQUEMENT le JSON, sans markdown.
     
     if gmini_key:
         try:
-            gclient = GminiClient(api_key=gmini_key)
-            chat = gclient.chats.create(model="gemini-2.5-flash")
-            gres = chat.send_message(parse_prompt)
-            
-            gen = None
-            if hasattr(gres, "candidates") and gres.candidates:
-                first = gres.candidates[0]
-                if hasattr(first, "content"):
-                    gen = first.content
-                    if not isinstance(gen, str) and hasattr(gen, "parts"):
-                        parts = getattr(gen, "parts") or []
-                        texts = [getattr(p, "text", "") for p in parts if getattr(p, "text", None)]
-                        gen = "\n".join(texts).strip()
-            
-            if gen:
-                parsed_json = str(gen)
+            parsed_json = get_provider("genai").generate(parse_prompt, model="gemini-2.5-flash")
         except Exception as e:
             st.error(f"Erreur Gemini: {e}")
     
     # Fallback Anthropic
     if not parsed_json:
         try:
-            llm = ChatAnthropic(
+            parsed_json = get_provider("anthropic").generate(
+                parse_prompt,
                 model="claude-sonnet-4-20250514",
-                api_key=os.getenv("ANTHROPIC_API_KEY"),
                 temperature=0.1
             )
-            response = llm.invoke(parse_prompt)
-            parsed_json = response.content
         except Exception as e:
             raise Exception(f"Erreur parsing: {e}")
     
@@ -621,33 +606,22 @@ FORMAT DE SORTIE (JSON) :
 Retourne UNIQUEMENT le JSON, sans texte avant ou après.
 """
     
+    from llm_providers import get_provider
+    
     # Appeler l'IA (Gemini ou Claude)
     try:
         # Essayer Gemini d'abord
-        import google.generativeai as genai
-        
-        genai.configure(api_key=os.getenv("GMINI_API_KEY"))
         model_name = os.getenv("GEMINI_MODEL_PLAN", "gemini-2.5-flash")
-        model = genai.GenerativeModel(model_name)
-        #model = genai.GenerativeModel("gemini-2.0-flash-exp")
-        
-        response = model.generate_content(prompt)
-        result_text = response.text
+        result_text = get_provider("gemini").generate(prompt, model=model_name)
         
     except Exception as e:
         # Fallback Claude
         try:
-            from anthropic import Anthropic
-            
-            client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-            
-            response = client.messages.create(
+            result_text = get_provider("anthropic").generate(
+                prompt,
                 model="claude-3-5-sonnet-20241022",
-                max_tokens=4000,
-                messages=[{"role": "user", "content": prompt}]
+                max_tokens=4000
             )
-            
-            result_text = response.content[0].text
         
         except Exception as e2:
             raise Exception(f"Échec Gemini et Claude. Gemini: {e}, Claude: {e2}")
@@ -926,15 +900,26 @@ def plan_to_pdf(plan: dict) -> bytes:
         raise Exception(f"Erreur lors de la génération du PDF: {e}")
 
 
-def analyze_data_quality(df: pd.DataFrame) -> dict:
+def session_dataset_profile(df: pd.DataFrame):
+    """Profil du dataset de la session (calculé à l'upload), ou profil du DataFrame fourni"""
+    profile = st.session_state.get('dataset_profile')
+    if profile is not None and df is st.session_state.get('csv_data'):
+        return profile
+    return profile_dataframe(df)
+
+
+def analyze_data_quality(df: pd.DataFrame, profile=None) -> dict:
     """Analyse détaillée de la qualité des données"""
     
+    # Statistiques calculées en quelques passes vectorisées (profil partagé)
+    profile = profile or session_dataset_profile(df)
+    
     analysis = {
         'shape': df.shape,
         'columns': list(df.columns),
-        'dtypes': df.dtypes.to_dict(),
-        'numeric_cols': list(df.select_dtypes(include=['number']).columns),
-        'categorical_cols': list(df.select_dtypes(include=['object', 'category']).columns),
+        'dtypes': profile.dtypes,
+        'numeric_cols': profile.numeric_columns,
+        'categorical_cols': profile.categorical_columns,
         'missing_values': {},
         'numeric_stats': {},
         'categorical_stats': {}
@@ -942,43 +927,42 @@ def analyze_data_quality(df: pd.DataFrame) -> dict:
     
     # Valeurs manquantes
     for col in df.columns:
-        missing_count = df[col].isnull().sum()
-        missing_pct = (missing_count / len(df)) * 100
         analysis['missing_values'][col] = {
-            'count': int(missing_count),
-            'percentage': round(missing_pct, 2)
+            'count': int(profile.missing[col]),
+            'percentage': profile.missing_percentage(col)
         }
     
     # Statistiques numériques
     for col in analysis['numeric_cols']:
+        stats = profile.numeric_stats[col]
+        has_values = stats['count'] > 0
         analysis['numeric_stats'][col] = {
-            'count': int(df[col].count()),
-            'mean': round(df[col].mean(), 2) if df[col].count() > 0 else None,
-            'std': round(df[col].std(), 2) if df[col].count() > 0 else None,
-            'min': round(df[col].min(), 2) if df[col].count() > 0 else None,
-            'q25': round(df[col].quantile(0.25), 2) if df[col].count() > 0 else None,
-            'median': round(df[col].median(), 2) if df[col].count() > 0 else None,
-            'q75': round(df[col].quantile(0.75), 2) if df[col].count() > 0 else None,
-            'max': round(df[col].max(), 2) if df[col].count() > 0 else None
+            'count': int(stats['count']),
+            **{
+                key: round(stats[key], 2) if has_values else None
+                for key in ['mean', 'std', 'min', 'q25', 'median', 'q75', 'max']
+            }
         }
     
     # Statistiques catégorielles
     for col in analysis['categorical_cols']:
-        value_counts = df[col].value_counts()
         analysis['categorical_stats'][col] = {
-            'unique_values': int(df[col].nunique()),
-            'most_common': value_counts.head(10).to_dict(),
-            'count': int(df[col].count())
+            'unique_values': int(profile.unique_counts[col]),
+            'most_common': profile.top_values(col).to_dict(),
+            'count': int(profile.n_rows - profile.missing[col])
         }
     
     return analysis
 
 
-def display_data_overview(df: pd.DataFrame):
+def display_data_overview(df: pd.DataFrame, profile=None):
     """Affiche un aperçu détaillé des données"""
     
     st.markdown("### Aperçu général des données")
     
+    # Toutes les statistiques des onglets en une fois (profil partagé)
+    profile = profile or session_dataset_profile(df)
+    
     # Dimensions
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -986,7 +970,7 @@ def display_data_overview(df: pd.DataFrame):
     with col2:
         st.metric("Nombre de colonnes", len(df.columns))
     with col3:
-        missing_total = df.isnull().sum().sum()
+        missing_total = sum(profile.missing.values())
         missing_pct = (missing_total / (len(df) * len(df.columns))) * 100
         st.metric("Valeurs manquantes", f"{missing_pct:.1f}%")
     
@@ -1009,19 +993,23 @@ def display_data_overview(df: pd.DataFrame):
             'Variable': df.columns,
             'Type': df.dtypes.astype(str),
             'Valeurs non-nulles': df.count().values,
-            'Valeurs uniques': [df[col].nunique() for col in df.columns]
+            'Valeurs uniques': [profile.unique_counts[col] for col in df.columns]
         })
         st.dataframe(type_df, use_container_width=True)
     
     with tab2:
-        numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+        numeric_cols = profile.numeric_columns
         
         if numeric_cols:
             st.markdown(f"#### Variables quantitatives ({len(numeric_cols)})")
             
             for col in numeric_cols:
                 with st.expander(f"{col}"):
-                    col_stats = df[col].describe()
+                    stats = profile.numeric_stats[col]
+                    col_stats = pd.Series({
+                        'count': stats['count'], 'mean': stats['mean'], 'std': stats['std'], 'min': stats['min'],
+                        '25%': stats['q25'], '50%': stats['median'], '75%': stats['q75'], 'max': stats['max']
+                    })
                     
                     # [OK] CORRECTION : Tableau formaté
                     formatter = TableFormatter(style='professional')
@@ -1067,15 +1055,15 @@ def display_data_overview(df: pd.DataFrame):
             st.info("Aucune variable quantitative détectée")
     
     with tab3:
-        categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
+        categorical_cols = profile.categorical_columns
         
         if categorical_cols:
             st.markdown(f"#### Variables qualitatives ({len(categorical_cols)})")
             
             for col in categorical_cols:
                 with st.expander(f"{col}"):
-                    unique_count = df[col].nunique()
-                    total_count = df[col].count()
+                    unique_count = profile.unique_counts[col]
+                    total_count = profile.n_rows - profile.missing[col]
                     
                     col1, col2 = st.columns(2)
                     with col1:
@@ -1085,8 +1073,8 @@ def display_data_overview(df: pd.DataFrame):
                     
                     st.markdown("**Répartition des modalités**")
                     
-                    value_counts = df[col].value_counts()
-                    value_pcts = df[col].value_counts(normalize=True) * 100
+                    value_counts = profile.top_values(col, 20)
+                    value_pcts = value_counts / max(total_count, 1) * 100
                     
                     freq_df = pd.DataFrame({
                         'Modalité': value_counts.index[:20],
@@ -1121,7 +1109,7 @@ def display_data_overview(df: pd.DataFrame):
         
         missing_data = []
         for col in df.columns:
-            missing_count = df[col].isnull().sum()
+            missing_count = profile.missing[col]
             missing_pct = (missing_count / len(df)) * 100
             missing_data.append({
                 'Variable': col,
@@ -1620,17 +1608,14 @@ Uploadez votre fichier CSV ou Excel ci-dessous.
             file_ext = temp_path.suffix.lower()
             
             if file_ext == '.csv':
-                try:
-                    df = pd.read_csv(temp_path, encoding='utf-8')
-                except UnicodeDecodeError:
-                    try:
-                        df = pd.read_csv(temp_path, encoding='latin-1')
-                    except:
-                        df = pd.read_csv(temp_path, encoding='iso-8859-1')
+                # Parsing unique puis conversion en Parquet (instantané si déjà uploadé)
+                df, encoding = read_dataset(str(temp_path))
             
             elif file_ext in ['.xlsx', '.xls']:
                 try:
                     df = pd.read_excel(temp_path, engine='openpyxl' if file_ext == '.xlsx' else None)
+                    # Typage compact (category, int32) puis conversion en Parquet
+                    df, encoding = read_dataset(str(temp_path), df=df, encoding='excel')
                 except ImportError:
                     st.error("[ERROR] Installation requise : `pip install openpyxl`")
                     st.stop()
@@ -1638,11 +1623,22 @@ Uploadez votre fichier CSV ou Excel ci-dessous.
                     st.error(f"[ERROR] Erreur lors de la lecture Excel : {e}")
                     st.stop()
             
+            # Profil calculé une fois, persisté avec le hash du fichier : plan, aperçu
+            # et prompts le relisent au lieu de reparcourir les données
+            st.session_state['dataset_profile'] = get_dataset_profile(str(temp_path), df=df, encoding=encoding)
+            
             # Stocker dans session_state
             st.session_state.csv_data = df
             st.session_state['temp_path'] = str(temp_path)
             st.session_state['uploaded_filename'] = uploaded_file.name
             
+            # Créer la sandbox en arrière-plan : elle sera prête pour la génération
+            if E2B_AVAILABLE:
+                try:
+                    prefetch_sandbox_for_user(st.session_state.get('user_id', 'default'))
+                except Exception as e:
+                    print(f"[WARNING] Pré-création sandbox impossible: {e}")
+            
             st.success(f"[OK] Fichier **{uploaded_file.name}** chargé avec succès !")
             
         except Exception as e:
@@ -1672,16 +1668,19 @@ Uploadez votre fichier CSV ou Excel ci-dessous.
         with st.expander("[SEARCH] Aperçu des données", expanded=True):
             st.dataframe(df.head(10), use_container_width=True)
         
+        profile = session_dataset_profile(df)
+        
         # Statistiques
         with st.expander("[DATA] Statistiques descriptives"):
-            st.dataframe(df.describe().T, use_container_width=True)
+            st.dataframe(profile.describe().T, use_container_width=True)
         
         # Informations sur les colonnes
         with st.expander("[INFO] Informations sur les colonnes"):
+            missing = pd.Series(profile.missing)
             col_info = pd.DataFrame({
-                'Type': df.dtypes,
-                'Valeurs manquantes': df.isnull().sum(),
-                '% manquant': (df.isnull().sum() / len(df) * 100).round(2)
+                'Type': pd.Series(profile.dtypes),
+                'Valeurs manquantes': missing,
+                '% manquant': (missing / len(df) * 100).round(2)
             })
             st.dataframe(col_info, use_container_width=True)
         
@@ -2556,7 +2555,8 @@ Définissez le nombre de pages souhaité pour chaque chapitre (1-30 pages).
                         plan=st.session_state.plan,
                         csv_path=csv_path,
                         cost_controller=cost_ctrl,
-                        study_context=study_ctx  # NOUVEAU paramètre
+                        study_context=study_ctx,  # NOUVEAU paramètre
+                        dataframe=st.session_state.get('csv_data')  # déjà chargé à l'upload
                     )
                     
                     if LOGGING_AVAILABLE:
@@ -3151,47 +3151,146 @@ img {{ max-width: 100%; height: auto; margin: 15px 0; }}
                     for analyse in section['analyses']:
                         st.markdown(f"  • {analyse}")
             
-            # Bouton de génération
-            if current_chapter.status.value in ["En attente", "Rejeté (à regénérer)", "Erreur"]:
+            # Génération en arrière-plan (file de jobs) : survit aux reruns et aux déconnexions
+            from generation_jobs import jobs_enabled
+            
+            if jobs_enabled():
+                from generation_jobs import (
+                    CHAPTER_STATUS_LABELS, JOB_STATUS_LABELS, apply_job_results, get_job_queue
+                )
                 
-                if st.button(f"🚀 Générer le Chapitre {current_chapter.number}", type="primary"):
+                if not st.session_state.get('generation_job'):
+                    # Nouvelle session (navigateur reconnecté) : reprendre le suivi du job en cours
+                    active_jobs = get_job_queue().jobs_for_user(workflow.user_id)
+                    st.session_state.generation_job = active_jobs[0] if active_jobs else None
+                
+                if st.session_state.generation_job:
+                    @st.fragment(run_every=2)
+                    def show_generation_job():
+                        job_status = get_job_queue().status(st.session_state.generation_job)
+                        if job_status is None:
+                            st.session_state.generation_job = None
+                            st.rerun()
+                        
+                        applied = apply_job_results(workflow, job_status)
+                        total = len(job_status['chapters'])
+                        st.progress(
+                            job_status['generated'] / total if total else 1.0,
+                            text=f"Génération en arrière-plan : {job_status['generated']}/{total} chapitre(s) "
+                                 f"({JOB_STATUS_LABELS[job_status['status']]})"
+                        )
+                        with st.expander("Détail par chapitre", expanded=False):
+                            for job_chapter in job_status['chapters']:
+                                st.markdown(
+                                    f"- Chapitre {job_chapter['number']} : {job_chapter['title']} "
+                                    f"— {CHAPTER_STATUS_LABELS[job_chapter['status']]}"
+                                )
+                        
+                        if job_status['finished']:
+                            st.session_state.generation_job = None
+                            if job_status['error']:
+                                st.warning(f"[WARNING] {job_status['error']}")
+                        elif st.button("⏹ Annuler la génération en arrière-plan"):
+                            get_job_queue().cancel(st.session_state.generation_job)
+                        
+                        # Nouveaux brouillons : réafficher la page entière
+                        if applied or job_status['finished']:
+                            st.rerun()
                     
-                    # Créer un placeholder pour les étapes
-                    status_placeholder = st.empty()
-                    progress_placeholder = st.empty()
+                    show_generation_job()
+            
+            # Bouton de génération (pas pendant un job : le chapitre y est déjà en cours)
+            if current_chapter.status.value in ["En attente", "Rejeté (à regénérer)", "Erreur"] \
+                    and not st.session_state.get('generation_job'):
+                
+                # Mode brouillons en lot : chapitres indépendants générés en parallèle, validés ensuite dans l'ordre
+                if jobs_enabled():
+                    if st.button("⚡ Générer tous les brouillons restants", help="Génère en arrière-plan les chapitres restants, à valider ensuite un par un"):
+                        from generation_jobs import ensure_local_workers, submit_generation_job
+                        
+                        ensure_local_workers()
+                        st.session_state.generation_job = submit_generation_job(
+                            workflow, st.session_state.get('study_context')
+                        )
+                        
+                        if LOGGING_AVAILABLE:
+                            log_user_action('generation_job_submitted', {
+                                'job_id': st.session_state.generation_job
+                            })
+                        
+                        st.rerun()
+                
+                elif os.getenv("BATCH_DRAFT_MODE", "false").lower() == "true":
+                    if st.button("⚡ Générer tous les brouillons restants", help="Génère en parallèle les chapitres restants, à valider ensuite un par un"):
+                        with st.spinner("Génération des brouillons en parallèle..."):
+                            draft_results = workflow.generate_drafts()
+                        
+                        failed = [number for number, draft in draft_results.items() if not draft['success']]
+                        if failed:
+                            st.warning(f"[WARNING] Échec de génération : chapitre(s) {', '.join(failed)}")
+                        
+                        if LOGGING_AVAILABLE:
+                            log_user_action('chapters_drafted', {
+                                'chapters': list(draft_results),
+                                'failed': failed
+                            })
+                        
+                        st.rerun()
+                
+                if st.button(f"🚀 Générer le Chapitre {current_chapter.number}", type="primary"):
                     
-                    # Étape 1
-                    progress_placeholder.progress(0.2, "Étape 1/5: Chargement du contexte...")
-                    status_placeholder.info("📚 Chargement du contexte des chapitres précédents")
+                    import re
                     import time
-                    time.sleep(0.5)
-                    
-                    # Étape 2
-                    progress_placeholder.progress(0.4, "Étape 2/5: Construction du prompt IA")
-                    status_placeholder.info("📝 Construction du prompt IA")
-                    time.sleep(0.5)
-                    
-                    # Étape 3
-                    progress_placeholder.progress(0.6, "Étape 4/6: Génération du contenu...")
-                    status_placeholder.info("🤖 Génération du contenu")
-                    
-                    result = workflow.generate_current_chapter()
-                    
+
+                    # Rendu progressif : le texte s'affiche au fil des tokens, chaque bloc
+                    # de code s'exécute en arrière-plan et son résultat remplit son emplacement
+                    status_placeholder = st.empty()
+                    status_placeholder.info("🤖 Génération du contenu...")
+                    live_container = st.container()
+                    text_placeholder = live_container.empty()
+                    block_slots = {}
+                    written = ""
+                    chart_pattern = r'!\[([^\]]*)\]\(data:image/png;base64,([^)]+)\)'
+                    result = {'success': False, 'error': "Génération interrompue"}
+
+                    for event in workflow.generate_current_chapter_stream():
+                        if event['type'] == 'token':
+                            text_placeholder.markdown(written + event['pending'] + " ▌")
+
+                        elif event['type'] == 'text':
+                            written += event['text']
+
+                        elif event['type'] == 'code_started':
+                            # Le texte déjà écrit est figé, le résultat du bloc viendra se placer dessous
+                            text_placeholder.markdown(written)
+                            block_slots[event['index']] = live_container.empty()
+                            block_slots[event['index']].caption(f"⚙️ Exécution du bloc de code {event['index'] + 1}...")
+                            written = ""
+                            text_placeholder = live_container.empty()
+
+                        elif event['type'] == 'block_result':
+                            slot = block_slots[event['index']].container()
+                            for i, part in enumerate(re.split(chart_pattern, event['text'])):
+                                if i % 3 == 0 and part.strip():
+                                    slot.markdown(part)
+                                elif i % 3 == 2:
+                                    slot.image(base64.b64decode(part), use_container_width=True)
+
+                        elif event['type'] == 'section_done':
+                            # Génération par section : chaque section arrive une fois exécutée
+                            label = f"{current_chapter.number}.{event['index'] + 1}. {event['title']}"
+                            if event['success']:
+                                live_container.caption(f"[OK] Section {label}" + (" (reprise du cache)" if event['cached'] else ""))
+                            else:
+                                live_container.caption(f"[ERROR] Section {label} en échec")
+
+                        elif event['type'] == 'done':
+                            result = event
+
                     if result['success']:
-                        # Étape 4
-                        progress_placeholder.progress(0.8, "Étape 5/6: Exécution du code Python...")
-                        status_placeholder.info("⚙️ Exécution du code Python dans E2B")
-                        time.sleep(0.5)
-                        
-                        # Étape 5
-                        progress_placeholder.progress(1.0, "Étape 6/6: Finalisation...")
-                        status_placeholder.info("[OK] Finalisation du chapitre")
-                        time.sleep(0.5)
-                        
                         # Nettoyer
-                        progress_placeholder.empty()
                         status_placeholder.empty()
-                        
+
                         st.success(f"[OK] Chapitre {current_chapter.number} généré avec succès !")
                         
                         if LOGGING_AVAILABLE:
@@ -3204,7 +3303,6 @@ img {{ max-width: 100%; height: auto; margin: 15px 0; }}
                         st.rerun()
                     
                     else:
-                        progress_placeholder.empty()
                         status_placeholder.empty()
                         
                         st.error(f"[ERROR] Erreur lors de la génération : {result['error']}")
@@ -3351,11 +3449,18 @@ img {{ max-width: 100%; height: auto; margin: 15px 0; }}
                 st.markdown("---")
                 st.markdown("### [OK] Validation du chapitre")
                 
+                if getattr(current_chapter, 'preview', False):
+                    st.info("[APERÇU] Tableaux et graphiques calculés sur un échantillon : ils seront recalculés sur les données complètes à la validation.")
+                
                 col1, col2 = st.columns(2)
                 
                 with col1:
                     if st.button("[OK] Valider ce chapitre", type="primary", use_container_width=True, help="Valider le chapitre et passer au suivant"):
-                        workflow.validate_chapter(current_chapter.number)
+                        if getattr(current_chapter, 'preview', False):
+                            with st.spinner("Exécution sur les données complètes..."):
+                                workflow.validate_chapter(current_chapter.number)
+                        else:
+                            workflow.validate_chapter(current_chapter.number)
                         
                         st.success(f"[OK] Chapitre {current_chapter.number} validé !")
                         
@@ -3421,6 +3526,17 @@ img {{ max-width: 100%; height: auto; margin: 15px 0; }}
                                 key=f"keep_code_{current_chapter.number}"
                             )
                         
+                        # Régénération ciblée : seules ces sections sont regénérées, les autres sont conservées
+                        target_sections = []
+                        if current_chapter.sections:
+                            target_sections = st.multiselect(
+                                "Sections à modifier",
+                                options=[f"{current_chapter.number}.{i}" for i in range(1, len(current_chapter.sections) + 1)],
+                                format_func=lambda number: f"{number}. {current_chapter.sections[int(number.split('.')[-1]) - 1].get('titre', '')}",
+                                help="Vide : sections détectées dans la demande (numéro, tableau, titre)",
+                                key=f"regen_sections_{current_chapter.number}"
+                            )
+                        
                         # Boutons d'action
                         col_a, col_b = st.columns(2)
                         
@@ -3431,13 +3547,28 @@ img {{ max-width: 100%; height: auto; margin: 15px 0; }}
                                     current_chapter.regeneration_instructions = {
                                         'request': modification_request,
                                         'keep_structure': keep_structure,
-                                        'keep_code': keep_code
+                                        'keep_code': keep_code,
+                                        'sections': target_sections
                                     }
                                     
-                                    # Régénérer avec les instructions
-                                    workflow.reject_chapter(current_chapter.number, modification_request)
-                                    
-                                    st.success("[OK] Instructions enregistrées ! Régénération en cours...")
+                                    if current_chapter.sections:
+                                        # Seules les sections concernées sont regénérées et réexécutées
+                                        with st.spinner("[REFRESH] Régénération des sections concernées..."):
+                                            revision = workflow.revise_chapter(
+                                                current_chapter.number, current_chapter.regeneration_instructions
+                                            )
+                                        if revision['success']:
+                                            st.success(
+                                                f"[OK] Sections regénérées : {', '.join(revision['regenerated'])} "
+                                                f"({revision['reuse_ratio']:.0%} du chapitre conservé)"
+                                            )
+                                        else:
+                                            st.error(f"[ERROR] Erreur lors de la régénération : {revision['error']}")
+                                    else:
+                                        # Régénérer avec les instructions
+                                        workflow.reject_chapter(current_chapter.number, modification_request)
+                                        
+                                        st.success("[OK] Instructions enregistrées ! Régénération en cours...")
                                     
                                     if LOGGING_AVAILABLE:
                                         log_user_action('chapter_regeneration_requested', {
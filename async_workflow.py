@@ -0,0 +1,317 @@
+"""
+Cœur asyncio du workflow de génération de rapport
+AsyncReportGenerationWorkflow reprend l'état, les prompts, le format des
+résultats et la validation de ReportGenerationWorkflow ; les étapes
+d'entrée/sortie d'une génération deviennent des coroutines :
+
+    - appels LLM : clients asynchrones des fournisseurs (agenerate / astream)
+    - exécution des blocs : aexecute_python_code (AsyncSandbox pour E2B)
+    - préparation (contexte, création de sandbox, upload du dataset) et
+      mémoire contextuelle : API synchrones, dans le pool de threads partagé
+      de la boucle
+
+Un seul processus (une boucle asyncio) pilote ainsi les générations de
+nombreux utilisateurs sans thread par utilisateur. Une génération est une
+tâche asyncio : l'annuler (utilisateur qui quitte la page) interrompt le flux
+LLM et les exécutions en cours, et remet le chapitre dans son état précédent.
+
+En génération par section (SECTION_GENERATION), le chapitre est produit par
+le pipeline synchrone des sections, dans le pool de threads : mêmes
+événements et même contenu que le workflow synchrone, mais l'annulation
+n'interrompt pas les sections déjà lancées.
+
+Usage :
+    workflow = AsyncReportGenerationWorkflow(user_id, plan, csv_path)
+    task = workflow.start_current_chapter()
+    ...
+    workflow.cancel()
+"""
+
+import os
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional
+
+from chapter_sections import section_generation_enabled
+from chapter_workflow import ChapterStatus, ReportGenerationWorkflow
+from code_scheduler import find_dependency_groups
+from e2b_session_manager import aexecute_python_code
+from execution_cache import get_execution_cache
+from llm_providers import get_provider
+from stream_parser import CodeFenceParser
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncReportGenerationWorkflow(ReportGenerationWorkflow):
+    """Workflow de génération de rapport piloté par asyncio (mêmes chapitres, mêmes événements)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._task: Optional[asyncio.Task] = None
+
+    # ═══════════════════════════════════════════════════════════════
+    # TÂCHES ET ANNULATION
+    # ═══════════════════════════════════════════════════════════════
+
+    def start_current_chapter(self) -> asyncio.Task:
+        """Lance la génération du chapitre en cours dans une tâche de la boucle courante"""
+        self._task = asyncio.create_task(
+            self.agenerate_current_chapter(),
+            name=f"chapter-generation-{self.user_id}"
+        )
+        return self._task
+
+    def cancel(self) -> bool:
+        """
+        Annule la génération en cours (ex: l'utilisateur a quitté la page)
+
+        Returns:
+            True si une génération était en cours
+        """
+        if self._task is None or self._task.done():
+            return False
+
+        logger.info(f"Cancelling chapter generation for {self.user_id}")
+        return self._task.cancel()
+
+    # ═══════════════════════════════════════════════════════════════
+    # GÉNÉRATION
+    # ═══════════════════════════════════════════════════════════════
+
+    async def agenerate_current_chapter(self) -> Dict:
+        """Version asyncio de generate_current_chapter (même format de retour)"""
+        done = None
+        async for event in self.astream_current_chapter():
+            if event['type'] == 'done':
+                done = event
+
+        done.pop('type')
+        return done
+
+    async def astream_current_chapter(self) -> AsyncIterator[Dict]:
+        """
+        Version asyncio de generate_current_chapter_stream (mêmes événements)
+
+        Chaque bloc ```python est exécuté dans une tâche dès que sa clôture
+        arrive, pendant que le LLM écrit la suite ; les blocs d'une même voie
+        s'exécutent dans l'ordre sur le même kernel (chaque tâche attend la
+        précédente de sa voie), les groupes indépendants en parallèle.
+        """
+        chapter = self.get_current_chapter()
+
+        if not chapter:
+            yield {'type': 'done', 'success': False, 'chapter': None, 'error': "Aucun chapitre à générer"}
+            return
+
+        if section_generation_enabled() and chapter.sections:
+            async for event in self._astream_chapter_sections(chapter):
+                yield event
+            return
+
+        logger.info(f"Streaming chapter {chapter.number} (asyncio): {chapter.title}")
+
+        previous_status = chapter.status
+        chapter.status = ChapterStatus.GENERATING
+        chapter.attempts += 1
+        tasks: List[asyncio.Task] = []
+
+        try:
+            prompt, task_type = await asyncio.to_thread(self._prepare_chapter_prompt, chapter)
+
+            parser = CodeFenceParser()
+            codes: List[str] = []
+            raw_parts: List[str] = []
+            data_path = await asyncio.to_thread(self._execution_data_path, self.preview_mode)
+            chapter.preview = data_path != self.csv_path
+            execution_state: Dict = {'data_path': data_path, 'chapter': chapter}
+            parts: List = []  # texte, ou indice du bloc dont le résultat sera inséré
+            result_sections: Dict[int, str] = {}
+            lane_tasks: Dict[int, asyncio.Task] = {}  # dernière tâche de chaque voie
+
+            def dispatch(events: List[Dict]) -> List[Dict]:
+                dispatched = []
+                for event in events:
+                    if event['type'] == 'text':
+                        parts.append(event['text'])
+                        raw_parts.append(event['text'])
+                        dispatched.append(event)
+                        continue
+
+                    raw_parts.append(f"```python\n{event['code']}\n```")
+                    index = len(codes)
+                    codes.append(self._clean_code_block(event['code']))
+                    parts.append(index)
+                    lane_index = self._streamed_block_lane(codes, execution_state)
+                    previous = lane_tasks.get(lane_index)
+                    tasks.append(asyncio.create_task(
+                        self._aexecute_streamed_block(list(codes), execution_state, previous, lane_index)
+                    ))
+                    lane_tasks[lane_index] = tasks[-1]
+                    dispatched.append({'type': 'code_started', 'index': index})
+                return dispatched
+
+            async def collect(wait: bool) -> List[Dict]:
+                collected = []
+                while len(result_sections) < len(tasks):
+                    index = len(result_sections)
+                    if not wait and not tasks[index].done():
+                        break
+                    try:
+                        result = await tasks[index]
+                    except Exception as e:
+                        logger.error(f"Async execution of block {index} failed: {e}")
+                        result = {'success': False, 'output': '', 'charts': [], 'error': str(e), 'execution_time': 0}
+                    result_sections[index] = self._format_block_result(result)
+                    collected.append({'type': 'block_result', 'index': index, 'text': result_sections[index], 'result': result})
+                return collected
+
+            async for token in self._astream_with_ai(prompt, task_type=task_type):
+                for event in dispatch(parser.feed(token)):
+                    yield event
+                yield {'type': 'token', 'text': token, 'pending': parser.partial_text}
+                for event in await collect(wait=False):
+                    yield event
+
+            for event in dispatch(parser.flush()):
+                yield event
+            for event in await collect(wait=True):
+                yield event
+
+            content_with_results = "".join(
+                result_sections[part] if isinstance(part, int) else part for part in parts
+            )
+            chapter.raw_content = "".join(raw_parts)
+            yield {'type': 'done', **self._complete_chapter(chapter, content_with_results)}
+
+        except (asyncio.CancelledError, GeneratorExit):
+            logger.info(f"Chapter {chapter.number} generation cancelled")
+            chapter.status = previous_status
+            raise
+
+        except Exception as e:
+            yield {'type': 'done', **self._fail_chapter(chapter, e)}
+
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _astream_chapter_sections(self, chapter) -> AsyncIterator[Dict]:
+        """
+        Version asyncio de _stream_chapter_sections
+
+        Les sections sont générées par le pipeline synchrone (threads) ; seule
+        l'attente de chaque événement passe par le pool de threads de la boucle.
+        """
+        stream = self._stream_chapter_sections(chapter)
+
+        while True:
+            event = await asyncio.to_thread(next, stream, None)
+            if event is None:
+                return
+            yield event
+            if event['type'] == 'done':
+                return
+
+    async def avalidate_chapter(self, chapter_number: str) -> bool:
+        """Version asyncio de validate_chapter (réexécution éventuelle et mémoire contextuelle hors de la boucle)"""
+        return await asyncio.to_thread(self.validate_chapter, chapter_number)
+
+    # ═══════════════════════════════════════════════════════════════
+    # EXÉCUTION DES BLOCS
+    # ═══════════════════════════════════════════════════════════════
+
+    async def _aexecute_streamed_block(self, codes: List[str], state: Dict,
+                                       previous: Optional[asyncio.Task] = None, lane_index: int = 0) -> Dict:
+        """
+        Version asyncio de _execute_streamed_block
+
+        Args:
+            previous: Tâche du bloc précédent de la voie, attendue d'abord (ordre du kernel)
+            lane_index: Voie du bloc (voir _streamed_block_lane)
+        """
+        if previous is not None:
+            await asyncio.wait([previous])
+
+        index = len(codes) - 1
+        executed = state.setdefault('executed', {}).setdefault(lane_index, set())
+        group = next(g for g in find_dependency_groups(codes) if index in g)
+
+        cache = get_execution_cache()
+        cache_key = None
+        if cache:
+            cache_keys = await asyncio.to_thread(
+                self._compute_cache_keys, codes, [group], state['data_path'], state['chapter']
+            )
+            cache_key = cache_keys.get(index)
+            cached = await asyncio.to_thread(cache.get, cache_key) if cache_key else None
+            if cached:
+                return cached
+
+        lanes = state.setdefault('lanes', {})
+        if lane_index not in lanes:
+            lanes[lane_index] = await asyncio.to_thread(
+                self._prepare_execution_lane, lane_index, state['data_path'], state['chapter']
+            )
+
+        for position in group:
+            if position < index and position not in executed:
+                await self._arun_code_block(lanes[lane_index], codes[position])
+                executed.add(position)
+
+        result = await self._arun_code_block(lanes[lane_index], codes[index])
+        executed.add(index)
+
+        if cache_key and result['success']:
+            await asyncio.to_thread(cache.set, cache_key, result)
+
+        return result
+
+    async def _arun_code_block(self, lane: Dict, final_code: str) -> Dict:
+        """Version asyncio de _run_code_block"""
+        lane = await asyncio.to_thread(self._ensure_lane_kernel, lane)
+        return await aexecute_python_code(lane['user_id'], self._build_block_code(lane, final_code))
+
+    # ═══════════════════════════════════════════════════════════════
+    # APPELS LLM
+    # ═══════════════════════════════════════════════════════════════
+
+    async def _astream_with_ai(self, prompt: str, task_type: str = "default") -> AsyncIterator[str]:
+        """
+        Version asyncio de _stream_with_ai
+
+        Le fallback vers Claude n'est possible que si Gemini échoue avant le
+        premier token : un flux déjà entamé ne peut pas être rejoué.
+        """
+        if os.getenv("USE_CLAUDE", "false").lower() == "true":
+            logger.info("Using Claude API (forced via USE_CLAUDE)")
+            async for text in self._astream_with_claude(prompt):
+                yield text
+            return
+
+        started = False
+        try:
+            async for text in get_provider("gemini").astream(prompt, model=self._get_gemini_model_name(task_type)):
+                started = True
+                yield text
+
+        except Exception as e:
+            error_msg = str(e)
+
+            if started or not ("429" in error_msg or "quota" in error_msg.lower()):
+                raise
+
+            logger.warning(f"Gemini quota exceeded, falling back to Claude: {error_msg}")
+
+            try:
+                async for text in self._astream_with_claude(prompt):
+                    yield text
+            except Exception as claude_error:
+                logger.error(f"Claude also failed: {claude_error}")
+                raise Exception(f"Both Gemini and Claude failed. Gemini: {error_msg}, Claude: {claude_error}")
+
+    async def _astream_with_claude(self, prompt: str) -> AsyncIterator[str]:
+        logger.info("Using Claude API (claude-3-5-sonnet, streaming)")
+
+        async for text in get_provider("anthropic").astream(prompt, model="claude-3-5-sonnet-20241022", max_tokens=4000):
+            yield text
@@ -81,12 +81,11 @@ def cached_plan_generation(csv_path: str, force_refresh: bool = False):
         csv_path: Chemin vers le CSV
         force_refresh: Force la régénération même si cache existe
     """
-    import pandas as pd
     from week2_architect_agent import analyze_csv, generate_report_plan
+    from dataset_staging import dataset_stager
     
-    # Calculer un hash du fichier CSV
-    df = pd.read_csv(csv_path)
-    csv_hash = hashlib.md5(df.to_csv().encode()).hexdigest()
+    # Hash du contenu du fichier (sans le parser)
+    csv_hash = dataset_stager.get_file_hash(csv_path)
     
     cache_key = f"plan_{csv_hash}"
     
@@ -135,15 +134,16 @@ def cached_data_analysis(csv_path: str):
     
     TTL = 1 heure
     """
-    import pandas as pd
+    from data_profiler import get_dataset_profile
     
-    df = pd.read_csv(csv_path)
+    # Profil partagé (calculé à l'upload), sans relire les données
+    profile = get_dataset_profile(csv_path)
     
     analysis = {
-        'shape': df.shape,
-        'dtypes': df.dtypes.to_dict(),
-        'numeric_summary': df.describe().to_dict(),
-        'missing': df.isnull().sum().to_dict(),
+        'shape': (profile.n_rows, len(profile.columns)),
+        'dtypes': dict(profile.dtypes),
+        'numeric_summary': profile.describe().to_dict(),
+        'missing': dict(profile.missing),
     }
     
     return analysis
@@ -157,6 +157,12 @@ def display_cache_info():
     st.sidebar.markdown("**Cache**")
     st.sidebar.caption(f"Taille : {cache_size} Mo")
     
+    # Temps de profilage par chemin (local, profil relu, sandbox...)
+    from profiler_policy import profiling_metrics
+    for path, stats in profiling_metrics.get_stats().items():
+        if stats['calls']:
+            st.sidebar.caption(f"Profilage {path} : {stats['calls']}× ({stats['mean_seconds']:.2f} s en moyenne)")
+    
     if st.sidebar.button("Vider le cache"):
         cache.clear()
         st.sidebar.success("Cache vidé")
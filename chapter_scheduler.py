@@ -0,0 +1,144 @@
+"""
+Ordonnanceur des chapitres d'un rapport (mode brouillons en lot)
+Construit le graphe de dépendances (DAG) des chapitres du plan, puis génère
+en parallèle, avec un nombre borné de workers, les chapitres dont toutes les
+dépendances sont terminées. Les brouillons sont ensuite présentés à la
+validation dans l'ordre du plan.
+
+Dépendances déduites du titre (mêmes mots-clés que la détection du type de tâche) :
+    - un chapitre de synthèse (conclusion, synthèse, recommandations, discussion)
+      dépend de tous les chapitres qui ne sont pas des synthèses, et des synthèses
+      qui le précèdent
+    - les autres chapitres (introduction, description, analyses) sont indépendants
+
+Un chapitre du plan peut déclarer ses dépendances explicitement :
+    {"numero": "5", "titre": "...", "dependances": ["3", "4"]}
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+SYNTHESIS_KEYWORDS = ["conclusion", "synthèse", "recommandation", "discussion"]
+
+
+def is_synthesis_chapter(title: str) -> bool:
+    """True si le chapitre synthétise les autres (il doit être rédigé après eux)"""
+    title_lower = title.lower()
+    return any(keyword in title_lower for keyword in SYNTHESIS_KEYWORDS)
+
+
+def build_chapter_dag(chapters: List[Dict]) -> Dict[str, List[str]]:
+    """
+    Graphe de dépendances des chapitres
+
+    Args:
+        chapters: plan['chapitres'] (dicts avec 'numero', 'titre', 'dependances' optionnel)
+
+    Returns:
+        {numéro: [numéros des chapitres dont il dépend]}, dans l'ordre du plan
+    """
+    numbers = [str(chapter['numero']) for chapter in chapters]
+    synthesis = {str(chapter['numero']) for chapter in chapters if is_synthesis_chapter(chapter.get('titre', ''))}
+
+    dag = {}
+    for position, chapter in enumerate(chapters):
+        number = str(chapter['numero'])
+        explicit = chapter.get('dependances')
+
+        if explicit is not None:
+            dag[number] = [str(dependency) for dependency in explicit if str(dependency) in numbers and str(dependency) != number]
+        elif number in synthesis:
+            dag[number] = [
+                other for other_position, other in enumerate(numbers)
+                if other != number and (other not in synthesis or other_position < position)
+            ]
+        else:
+            dag[number] = []
+
+    _check_acyclic(dag)
+    return dag
+
+
+def _check_acyclic(dag: Dict[str, List[str]]):
+    """Lève ValueError si les dépendances (explicites) forment un cycle"""
+    state: Dict[str, int] = {}  # 1 = en cours de visite, 2 = terminé
+
+    def visit(node: str, path: List[str]):
+        if state.get(node) == 2:
+            return
+        if state.get(node) == 1:
+            raise ValueError(f"Dépendances circulaires entre chapitres : {' -> '.join(path + [node])}")
+        state[node] = 1
+        for dependency in dag.get(node, []):
+            visit(dependency, path + [node])
+        state[node] = 2
+
+    for node in dag:
+        visit(node, [])
+
+
+def run_dag(
+    dag: Dict[str, List[str]],
+    run_node: Callable[[str, int], Any],
+    max_workers: int = 3
+) -> Dict[str, Any]:
+    """
+    Exécute les nœuds du DAG en parallèle, chacun dès que ses dépendances sont terminées
+
+    Une dépendance absente du DAG est considérée comme déjà satisfaite ; un
+    nœud en échec (exception) débloque quand même ceux qui en dépendent.
+
+    Args:
+        dag: {nœud: [dépendances]} (ordre = priorité de lancement)
+        run_node: Exécute un nœud ; reçoit aussi l'indice du worker (0..max_workers-1),
+                  stable pendant l'exécution (ex: une sandbox par worker)
+        max_workers: Nombre maximal de nœuds exécutés simultanément
+
+    Returns:
+        {nœud: résultat, ou exception levée}
+    """
+    pending = {node: {d for d in dependencies if d in dag} for node, dependencies in dag.items()}
+    free_slots = list(range(max(1, max_workers)))
+    lock = threading.Lock()
+    results: Dict[str, Any] = {}
+
+    def run(node: str, slot: int):
+        try:
+            return run_node(node, slot)
+        finally:
+            with lock:
+                free_slots.append(slot)
+
+    with ThreadPoolExecutor(max_workers=len(free_slots), thread_name_prefix="chapter-draft") as executor:
+        running = {}
+
+        while pending or running:
+            for node in [n for n, dependencies in pending.items() if not dependencies]:
+                with lock:
+                    if not free_slots:
+                        break
+                    slot = free_slots.pop(0)
+                del pending[node]
+                running[executor.submit(run, node, slot)] = node
+                logger.info(f"Chapter {node} started on worker {slot}")
+
+            if not running:
+                raise ValueError(f"Chapitres jamais prêts (dépendances circulaires) : {list(pending)}")
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                try:
+                    results[node] = future.result()
+                except Exception as e:
+                    logger.error(f"Chapter {node} failed: {e}")
+                    results[node] = e
+                for dependencies in pending.values():
+                    dependencies.discard(node)
+
+    return results
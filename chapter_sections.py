@@ -0,0 +1,183 @@
+"""
+Génération d'un chapitre section par section
+Au lieu d'un seul prompt (et d'une seule réponse, souvent tronquée par la
+limite de tokens) par chapitre, chaque section de `chapter.sections` est
+rédigée et exécutée séparément :
+
+    - les sections indépendantes sont générées en parallèle ; une section de
+      synthèse attend les autres (même graphe que les chapitres, voir chapter_scheduler)
+    - une section dont le code échoue est regénérée seule, avec l'erreur en contexte
+    - chaque section réussie est mise en cache (clé = prompt + données) : une
+      nouvelle tentative du chapitre ne regénère que les sections manquantes
+
+Les sections sont ensuite assemblées ; les numéros de tableaux et graphiques,
+propres à chaque section, sont renumérotés à la suite. Une synthèse reçoit
+les sections dont elle dépend déjà renumérotées : ses références à ces
+numéros sont gardées à l'assemblage, et ses propres tableaux et graphiques
+sont numérotés à la suite (compteurs des blocs, voir reference_counts).
+
+Régénération ciblée : un chapitre généré est redécoupé en sections (titres
+"### n.k."), seules les sections visées par la demande de modification
+(numéro de section, tableau ou graphique cité, titre) sont regénérées ; les
+autres sont reprises telles quelles, texte et résultats compris.
+
+Configuration :
+    SECTION_GENERATION       true/false (défaut false) : génération par section
+    SECTION_PARALLEL_WORKERS Sections générées simultanément (défaut 3)
+    SECTION_MAX_RETRIES      Nouvelles tentatives d'une section en échec (défaut 1)
+"""
+
+import os
+import re
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+from chapter_scheduler import build_chapter_dag
+
+
+# Libellés numérotés dans le texte ("Tableau 2.1", "Graphique 2.3", "Figure 2.3")
+REFERENCE_KINDS = {'Tableau': 'tableau', 'Graphique': 'graphique', 'Figure': 'graphique'}
+
+
+def section_generation_enabled() -> bool:
+    return os.getenv("SECTION_GENERATION", "false").lower() == "true"
+
+
+def build_section_dag(sections: List[Dict]) -> Dict[str, List[str]]:
+    """
+    Dépendances entre les sections d'un chapitre (clés : indices "0", "1"...)
+
+    Une section de synthèse (conclusion, synthèse...) dépend des autres ;
+    `"dependances": [indices]` dans la section les déclare explicitement.
+    """
+    return build_chapter_dag([
+        {'numero': str(index), 'titre': section.get('titre', ''), 'dependances': section.get('dependances')}
+        for index, section in enumerate(sections)
+    ])
+
+
+def section_cache_key(prompt: str, task_type: str, data_hash: str) -> str:
+    """Clé d'une section générée : même prompt, même modèle, mêmes données"""
+    payload = f"{task_type}\n{data_hash}\n{prompt}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _reference_pattern(chapter_number) -> "re.Pattern":
+    return re.compile(rf"\b({'|'.join(REFERENCE_KINDS)})(\s+){re.escape(str(chapter_number))}\.(\d+)\b")
+
+
+def renumber_references(texts: List[str], chapter_number, resolved=()) -> List[str]:
+    """
+    Renumérote à la suite les tableaux et graphiques de sections rédigées séparément
+
+    Chaque section numérote ses résultats à partir de 1 ("Tableau 2.1") ; les
+    numéros locaux d'une section sont remplacés, dans l'ordre d'apparition, par
+    les numéros suivants du chapitre (références dans le texte comprises).
+
+    Args:
+        resolved: Positions des textes rédigés avec la numérotation du chapitre
+            (synthèse ayant reçu ses dépendances renumérotées) : leurs références
+            à un numéro déjà attribué sont gardées, les autres sont numérotées à la suite
+    """
+    pattern = _reference_pattern(chapter_number)
+    counters = {kind: 0 for kind in set(REFERENCE_KINDS.values())}
+    renumbered = []
+
+    for position, text in enumerate(texts):
+        mapping: Dict = {}
+
+        def replace(match):
+            label, space, local = match.group(1), match.group(2), match.group(3)
+            kind = REFERENCE_KINDS[label]
+            if (kind, local) not in mapping:
+                if position in resolved and 1 <= int(local) <= counters[kind]:
+                    mapping[(kind, local)] = int(local)
+                else:
+                    counters[kind] += 1
+                    mapping[(kind, local)] = counters[kind]
+            return f"{label}{space}{chapter_number}.{mapping[(kind, local)]}"
+
+        renumbered.append(pattern.sub(replace, text))
+
+    return renumbered
+
+
+def reference_counts(texts: List[str], chapter_number) -> Dict[str, int]:
+    """Plus grands numéros de tableau et de graphique cités dans des textes ({'tableau': n, 'graphique': m})"""
+    counts = {kind: 0 for kind in set(REFERENCE_KINDS.values())}
+    for text in texts:
+        for match in _reference_pattern(chapter_number).finditer(text):
+            kind = REFERENCE_KINDS[match.group(1)]
+            counts[kind] = max(counts[kind], int(match.group(3)))
+    return counts
+
+
+def split_sections(text: str, chapter_number, count: int) -> Optional[List[str]]:
+    """
+    Redécoupe un chapitre assemblé en ses sections ("### n.1." ... "### n.count.")
+
+    Returns:
+        Texte de chaque section (titre compris), ou None si les titres ne
+        correspondent pas exactement aux sections du plan
+    """
+    pattern = re.compile(rf"^###\s+{re.escape(str(chapter_number))}\.(\d+)\b", re.MULTILINE)
+    matches = list(pattern.finditer(text or ""))
+    if [int(match.group(1)) for match in matches] != list(range(1, count + 1)):
+        return None
+
+    ends = [match.start() for match in matches[1:]] + [len(text)]
+    return [text[match.start():end].strip() for match, end in zip(matches, ends)]
+
+
+def affected_sections(request: str, chapter_number, titles: List[str], texts: List[str]) -> List[int]:
+    """
+    Sections visées par une demande de modification
+
+    Reconnaît les tableaux et graphiques cités ("Tableau 2.3", cherchés dans le
+    texte de chaque section), les numéros de section ("2.3", "section 2.3") et
+    les titres de section.
+
+    Returns:
+        Indices des sections, triés ; vide si la demande ne vise aucune section
+        en particulier (tout le chapitre est alors à regénérer)
+    """
+    number = re.escape(str(chapter_number))
+    affected = set()
+
+    labels = re.compile(rf"\b({'|'.join(REFERENCE_KINDS)})\s+{number}\.(\d+)\b", re.IGNORECASE)
+    for match in labels.finditer(request):
+        label = re.compile(rf"\b{match.group(1)}\s+{number}\.{match.group(2)}\b", re.IGNORECASE)
+        affected.update(index for index, text in enumerate(texts) if label.search(text))
+
+    for match in re.finditer(rf"(?<![\w.]){number}\.(\d+)\b", labels.sub("", request)):
+        if 1 <= int(match.group(1)) <= len(titles):
+            affected.add(int(match.group(1)) - 1)
+
+    request_lower = request.lower()
+    affected.update(index for index, title in enumerate(titles) if len(title) > 3 and title.lower() in request_lower)
+
+    return sorted(affected)
+
+
+def stitch_sections(chapter_number, chapter_title: str, texts: List[str], resolved=()) -> str:
+    """Chapitre assemblé : titre du chapitre puis sections renumérotées (voir renumber_references)"""
+    body = "\n\n".join(text.strip() for text in renumber_references(texts, chapter_number, resolved))
+    return f"## {chapter_number}. {chapter_title}\n\n{body}\n"
+
+
+class SectionCache:
+    """Sections déjà générées et exécutées, par clé (mémoire du workflow)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._sections: Dict[str, Dict] = {}
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self.lock:
+            section = self._sections.get(key)
+            return dict(section) if section else None
+
+    def set(self, key: str, section: Dict):
+        with self.lock:
+            self._sections[key] = dict(section)
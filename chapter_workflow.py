@@ -12,23 +12,62 @@ CORRECTIONS MAJEURES :
 [OK] Gestion apostrophes dans noms de colonnes
 """
 
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 from enum import Enum
 import logging
 from datetime import datetime
 
 # Imports des modules précédents
-from e2b_session_manager import get_sandbox_for_user, execute_python_code
+from e2b_session_manager import get_sandbox_for_user, execute_python_code, warm_kernel_for_user
 from contextual_memory import (
     add_chapter_to_memory,
     get_context_for_chapter,
     contextual_memory
 )
 from table_formatter import TableFormatter
+from dataset_staging import dataset_stager
+from code_scheduler import find_dependency_groups, assign_lanes, run_lanes
+from execution_cache import get_execution_cache, ExecutionResultCache
+from stream_parser import CodeFenceParser
+from llm_providers import get_provider
+from dataset_handle import DatasetHandle
+from dtype_optimizer import dtype_cache_tag
+from dataset_sampling import get_dataset_sampler, sample_examples
+from chapter_scheduler import build_chapter_dag, run_dag
+from chapter_sections import (
+    SectionCache,
+    affected_sections,
+    build_section_dag,
+    reference_counts,
+    renumber_references,
+    section_cache_key,
+    section_generation_enabled,
+    split_sections,
+    stitch_sections
+)
 
 logger = logging.getLogger(__name__)
 
 
+# Préambule commun à tous les blocs de code (exécuté une fois par session en mode warm kernel)
+KERNEL_PREAMBLE = """import pandas as pd
+import matplotlib.pyplot as plt
+import seaborn as sns
+import numpy as np
+import io
+plt.style.use('seaborn-v0_8-darkgrid')
+"""
+
+# Empreinte de l'environnement d'exécution (clé du cache de résultats)
+LIBRARY_VERSIONS_CODE = """import json, sys, pandas, numpy, matplotlib, seaborn
+print(json.dumps({'python': sys.version.split()[0], 'pandas': pandas.__version__, 'numpy': numpy.__version__,
+                  'matplotlib': matplotlib.__version__, 'seaborn': seaborn.__version__}))
+"""
+
+# Longueur des brouillons non validés passés en contexte (mode brouillons en lot)
+DRAFT_CONTEXT_CHARS = 1500
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # MODULE AUTO-REVIEW INTÉGRÉ v2.5 - Powered by Gemini 2.0 Flash
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -108,6 +147,11 @@ class Chapter:
         self.error_message: Optional[str] = None
         self.attempts = 0
         self.regeneration_instructions: Optional[Dict] = None
+        # Texte généré avant exécution, et blocs exécutés sur l'échantillon (mode aperçu)
+        self.raw_content: Optional[str] = None
+        self.preview = False
+        # Génération par section : une entrée par section (texte, résultats, tentatives)
+        self.section_results: List[Dict] = []
     
     def to_dict(self) -> dict:
         return {
@@ -120,7 +164,8 @@ class Chapter:
             'validated_at': self.validated_at.isoformat() if self.validated_at else None,
             'error_message': self.error_message,
             'attempts': self.attempts,
-            'regeneration_instructions': self.regeneration_instructions
+            'regeneration_instructions': self.regeneration_instructions,
+            'preview': self.preview
         }
 
 
@@ -138,16 +183,30 @@ class ReportGenerationWorkflow:
        d. Si validé: passer au suivant
        e. Si rejeté: regénérer
     3. Compiler tous les chapitres en rapport final
+
+    En mode aperçu (preview_mode, ou PREVIEW_EXECUTION=true), les blocs de code
+    s'exécutent sur l'échantillon persisté du dataset (voir dataset_sampling)
+    pendant la rédaction ; à la validation, le chapitre est réexécuté sur les
+    données complètes.
     """
     
-    def __init__(self, user_id: str, plan: Dict, csv_path: str, cost_controller=None, study_context=None):
+    def __init__(self, user_id: str, plan: Dict, csv_path: str, cost_controller=None, study_context=None, dataframe=None,
+                 preview_mode: Optional[bool] = None):
+        import os
+
         self.user_id = user_id
         self.plan = plan
         self.csv_path = csv_path
+        self.dataset = DatasetHandle(csv_path, df=dataframe)
         self.cost_controller = cost_controller
         self.study_context = study_context
         self.chapters: List[Chapter] = []
         self.current_chapter_index = 0
+        self._library_versions: Optional[Dict] = None
+        if preview_mode is None:
+            preview_mode = os.getenv("PREVIEW_EXECUTION", "false").lower() == "true"
+        self.preview_mode = preview_mode
+        self._section_cache = SectionCache()
         
         # Initialiser les chapitres depuis le plan
         self._initialize_chapters()
@@ -191,6 +250,8 @@ class ReportGenerationWorkflow:
                 'error': str (si échec)
             }
         """
+        import os
+
         chapter = self.get_current_chapter()
         
         if not chapter:
@@ -200,56 +261,497 @@ class ReportGenerationWorkflow:
                 'error': "Aucun chapitre à générer"
             }
         
+        # Pipeline (défaut) : les blocs sont exécutés pendant que le LLM écrit la suite
+        # (en génération par section, les sections sont produites en arrière-plan)
+        if section_generation_enabled() or os.getenv("PIPELINED_GENERATION", "true").lower() == "true":
+            *_, done = self.generate_current_chapter_stream()
+            done.pop('type')
+            return done
+
         logger.info(f"Generating chapter {chapter.number}: {chapter.title}")
-        
+
         chapter.status = ChapterStatus.GENERATING
         chapter.attempts += 1
-        
+
         try:
-            # 1. Récupérer le contexte des chapitres précédents
-            context = get_context_for_chapter(self.user_id, chapter.number)
-            
-            # 2. Construire le prompt pour l'IA (avec instructions de régénération si disponibles)
-            prompt = self._build_chapter_prompt(chapter, context)
-            
-            # 3. Déterminer le type de tâche selon le chapitre
-            task_type = self._detect_task_type(chapter)
-            logger.info(f"Detected task type for chapter {chapter.number}: {task_type}")
-            
+            # 1-3. Contexte, prompt et type de tâche
+            prompt, task_type = self._prepare_chapter_prompt(chapter)
+
             # 4. Générer le contenu avec l'IA (modèle spécialisé)
             content = self._generate_with_ai(prompt, task_type=task_type)
-            
+
             # 5. Exécuter le code Python dans E2B si nécessaire
-            content_with_results = self._execute_code_blocks(content)
-            
+            chapter.raw_content = content
+            chapter.preview = self._execution_data_path(self.preview_mode) != self.csv_path
+            content_with_results = self._execute_code_blocks(content, preview=chapter.preview)
+
             # 6. Mettre à jour le chapitre
-            chapter.content = content_with_results
-            chapter.status = ChapterStatus.GENERATED
-            chapter.generated_at = datetime.now()
-            
-            logger.info(f"Chapter {chapter.number} generated successfully ({len(content_with_results)} chars)")
-            
-            return {
-                'success': True,
-                'chapter': chapter,
-                'content': content_with_results
-            }
+            return self._complete_chapter(chapter, content_with_results)
+
+        except Exception as e:
+            return self._fail_chapter(chapter, e)
+
+    def generate_current_chapter_stream(self) -> Iterator[Dict]:
+        """
+        Génère le chapitre en cours en streaming
+
+        Les tokens sont transmis dès leur réception. Chaque bloc ```python est
+        envoyé à la sandbox dès que sa clôture arrive et s'exécute en arrière-plan
+        pendant que le LLM écrit la suite : le temps d'exécution est masqué par
+        le temps de génération. Les résultats sont réinsérés à la fin, à la place
+        de leurs blocs ; le contenu final est identique au mode non pipeliné.
+
+        Chaque groupe de blocs dépendants est affecté à une voie dès son premier
+        bloc (au plus E2B_PARALLEL_LANES voies, voir _streamed_block_lane) : les
+        blocs d'une voie s'exécutent dans l'ordre sur le même kernel, les groupes
+        indépendants en parallèle sur des sandboxes distinctes.
+
+        Yields:
+            {'type': 'token', 'text': str, 'pending': str}   fragment brut (pending = ligne en cours)
+            {'type': 'text', 'text': str}                    texte du chapitre (hors code), ligne complète
+            {'type': 'code_started', 'index': int}           bloc reçu, exécution lancée en arrière-plan
+            {'type': 'block_result', 'index': int, 'text': str, 'result': Dict}   dans l'ordre des blocs
+            {'type': 'section_done', 'index': int, 'title': str, 'success': bool, 'cached': bool}
+                                                              génération par section (SECTION_GENERATION)
+            {'type': 'done', 'success': bool, 'chapter': Chapter, 'content'|'error': str}
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        chapter = self.get_current_chapter()
+
+        if not chapter:
+            yield {'type': 'done', 'success': False, 'chapter': None, 'error': "Aucun chapitre à générer"}
+            return
+
+        if section_generation_enabled() and chapter.sections:
+            yield from self._stream_chapter_sections(chapter)
+            return
+
+        logger.info(f"Streaming chapter {chapter.number}: {chapter.title}")
+
+        chapter.status = ChapterStatus.GENERATING
+        chapter.attempts += 1
+
+        # Un worker par voie : les blocs d'une voie s'exécutent dans l'ordre sur le même kernel
+        executors: Dict[int, ThreadPoolExecutor] = {}
+
+        try:
+            prompt, task_type = self._prepare_chapter_prompt(chapter)
+
+            parser = CodeFenceParser()
+            codes: List[str] = []
+            raw_parts: List[str] = []
+            data_path = self._execution_data_path(self.preview_mode)
+            chapter.preview = data_path != self.csv_path
+            execution_state: Dict = {'data_path': data_path}
+            futures = []
+            parts: List = []  # texte, ou indice du bloc dont le résultat sera inséré
+            result_sections: Dict[int, str] = {}
+
+            def dispatch(events: List[Dict]) -> Iterator[Dict]:
+                for event in events:
+                    if event['type'] == 'text':
+                        parts.append(event['text'])
+                        raw_parts.append(event['text'])
+                        yield event
+                        continue
+
+                    raw_parts.append(f"```python\n{event['code']}\n```")
+                    index = len(codes)
+                    codes.append(self._clean_code_block(event['code']))
+                    parts.append(index)
+                    lane_index = self._streamed_block_lane(codes, execution_state)
+                    if lane_index not in executors:
+                        executors[lane_index] = ThreadPoolExecutor(
+                            max_workers=1, thread_name_prefix=f"code-pipeline-{lane_index}"
+                        )
+                    futures.append(executors[lane_index].submit(
+                        self._execute_streamed_block, list(codes), execution_state, lane_index
+                    ))
+                    yield {'type': 'code_started', 'index': index}
+
+            def collect(wait: bool) -> Iterator[Dict]:
+                while len(result_sections) < len(futures):
+                    index = len(result_sections)
+                    if not wait and not futures[index].done():
+                        return
+                    try:
+                        result = futures[index].result()
+                    except Exception as e:
+                        logger.error(f"Pipelined execution of block {index} failed: {e}")
+                        result = {'success': False, 'output': '', 'charts': [], 'error': str(e), 'execution_time': 0}
+                    result_sections[index] = self._format_block_result(result)
+                    yield {'type': 'block_result', 'index': index, 'text': result_sections[index], 'result': result}
+
+            for token in self._stream_with_ai(prompt, task_type=task_type):
+                yield from dispatch(parser.feed(token))
+                yield {'type': 'token', 'text': token, 'pending': parser.partial_text}
+                yield from collect(wait=False)
+
+            yield from dispatch(parser.flush())
+            yield from collect(wait=True)
+
+            content_with_results = "".join(
+                result_sections[part] if isinstance(part, int) else part for part in parts
+            )
+            chapter.raw_content = "".join(raw_parts)
+            yield {'type': 'done', **self._complete_chapter(chapter, content_with_results)}
+
+        except Exception as e:
+            yield {'type': 'done', **self._fail_chapter(chapter, e)}
+
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def generate_drafts(self, max_workers: int = None, on_progress=None) -> Dict[str, Dict]:
+        """
+        Mode brouillons en lot : génère en parallèle tous les chapitres restants
+        
+        Les chapitres sont ordonnancés selon le graphe de dépendances du plan
+        (voir chapter_scheduler) : les chapitres indépendants sont générés en
+        même temps par au plus `max_workers` workers (chacun avec ses propres
+        sandboxes), une synthèse attend les chapitres qu'elle résume et reçoit
+        leurs brouillons en contexte. Les brouillons sont ensuite présentés à
+        la validation un par un, dans l'ordre du plan.
         
+        Args:
+            max_workers: Chapitres générés simultanément (défaut BATCH_DRAFT_WORKERS, 3)
+            on_progress: Appelé avec (chapitre, None) au démarrage d'un chapitre puis
+                         (chapitre, résultat) à la fin ; une exception levée au
+                         démarrage annule ce chapitre (voir generation_jobs)
+        
+        Returns:
+            {numéro de chapitre: résultat (même format que generate_current_chapter),
+             ou exception levée par on_progress}
+        """
+        import os
+
+        if max_workers is None:
+            max_workers = int(os.getenv("BATCH_DRAFT_WORKERS", "3"))
+
+        to_generate = {
+            str(chapter.number): chapter
+            for chapter in self.chapters[self.current_chapter_index:]
+            if chapter.status in [ChapterStatus.PENDING, ChapterStatus.REJECTED, ChapterStatus.ERROR]
+        }
+        if not to_generate:
+            return {}
+
+        # Dépendances déjà générées ou validées : hors du lot, donc satisfaites
+        dag = build_chapter_dag(self.plan.get('chapitres', []))
+        dag = {number: dag.get(number, []) for number in to_generate}
+        chapters_by_number = {str(chapter.number): chapter for chapter in self.chapters}
+
+        def draft(number: str, worker: int) -> Dict:
+            if on_progress:
+                on_progress(to_generate[number], None)
+            result = self._generate_draft(
+                to_generate[number],
+                [chapters_by_number[d] for d in dag[number] if d in chapters_by_number],
+                worker
+            )
+            if on_progress:
+                on_progress(to_generate[number], result)
+            return result
+
+        logger.info(f"Drafting {len(dag)} chapters with up to {max_workers} workers")
+        results = run_dag(dag, draft, max_workers=max_workers)
+
+        return {number: results[number] for number in dag}
+
+    def _generate_draft(self, chapter: Chapter, dependencies: List[Chapter], worker: int) -> Dict:
+        """Génère un chapitre du lot (sans streaming), sur les sandboxes de son worker"""
+        logger.info(f"Drafting chapter {chapter.number}: {chapter.title} (worker {worker})")
+
+        chapter.status = ChapterStatus.GENERATING
+        chapter.attempts += 1
+
+        try:
+            context = get_context_for_chapter(self.user_id, chapter.number) + self._draft_context(dependencies)
+            task_type = self._detect_task_type(chapter)
+
+            if section_generation_enabled() and chapter.sections:
+                chapter.raw_content, content_with_results = self._generate_chapter_sections(
+                    chapter, context, task_type, worker=worker
+                )
+                return self._complete_chapter(chapter, content_with_results)
+
+            prompt = self._build_chapter_prompt(chapter, context)
+            content = self._generate_with_ai(prompt, task_type=task_type)
+
+            chapter.raw_content = content
+            chapter.preview = self._execution_data_path(self.preview_mode) != self.csv_path
+            content_with_results = self._execute_code_blocks(
+                content, preview=chapter.preview, chapter=chapter, worker=worker
+            )
+
+            return self._complete_chapter(chapter, content_with_results)
+
         except Exception as e:
-            import traceback
-            full_traceback = traceback.format_exc()
-            logger.error(f"Failed to generate chapter {chapter.number}: {e}")
-            logger.error(f"FULL TRACEBACK:\n{full_traceback}")
-            
-            chapter.status = ChapterStatus.ERROR
-            chapter.error_message = str(e)
-            
-            return {
-                'success': False,
-                'chapter': chapter,
-                'error': str(e)
-            }
-    
+            return self._fail_chapter(chapter, e)
+
+    def _draft_context(self, dependencies: List[Chapter]) -> str:
+        """Brouillons générés mais pas encore validés (absents de la mémoire contextuelle) dont dépend un chapitre"""
+        return self._format_drafts(
+            "BROUILLONS DES CHAPITRES DONT DÉPEND CE CHAPITRE (non encore validés)",
+            [
+                (f"CHAPITRE {dependency.number} : {dependency.title} (brouillon)", dependency.content)
+                for dependency in dependencies
+                if dependency.status == ChapterStatus.GENERATED and dependency.content
+            ]
+        )
+
+    @staticmethod
+    def _format_drafts(heading: str, drafts: List[Tuple[str, str]]) -> str:
+        """Bloc de contexte listant des brouillons (graphiques remplacés, texte tronqué)"""
+        import re
+
+        if not drafts:
+            return ""
+
+        text = f"\n\n{heading} :\n"
+        for title, content in drafts:
+            content = re.sub(r'!\[[^\]]*\]\(data:image/[^)]+\)', '[graphique]', content)
+            text += f"""
+─────────────────────────────────────────────
+{title}
+
+{content[:DRAFT_CONTEXT_CHARS]}
+─────────────────────────────────────────────
+"""
+        return text
+
+    # ═══════════════════════════════════════════════════════════════
+    # GÉNÉRATION PAR SECTION
+    # ═══════════════════════════════════════════════════════════════
+
+    def _stream_chapter_sections(self, chapter: Chapter) -> Iterator[Dict]:
+        """Génère le chapitre section par section en arrière-plan, en signalant chaque section terminée"""
+        import queue
+        import threading
+
+        logger.info(f"Generating chapter {chapter.number} by sections: {chapter.title}")
+
+        chapter.status = ChapterStatus.GENERATING
+        chapter.attempts += 1
+        events: "queue.Queue[Dict]" = queue.Queue()
+
+        def section_done(section: Dict):
+            events.put({
+                'type': 'section_done',
+                'index': section['index'],
+                'title': section['title'],
+                'success': section['success'],
+                'cached': section['cached']
+            })
+
+        def generate():
+            try:
+                context = get_context_for_chapter(self.user_id, chapter.number)
+                task_type = self._detect_task_type(chapter)
+                chapter.raw_content, content_with_results = self._generate_chapter_sections(
+                    chapter, context, task_type, on_section=section_done
+                )
+                events.put({'type': 'done', **self._complete_chapter(chapter, content_with_results)})
+            except Exception as e:
+                events.put({'type': 'done', **self._fail_chapter(chapter, e)})
+
+        threading.Thread(target=generate, name="section-generation", daemon=True).start()
+
+        while True:
+            event = events.get()
+            yield event
+            if event['type'] == 'done':
+                return
+
+    def _generate_chapter_sections(self, chapter: Chapter, context: str, task_type: str, worker=0,
+                                   on_section=None, reuse: Dict[int, Dict] = None,
+                                   revise: Dict[int, str] = None) -> Tuple[str, str]:
+        """
+        Génère et exécute chaque section séparément, puis assemble le chapitre (voir chapter_sections)
+        
+        Les sections indépendantes sont générées en parallèle (SECTION_PARALLEL_WORKERS),
+        chacune sur ses propres sandboxes ; une section de synthèse reçoit les
+        sections dont elle dépend en contexte.
+        
+        Args:
+            on_section: Appelé avec le résultat de chaque section terminée
+            reuse: Sections reprises telles quelles (régénération ciblée), par indice
+            revise: Consigne ajoutée au contexte des sections à modifier, par indice
+        
+        Returns:
+            (texte généré, contenu avec résultats) du chapitre assemblé
+        
+        Raises:
+            RuntimeError si une section n'a pas pu être générée (les sections
+            réussies restent en cache pour la tentative suivante)
+        """
+        import os
+
+        max_workers = int(os.getenv("SECTION_PARALLEL_WORKERS", "3"))
+        data_path = self._execution_data_path(self.preview_mode)
+        chapter.preview = data_path != self.csv_path
+        data_hash = dataset_stager.get_file_hash(data_path) + dtype_cache_tag()
+
+        dag = build_section_dag(chapter.sections)
+        sections: Dict[str, Dict] = {}
+        reuse = reuse or {}
+        revise = revise or {}
+
+        def run_section(index: str, slot: int) -> Dict:
+            if int(index) in reuse:
+                section = sections[index] = reuse[int(index)]
+                if on_section:
+                    on_section(section)
+                return section
+
+            # Dépendances numérotées comme dans le chapitre assemblé : la synthèse cite les bons
+            # numéros, et ses propres tableaux et graphiques continuent la numérotation
+            done = [d for d in dag[index] if d in sections and sections[d]['success']]
+            dependency_texts = renumber_references([sections[d]['content'] for d in done], chapter.number)
+            dependencies = [
+                (f"SECTION {chapter.number}.{int(d) + 1} : {sections[d]['title']}", content)
+                for d, content in zip(done, dependency_texts)
+            ]
+            numbering = reference_counts(dependency_texts, chapter.number) if done else None
+            numbering_note = f"""
+    Les tableaux et graphiques ci-dessus sont numérotés comme dans le chapitre : citez-les avec ces numéros.
+    Vos nouveaux résultats continuent la numérotation (Tableau {chapter.number}.{numbering['tableau'] + 1}, Graphique {chapter.number}.{numbering['graphique'] + 1}).
+""" if numbering else ""
+            section = self._generate_section(
+                chapter, int(index),
+                context + self._format_drafts("SECTIONS DÉJÀ RÉDIGÉES DE CE CHAPITRE", dependencies) + numbering_note
+                + revise.get(int(index), ""),
+                task_type, data_hash,
+                worker=worker if slot == 0 else f"{worker}s{slot}",
+                numbering=numbering
+            )
+            sections[index] = section
+            if on_section:
+                on_section(section)
+            return section
+
+        results = run_dag(dag, run_section, max_workers=max_workers)
+
+        chapter.section_results = [sections.get(str(index)) for index in range(len(chapter.sections))]
+        failed = [
+            f"{chapter.number}.{int(index) + 1} ({result if isinstance(result, Exception) else result['error']})"
+            for index, result in results.items()
+            if isinstance(result, Exception) or not result['success']
+        ]
+        if failed:
+            raise RuntimeError(f"Section(s) non générée(s) : {', '.join(sorted(failed))}")
+
+        resolved = {int(index) for index, dependencies in dag.items() if dependencies}
+        raw_content = stitch_sections(chapter.number, chapter.title, [s['raw'] for s in chapter.section_results], resolved)
+        content = stitch_sections(chapter.number, chapter.title, [s['content'] for s in chapter.section_results], resolved)
+        reused = sum(1 for s in chapter.section_results if s['cached'])
+        logger.info(f"Chapter {chapter.number}: {len(chapter.sections)} sections assembled ({reused} from cache)")
+
+        return raw_content, content
+
+    def _generate_section(self, chapter: Chapter, index: int, context: str, task_type: str, data_hash: str,
+                          worker=0, numbering: Optional[Dict[str, int]] = None) -> Dict:
+        """
+        Génère et exécute une section ; si son code échoue, la regénère avec l'erreur en contexte
+        
+        Args:
+            numbering: Numéros déjà attribués dans le chapitre (section de synthèse),
+                voir _execute_code_blocks_with_results
+        
+        Returns:
+            {'index', 'title', 'key', 'raw', 'content', 'success', 'cached', 'attempts', 'error'}
+        """
+        import os
+
+        max_retries = int(os.getenv("SECTION_MAX_RETRIES", "1"))
+        prompt = self._build_chapter_prompt(chapter, context, section_index=index)
+        key = section_cache_key(prompt, task_type, data_hash)
+
+        cached = self._section_cache.get(key)
+        if cached:
+            return {**cached, 'cached': True}
+
+        section = {
+            'index': index, 'title': chapter.sections[index].get('titre', ''), 'key': key,
+            'raw': "", 'content': "", 'success': False, 'cached': False, 'attempts': 0, 'error': None
+        }
+        attempt_prompt = prompt
+
+        for attempt in range(max_retries + 1):
+            section['attempts'] = attempt + 1
+            try:
+                raw = self._generate_with_ai(attempt_prompt, task_type=task_type)
+            except Exception as e:
+                logger.warning(f"Section {chapter.number}.{index + 1} generation failed (attempt {attempt + 1}): {e}")
+                section['error'] = str(e)
+                continue
+
+            content, block_results = self._execute_code_blocks_with_results(
+                raw, preview=chapter.preview, chapter=chapter, worker=worker, numbering=numbering
+            )
+            errors = [result.get('error') or "erreur d'exécution" for result in block_results if not result['success']]
+            section.update(raw=raw, content=content, success=True, error=errors[0] if errors else None)
+
+            if not errors:
+                self._section_cache.set(key, section)
+                break
+
+            logger.warning(f"Section {chapter.number}.{index + 1}: {len(errors)} code block(s) failed (attempt {attempt + 1})")
+            attempt_prompt = prompt + f"""
+
+    [REFRESH] TENTATIVE PRÉCÉDENTE EN ÉCHEC : le code de cette section a produit l'erreur suivante
+    {errors[0][:500]}
+    Corrigez le code (noms de colonnes, types) sans changer l'analyse demandée.
+"""
+
+        return section
+
+    def _prepare_chapter_prompt(self, chapter: Chapter):
+        """Contexte des chapitres précédents, prompt et type de tâche du chapitre"""
+        # 1. Récupérer le contexte des chapitres précédents
+        context = get_context_for_chapter(self.user_id, chapter.number)
+
+        # 2. Construire le prompt pour l'IA (avec instructions de régénération si disponibles)
+        prompt = self._build_chapter_prompt(chapter, context)
+
+        # 3. Déterminer le type de tâche selon le chapitre
+        task_type = self._detect_task_type(chapter)
+        logger.info(f"Detected task type for chapter {chapter.number}: {task_type}")
+
+        return prompt, task_type
+
+    def _complete_chapter(self, chapter: Chapter, content_with_results: str) -> Dict:
+        """Enregistre le contenu généré sur le chapitre"""
+        chapter.content = content_with_results
+        chapter.status = ChapterStatus.GENERATED
+        chapter.generated_at = datetime.now()
+
+        logger.info(f"Chapter {chapter.number} generated successfully ({len(content_with_results)} chars)")
+
+        return {
+            'success': True,
+            'chapter': chapter,
+            'content': content_with_results
+        }
+
+    def _fail_chapter(self, chapter: Chapter, e: Exception) -> Dict:
+        """Marque le chapitre en erreur"""
+        import traceback
+        full_traceback = traceback.format_exc()
+        logger.error(f"Failed to generate chapter {chapter.number}: {e}")
+        logger.error(f"FULL TRACEBACK:\n{full_traceback}")
+
+        chapter.status = ChapterStatus.ERROR
+        chapter.error_message = str(e)
+
+        return {
+            'success': False,
+            'chapter': chapter,
+            'error': str(e)
+        }
+
     def _detect_task_type(self, chapter: Chapter) -> str:
         """
         Détecte le type de tâche selon le numéro et titre du chapitre
@@ -286,10 +788,13 @@ class ReportGenerationWorkflow:
         else:
             return "default"
     
-    def _build_chapter_prompt(self, chapter: Chapter, context: str) -> str:
+    def _build_chapter_prompt(self, chapter: Chapter, context: str, section_index: Optional[int] = None) -> str:
         """
         Construit le prompt pour générer un chapitre
         VERSION ULTRA-ORGANISÉE - Structure hiérarchique claire
+        
+        Args:
+            section_index: Indice de la seule section à rédiger (génération par section)
         """
         
         # ═══════════════════════════════════════════════════════════════
@@ -298,34 +803,26 @@ class ReportGenerationWorkflow:
         
         csv_columns_info = ""
         try:
-            import pandas as pd
-            import os
-            
-            file_extension = os.path.splitext(self.csv_path)[1].lower()
-            
-            if file_extension in ['.xlsx', '.xls']:
-                df_temp = pd.read_excel(self.csv_path)
-                file_type_label = "EXCEL"
-            else:
-                df_temp = pd.read_csv(self.csv_path)
-                file_type_label = "CSV"
-            
-            columns_list = df_temp.columns.tolist()
-            columns_types = df_temp.dtypes.to_dict()
+            # Jeu de données chargé une fois par workflow (schéma mémorisé)
+            schema = self.dataset.schema()
+            examples = self._get_column_examples()
             
             # Construction des infos colonnes
             csv_columns_info = f"""
-    📁 FICHIER {file_type_label} : {len(df_temp)} lignes
+    📁 FICHIER {self.dataset.file_type} : {self.dataset.n_rows} lignes
 
     COLONNES DISPONIBLES (utilisez SEULEMENT celles-ci) :
     """
-            for col in columns_list[:20]:  # Limiter affichage
-                dtype = str(columns_types[col])
-                example = str(df_temp[col].iloc[0]) if len(df_temp) > 0 else "N/A"
-                csv_columns_info += f"  • \"{col}\" ({dtype}, ex: {example})\n"
+            for column in schema[:20]:  # Limiter affichage
+                example = ", ".join(examples.get(column['name']) or [column['example']])
+                csv_columns_info += f"  • \"{column['name']}\" ({column['dtype']}, ex: {example})\n"
+            
+            if len(schema) > 20:
+                csv_columns_info += f"  • ... et {len(schema) - 20} autres colonnes\n"
             
-            if len(columns_list) > 20:
-                csv_columns_info += f"  • ... et {len(columns_list) - 20} autres colonnes\n"
+            # Texte à peu de modalités chargé en category (voir dtype_optimizer)
+            if any(column['dtype'] == 'category' for column in schema):
+                csv_columns_info += "  [!] Colonnes 'category' : faire .astype(str) avant d'y ajouter une nouvelle valeur (fillna, replace, loc)\n"
             
         except Exception as e:
             logger.error(f"Failed to read data: {e}")
@@ -487,17 +984,28 @@ class ReportGenerationWorkflow:
         
         # Ajouter sections à couvrir
         for i, section in enumerate(chapter.sections, 1):
+            if section_index is not None and i != section_index + 1:
+                continue
             prompt += f"""
     {chapter.number}.{i}. {section['titre']}
     Analyses : {', '.join(section['analyses'])}
 
     """
         
+        if section_index is None:
+            format_block = f"""
+    - Structure Markdown (## pour chapitre, ### pour sections)
+    - Commencer par : ## {chapter.number}. {chapter.title}"""
+        else:
+            # Les autres sections sont rédigées séparément puis assemblées (voir chapter_sections)
+            format_block = f"""
+    - Rédigez UNIQUEMENT la section {chapter.number}.{section_index + 1} (pas de titre de chapitre, pas d'autre section)
+    - Commencer par : ### {chapter.number}.{section_index + 1}. {chapter.sections[section_index]['titre']}
+    - Numérotez tableaux et graphiques à partir de {chapter.number}.1 (renumérotés à l'assemblage)"""
+
         prompt += f"""
 
-    📌 FORMAT ATTENDU :
-    - Structure Markdown (## pour chapitre, ### pour sections)
-    - Commencer par : ## {chapter.number}. {chapter.title}
+    📌 FORMAT ATTENDU :{format_block}
     - Ton académique mais accessible
     - Chiffres précis + interprétation
 
@@ -1317,20 +1825,40 @@ import matplotlib.pyplot as plt
     def _get_available_variables(self) -> str:
         """Retourne les variables disponibles dans le fichier"""
         try:
-            import pandas as pd
-            import os
+            columns = self.dataset.columns
             
-            file_extension = os.path.splitext(self.csv_path)[1].lower()
-            
-            if file_extension in ['.xlsx', '.xls']:
-                df_temp = pd.read_excel(self.csv_path)
-            else:
-                df_temp = pd.read_csv(self.csv_path)
-            
-            return ", ".join(df_temp.columns.tolist()[:10]) + ("..." if len(df_temp.columns) > 10 else "")
+            return ", ".join(columns[:10]) + ("..." if len(columns) > 10 else "")
         except:
             return "(colonnes non listées)"
     
+    def _get_column_examples(self) -> Dict[str, List[str]]:
+        """Quelques valeurs distinctes par colonne, tirées de l'échantillon persisté du dataset"""
+        try:
+            sample = get_dataset_sampler().sample(self.csv_path, df=self.dataset.loaded_df())
+            return sample_examples(sample)
+        except Exception as e:
+            logger.warning(f"Dataset sample unavailable for prompt examples: {e}")
+            return {}
+
+    def _execution_data_path(self, preview: bool) -> str:
+        """Fichier chargé comme `df` dans les sandboxes : échantillon en mode aperçu, sinon dataset complet"""
+        if not preview:
+            return self.csv_path
+
+        try:
+            sampler = get_dataset_sampler()
+            sample_path = sampler.sample_path(self.csv_path, df=self.dataset.loaded_df())
+            sample_rows = len(sampler.sample(self.csv_path))
+        except Exception as e:
+            logger.warning(f"Dataset sample unavailable, executing on full data: {e}")
+            return self.csv_path
+
+        # Les sandboxes lisent l'échantillon au format Parquet ; un petit fichier est son propre échantillon
+        if sample_path.suffix != '.parquet' or sample_rows >= self.dataset.n_rows:
+            return self.csv_path
+
+        return str(sample_path)
+
     def _generate_with_ai(self, prompt: str, task_type: str = "default") -> str:
         """
         Génère le contenu avec l'IA (Gemini ou Claude en backup)
@@ -1378,11 +1906,14 @@ import matplotlib.pyplot as plt
             prompt: Le prompt à envoyer
             task_type: Type de tâche ("code", "writing", "analysis", "plan", "default")
         """
-        import google.generativeai as genai
+        model_name = self._get_gemini_model_name(task_type)
+
+        return get_provider("gemini").generate(prompt, model=model_name)
+
+    def _get_gemini_model_name(self, task_type: str = "default") -> str:
+        """Modèle Gemini spécialisé selon le type de tâche"""
         import os
-        
-        genai.configure(api_key=os.getenv("GMINI_API_KEY"))
-        
+
         # Sélection du modèle selon le type de tâche
         model_map = {
             "code": os.getenv("GEMINI_MODEL_CODE", "gemini-2.5-flash"),
@@ -1395,162 +1926,431 @@ import matplotlib.pyplot as plt
         model_name = model_map.get(task_type, model_map["default"])
         
         logger.info(f"Using Gemini model: {model_name} for task: {task_type}")
-        
-        model = genai.GenerativeModel(model_name)
-        
-        response = model.generate_content(prompt)
-        
-        return response.text
-    
+
+        return model_name
+
     def _generate_with_claude(self, prompt: str) -> str:
         """Génère avec Claude (backup si Gemini quota dépassé)"""
+        logger.info("Using Claude API (claude-3-5-sonnet)")
+
+        return get_provider("anthropic").generate(prompt, model="claude-3-5-sonnet-20241022", max_tokens=4000)
+
+    # ═══════════════════════════════════════════════════════════════
+    # GÉNÉRATION EN STREAMING
+    # ═══════════════════════════════════════════════════════════════
+
+    def _stream_with_ai(self, prompt: str, task_type: str = "default") -> Iterator[str]:
+        """
+        Version streaming de _generate_with_ai (mêmes règles de sélection et de fallback)
+
+        Le fallback vers Claude n'est possible que si Gemini échoue avant le
+        premier token : un flux déjà entamé ne peut pas être rejoué.
+        """
         import os
-        
+
+        if os.getenv("USE_CLAUDE", "false").lower() == "true":
+            logger.info("Using Claude API (forced via USE_CLAUDE)")
+            yield from self._stream_with_claude(prompt)
+            return
+
+        started = False
         try:
-            from anthropic import Anthropic
-        except ImportError:
-            raise ImportError("Package 'anthropic' requis. Installez avec: pip install anthropic")
+            for text in self._stream_with_gemini(prompt, task_type=task_type):
+                started = True
+                yield text
+
+        except Exception as e:
+            error_msg = str(e)
+
+            if started or not ("429" in error_msg or "quota" in error_msg.lower()):
+                raise
+
+            logger.warning(f"Gemini quota exceeded, falling back to Claude: {error_msg}")
+
+            try:
+                yield from self._stream_with_claude(prompt)
+            except Exception as claude_error:
+                logger.error(f"Claude also failed: {claude_error}")
+                raise Exception(f"Both Gemini and Claude failed. Gemini: {error_msg}, Claude: {claude_error}")
+
+    def _stream_with_gemini(self, prompt: str, task_type: str = "default") -> Iterator[str]:
+        """Génère avec Gemini en streaming (fragments de texte)"""
+        model_name = self._get_gemini_model_name(task_type)
+
+        yield from get_provider("gemini").stream(prompt, model=model_name)
+
+    def _stream_with_claude(self, prompt: str) -> Iterator[str]:
+        """Génère avec Claude en streaming (fragments de texte)"""
+        logger.info("Using Claude API (claude-3-5-sonnet, streaming)")
+
+        yield from get_provider("anthropic").stream(prompt, model="claude-3-5-sonnet-20241022", max_tokens=4000)
+
+    def _streamed_block_lane(self, codes: List[str], state: Dict) -> int:
+        """
+        Voie du dernier bloc reçu pendant le streaming
+
+        Un groupe de blocs dépendants garde la voie de son premier bloc ; chaque
+        nouveau groupe prend la voie suivante (modulo E2B_PARALLEL_LANES).
+        Si un bloc relie deux groupes déjà répartis, il suit le plus ancien et
+        les blocs de l'autre groupe sont rejoués sur sa voie.
+        """
+        import os
+
+        index = len(codes) - 1
+        group = next(g for g in find_dependency_groups(codes) if index in g)
+        group_lanes = state.setdefault('group_lanes', {})
+
+        if group[0] not in group_lanes:
+            max_lanes = max(1, int(os.getenv("E2B_PARALLEL_LANES", "3")))
+            group_lanes[group[0]] = len(group_lanes) % max_lanes
+
+        return group_lanes[group[0]]
+
+    def _execute_streamed_block(self, codes: List[str], state: Dict, lane_index: int = 0) -> Dict:
+        """
+        Exécute le dernier bloc reçu pendant le streaming
+
+        Les blocs d'une même voie sont exécutés dans l'ordre sur son kernel.
+        Un bloc servi depuis le cache ou exécuté sur une autre voie n'a pas
+        modifié ce kernel : si le bloc en dépend, il est rejoué silencieusement
+        avant pour restaurer l'état.
+
+        Args:
+            codes: Blocs nettoyés reçus jusqu'ici (le dernier est à exécuter)
+            state: État partagé entre les appels d'un même chapitre
+            lane_index: Voie du bloc (voir _streamed_block_lane)
+        """
+        index = len(codes) - 1
+        executed = state.setdefault('executed', {}).setdefault(lane_index, set())
+        group = next(g for g in find_dependency_groups(codes) if index in g)
+
+        cache = get_execution_cache()
+        cache_key = None
+        if cache:
+            cache_key = self._compute_cache_keys(codes, [group], state.get('data_path')).get(index)
+            cached = cache.get(cache_key) if cache_key else None
+            if cached:
+                return cached
+
+        lanes = state.setdefault('lanes', {})
+        if lane_index not in lanes:
+            lanes[lane_index] = self._prepare_execution_lane(lane_index, state.get('data_path'))
+
+        for previous in group:
+            if previous < index and previous not in executed:
+                self._run_code_block(lanes[lane_index], codes[previous])
+                executed.add(previous)
+
+        result = self._run_code_block(lanes[lane_index], codes[index])
+        executed.add(index)
+
+        if cache_key and result['success']:
+            cache.set(cache_key, result)
+
+        return result
+
+    def _execute_code_blocks(self, content: str, preview: bool = False, chapter: Chapter = None, worker: int = 0) -> str:
+        """Exécute les blocs de code Python et remplace chaque bloc par son résultat (voir _execute_code_blocks_with_results)"""
+        return self._execute_code_blocks_with_results(content, preview=preview, chapter=chapter, worker=worker)[0]
+
+    def _execute_code_blocks_with_results(self, content: str, preview: bool = False, chapter: Chapter = None,
+                                          worker: int = 0, numbering: Optional[Dict[str, int]] = None
+                                          ) -> Tuple[str, List[Dict]]:
+        """
+        Exécute les blocs de code Python.
+        Version stabilisée : respecte l'indentation interne des blocs try/if.
         
-        client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        preview=True : exécution sur l'échantillon du dataset (mode aperçu).
+        chapter, worker : chapitre des blocs (défaut : chapitre en cours) et worker
+        du mode brouillons en lot (chaque worker a ses propres sandboxes).
+        numbering : numéros déjà attribués dans le chapitre ({'tableau': n, 'graphique': m}) ;
+        les compteurs des blocs continuent à la suite (synthèse en génération par section).
         
-        logger.info("Using Claude API (claude-3-5-sonnet)")
+        Les blocs sans dépendance de données entre eux sont répartis sur
+        plusieurs sandboxes (E2B_PARALLEL_LANES, 1 = séquentiel) et exécutés
+        en parallèle, puis leurs résultats sont réinsérés dans l'ordre.
+        Les groupes de blocs déjà exécutés à l'identique sont servis depuis
+        le cache de résultats (execution_cache).
         
-        response = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=4000,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
+        Returns:
+            (contenu avec les résultats, résultats des blocs dans l'ordre)
+        """
+        import re
+        import os
+
+        pattern = r'[ \t]*```python\n([\s\S]*?)\n[ \t]*```'
+        matches = list(re.finditer(pattern, content))
+        if not matches: return content, []
+
+        codes = [self._clean_code_block(match.group(1)) for match in matches]
+        groups = find_dependency_groups(codes)
+        results: Dict[int, Dict] = {}
+        data_path = self._execution_data_path(preview)
+
+        # Résultats déjà calculés (chapitre regénéré avec des blocs identiques)
+        cache = get_execution_cache()
+        cache_keys = self._compute_cache_keys(codes, groups, data_path, chapter, numbering) if cache else {}
+        if cache_keys:
+            for group in groups:
+                cached = [cache.get(cache_keys[index]) for index in group]
+                if all(cached):
+                    results.update(zip(group, cached))
+            if results:
+                logger.info(f"{len(results)}/{len(codes)} code blocks served from cache")
+
+        pending_groups = [group for group in groups if group[0] not in results]
+        max_lanes = int(os.getenv("E2B_PARALLEL_LANES", "3"))
+        lanes = assign_lanes(pending_groups, max_lanes=max_lanes)
+
+        if lanes:
+            logger.info(f"Executing {sum(len(lane) for lane in lanes)} code blocks on {len(lanes)} lane(s)")
+            executed = run_lanes(
+                lanes,
+                lambda lane_index: {**self._prepare_execution_lane(lane_index, data_path, chapter, worker),
+                                    'numbering': numbering or {}},
+                lambda lane, index: self._run_code_block(lane, codes[index])
+            )
+            results.update(executed)
+
+            # Seuls les groupes entièrement réussis sont mis en cache
+            if cache_keys:
+                for group in pending_groups:
+                    if all(executed[index]['success'] for index in group):
+                        for index in group:
+                            cache.set(cache_keys[index], executed[index])
+
+        modified_content = content
+        for index in reversed(range(len(matches))):
+            start, end = matches[index].span()
+            result_section = self._format_block_result(results[index])
+            modified_content = modified_content[:start] + result_section + modified_content[end:]
+
+        return modified_content, [results[index] for index in range(len(matches))]
+
+    def _compute_cache_keys(self, codes: List[str], groups: List[List[int]], data_path: str = None,
+                            chapter: Chapter = None, numbering: Optional[Dict[str, int]] = None) -> Dict[int, str]:
+        """
+        Clés de cache des blocs : dataset (et son typage) + code (et blocs dont il dépend) + versions + chapitre
+        
+        Args:
+            data_path: Fichier sur lequel les blocs s'exécutent (défaut : dataset complet)
+            chapter: Chapitre des blocs (défaut : chapitre en cours)
+            numbering: Numéros de départ des compteurs (voir _execute_code_blocks_with_results)
+        
+        Returns:
+            {indice du bloc: clé}, vide si le cache ne peut pas être utilisé
+        """
+        try:
+            dataset_hash = dataset_stager.get_file_hash(data_path or self.csv_path)
+            library_versions = self._get_library_versions()
+        except Exception as e:
+            logger.warning(f"Execution cache disabled for this chapter: {e}")
+            return {}
+
+        if not library_versions:
+            return {}
+
+        context = {
+            'chapitre': str(getattr(chapter or self.get_current_chapter(), 'number', 1)),
+            'typage': dtype_cache_tag()
+        }
+        if numbering:
+            context['numerotation'] = dict(sorted(numbering.items()))
+        keys = {}
+        for group in groups:
+            for position, index in enumerate(group):
+                keys[index] = ExecutionResultCache.make_key(
+                    dataset_hash,
+                    codes[index],
+                    dependency_codes=[codes[i] for i in group[:position]],
+                    library_versions=library_versions,
+                    context=context
+                )
+
+        return keys
+
+    def _get_library_versions(self) -> Dict:
+        """Versions des bibliothèques de la sandbox (une requête par workflow)"""
+        import json
+        from e2b_session_manager import execute_python_code
+
+        if self._library_versions is None:
+            result = execute_python_code(self.user_id, LIBRARY_VERSIONS_CODE)
+            if result['success'] and result.get('output'):
+                self._library_versions = json.loads(result['output'].strip().splitlines()[-1])
+
+        return self._library_versions or {}
+
+    def _clean_code_block(self, raw_code: str) -> str:
+        """Nettoie un bloc de code généré (indentation, lignes toxiques, corrections)"""
+        # --- NETTOYAGE INTELLIGENT DE L'INDENTATION ---
+        lines = raw_code.split('\n')
+        # On retire uniquement l'indentation commune la plus petite (marge Markdown)
+        # sans toucher à l'indentation relative des blocs internes (try/except/if)
+        non_empty_lines = [l for l in lines if l.strip()]
+        if non_empty_lines:
+            margin = min(len(l) - len(l.lstrip()) for l in non_empty_lines)
+            cleaned_lines = [l[margin:] if len(l) >= margin else l.lstrip() for l in lines]
+        else:
+            cleaned_lines = lines
+
+        # Filtrage des lignes toxiques (pd.read_ et config E2B)
+        final_code_lines = []
+        for l in cleaned_lines:
+            if any(x in l for x in ['pd.read_', 'E2B_EVENTS_ADDRESS', 'os.environ']): continue
+            
+            # Remplacer .to_markdown() par .to_string() (tabulate non disponible dans E2B)
+            if '.to_markdown(' in l:
+                l = l.replace('.to_markdown(', '.to_string(')
+                logger.warning(f"Replaced .to_markdown() with .to_string() in line")
+            if 'to_markdown()' in l:
+                l = l.replace('to_markdown()', 'to_string()')
+                logger.warning(f"Replaced to_markdown() with to_string() in line")
+            
+            final_code_lines.append(l)
+        
+        final_code = "\n".join(final_code_lines)
+        
+        # ═══════════════════════════════════════════════════════════
+        # NOUVELLES CORRECTIONS (Patch #3)
+        # ═══════════════════════════════════════════════════════════
+        
+        # Correction 1: Compléter les blocs try vides
+        lines = final_code.split('\n')
+        fixed_lines = []
+        for i, line in enumerate(lines):
+            fixed_lines.append(line)
+            if line.strip().endswith('try:') and i+1 < len(lines):
+                next_line = lines[i+1].strip()
+                if next_line.startswith('except'):
+                    indent = len(line) - len(line.lstrip()) + 4
+                    fixed_lines.append(' ' * indent + 'pass')
+                    logger.warning("Added 'pass' in empty try block")
+        
+        final_code = '\n'.join(fixed_lines)
+        
+        # Correction 2: Remplacer variables non définies par 'df'
+        undefined_vars = ['df_kpi', 'df_clean_n_annee', 'df_filtered', 'df_temp', 'df_analysis', 'df_copy']
+        for var in undefined_vars:
+            if var in final_code and f"{var} =" not in final_code and f"{var}=" not in final_code:
+                logger.warning(f"Variable '{var}' used but not defined - replacing with 'df'")
+                final_code = final_code.replace(var, 'df')
+        
+        # Correction 3: Remplacer paramètres matplotlib abrégés
+        #if 'ha=' in final_code:
+            #final_code = final_code.replace('ha=', 'horizontalalignment=')
+            #logger.warning("Replaced 'ha=' with 'horizontalalignment='")
+       # if 'va=' in final_code:
+           # final_code = final_code.replace('va=', 'verticalalignment=')
+           # logger.warning("Replaced 'va=' with 'verticalalignment='")
+        
+        return final_code
+
+    def _prepare_execution_lane(self, lane_index: int, data_path: str = None, chapter: Chapter = None,
+                                worker: int = 0) -> Dict:
+        """
+        Prépare une voie d'exécution : sandbox dédiée, dataset stagé, kernel préchauffé
         
-        return response.content[0].text
-    def _execute_code_blocks(self, content: str) -> str:
-            """
-            Exécute les blocs de code Python. 
-            Version stabilisée : respecte l'indentation interne des blocs try/if.
-            """
-            import re
-            import os
-            import base64
-            from e2b_session_manager import execute_python_code
-
-            pattern = r'[ \t]*```python\n([\s\S]*?)\n[ \t]*```'
-            matches = list(re.finditer(pattern, content))
-            if not matches: return content
-
-            modified_content = content
-            # Préparation du chargement des données
-            file_extension = os.path.splitext(self.csv_path)[1].lower()
+        La voie 0 utilise la sandbox de l'utilisateur, les suivantes des sandboxes annexes.
+        data_path : fichier chargé comme `df` (défaut : dataset complet, sinon échantillon).
+        chapter : chapitre des blocs (défaut : chapitre en cours).
+        worker : worker du mode brouillons en lot (> 0 : sandboxes propres au worker).
+        """
+        import os
+
+        base_user_id = self.user_id if worker == 0 else f"{self.user_id}::draft{worker}"
+        exec_user_id = base_user_id if lane_index == 0 else f"{base_user_id}::lane{lane_index}"
+
+        # Préparation du chargement des données : upload unique dans la sandbox
+        # (le fichier n'est plus inliné dans chaque bloc)
+        try:
+            sandbox = get_sandbox_for_user(exec_user_id)
+            staged = dataset_stager.stage(sandbox, data_path or self.csv_path)
+            data_loading_code = dataset_stager.build_binding_code(staged)
+        except Exception as e:
+            logger.error(f"Dataset staging failed: {e}")
+            data_loading_code = f"# Erreur : {str(e)}"
+
+        # Mode "warm kernel" : préambule exécuté une fois par session
+        warm_kernel = os.getenv("E2B_WARM_KERNEL", "true").lower() == "true"
+        if warm_kernel:
             try:
-                if file_extension in ['.xlsx', '.xls']:
-                    with open(self.csv_path, 'rb') as f:
-                        file_base64 = base64.b64encode(f.read()).decode('utf-8')
-                    data_loading_code = f"import pandas as pd\nimport io, base64\ndf = pd.read_excel(io.BytesIO(base64.b64decode('{file_base64}')))"
-                else:
-                    with open(self.csv_path, 'r', encoding='utf-8', errors='replace') as f:
-                        csv_text = f.read().replace("'''", '"""')
-                    data_loading_code = f"import pandas as pd\nimport io\ndf = pd.read_csv(io.StringIO('''{csv_text}'''))"
+                warm_kernel_for_user(exec_user_id, KERNEL_PREAMBLE)
             except Exception as e:
-                data_loading_code = f"# Erreur : {str(e)}"
+                logger.warning(f"Kernel warm-up failed, falling back to full preamble: {e}")
+                warm_kernel = False
 
-            for match in reversed(matches):
-                start, end = match.span()
-                raw_code = match.group(1)
-                
-                # --- NETTOYAGE INTELLIGENT DE L'INDENTATION ---
-                lines = raw_code.split('\n')
-                # On retire uniquement l'indentation commune la plus petite (marge Markdown)
-                # sans toucher à l'indentation relative des blocs internes (try/except/if)
-                non_empty_lines = [l for l in lines if l.strip()]
-                if non_empty_lines:
-                    margin = min(len(l) - len(l.lstrip()) for l in non_empty_lines)
-                    cleaned_lines = [l[margin:] if len(l) >= margin else l.lstrip() for l in lines]
-                else:
-                    cleaned_lines = lines
-
-                # Filtrage des lignes toxiques (pd.read_ et config E2B)
-                final_code_lines = []
-                for l in cleaned_lines:
-                    if any(x in l for x in ['pd.read_', 'E2B_EVENTS_ADDRESS', 'os.environ']): continue
-                    
-                    # Remplacer .to_markdown() par .to_string() (tabulate non disponible dans E2B)
-                    if '.to_markdown(' in l:
-                        l = l.replace('.to_markdown(', '.to_string(')
-                        logger.warning(f"Replaced .to_markdown() with .to_string() in line")
-                    if 'to_markdown()' in l:
-                        l = l.replace('to_markdown()', 'to_string()')
-                        logger.warning(f"Replaced to_markdown() with to_string() in line")
-                    
-                    final_code_lines.append(l)
-                
-                final_code = "\n".join(final_code_lines)
-                
-                # ═══════════════════════════════════════════════════════════
-                # NOUVELLES CORRECTIONS (Patch #3)
-                # ═══════════════════════════════════════════════════════════
-                
-                # Correction 1: Compléter les blocs try vides
-                lines = final_code.split('\n')
-                fixed_lines = []
-                for i, line in enumerate(lines):
-                    fixed_lines.append(line)
-                    if line.strip().endswith('try:') and i+1 < len(lines):
-                        next_line = lines[i+1].strip()
-                        if next_line.startswith('except'):
-                            indent = len(line) - len(line.lstrip()) + 4
-                            fixed_lines.append(' ' * indent + 'pass')
-                            logger.warning("Added 'pass' in empty try block")
-                
-                final_code = '\n'.join(fixed_lines)
-                
-                # Correction 2: Remplacer variables non définies par 'df'
-                undefined_vars = ['df_kpi', 'df_clean_n_annee', 'df_filtered', 'df_temp', 'df_analysis', 'df_copy']
-                for var in undefined_vars:
-                    if var in final_code and f"{var} =" not in final_code and f"{var}=" not in final_code:
-                        logger.warning(f"Variable '{var}' used but not defined - replacing with 'df'")
-                        final_code = final_code.replace(var, 'df')
-                
-                # Correction 3: Remplacer paramètres matplotlib abrégés
-                #if 'ha=' in final_code:
-                    #final_code = final_code.replace('ha=', 'horizontalalignment=')
-                    #logger.warning("Replaced 'ha=' with 'horizontalalignment='")
-               # if 'va=' in final_code:
-                   # final_code = final_code.replace('va=', 'verticalalignment=')
-                   # logger.warning("Replaced 'va=' with 'verticalalignment='")
-                
-                full_code = f"""import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
-import io
-{data_loading_code}
+        return {
+            'user_id': exec_user_id,
+            'chapter_number': getattr(chapter or self.get_current_chapter(), 'number', 1),
+            'data_loading_code': data_loading_code,
+            'warm_kernel': warm_kernel,
+            'numbering': {}
+        }
 
-chapitre = {getattr(self.get_current_chapter(), 'number', 1)}
-tableau_counter = 1
-figure_counter = 1
-plt.style.use('seaborn-v0_8-darkgrid')
+    def _run_code_block(self, lane: Dict, final_code: str) -> Dict:
+        """Exécute un bloc nettoyé dans la sandbox de sa voie"""
+        from e2b_session_manager import execute_python_code
+
+        lane = self._ensure_lane_kernel(lane)
+        return execute_python_code(lane['user_id'], self._build_block_code(lane, final_code))
+
+    def _ensure_lane_kernel(self, lane: Dict) -> Dict:
+        """
+        Rejoue le préambule si le kernel de la voie a redémarré depuis sa préparation
+        (worker local relancé après un timeout) ; sans effet si le kernel est chaud
+        """
+        if not lane['warm_kernel']:
+            return lane
+
+        try:
+            warm_kernel_for_user(lane['user_id'], KERNEL_PREAMBLE)
+        except Exception as e:
+            logger.warning(f"Kernel warm-up failed, sending full preamble: {e}")
+            return {**lane, 'warm_kernel': False}
+
+        return lane
 
+    def _build_block_code(self, lane: Dict, final_code: str) -> str:
+        """Code envoyé à la sandbox pour un bloc : chargement des données, compteurs, bloc, affichage"""
+        block_header = f"""{lane['data_loading_code']}
+chapitre = {lane['chapter_number']}
+tableau_counter = {lane['numbering'].get('tableau', 0) + 1}
+figure_counter = {lane['numbering'].get('graphique', 0) + 1}
+"""
+        if lane['warm_kernel']:
+            # Kernel déjà préchauffé : seul le code du bloc est envoyé
+            full_code = f"""plt.close('all')
+{block_header}
 {final_code}
 
 if plt.get_fignums():
     plt.show()
 """
-                result = execute_python_code(self.user_id, full_code)
-                
-                result_section = ""
-                if result['success']:
-                    if result.get('output'):
-                        # Ajout de sauts de ligne pour forcer le rendu Markdown des tableaux
-                        result_section += f"\n\n{self._format_output_as_markdown(result['output'])}\n\n"
-                    if result.get('charts'):
-                        for chart_b64 in result['charts']:
-                            result_section += f"\n![Graphique](data:image/png;base64,{chart_b64})\n"
-                else:
-                    result_section = f"\n> [WARNING] **Erreur d'analyse :** {result.get('error')}\n"
-
-                modified_content = modified_content[:start] + result_section + modified_content[end:]
-                
-            return modified_content
+        else:
+            full_code = f"""{KERNEL_PREAMBLE}
+{block_header}
+{final_code}
+
+if plt.get_fignums():
+    plt.show()
+"""
+        return full_code
+
+    def _format_block_result(self, result: Dict) -> str:
+        """Convertit le résultat d'exécution d'un bloc en Markdown"""
+        result_section = ""
+        if result['success']:
+            if result.get('output'):
+                # Ajout de sauts de ligne pour forcer le rendu Markdown des tableaux
+                result_section += f"\n\n{self._format_output_as_markdown(result['output'])}\n\n"
+            if result.get('charts'):
+                for chart_b64 in result['charts']:
+                    result_section += f"\n![Graphique](data:image/png;base64,{chart_b64})\n"
+        else:
+            result_section = f"\n> [WARNING] **Erreur d'analyse :** {result.get('error')}\n"
+
+        return result_section
         
     def _format_output_as_markdown(self, text: str) -> str:
         """Convertit les sorties texte en Markdown formaté avec tableaux professionnels"""
@@ -1624,6 +2424,12 @@ if plt.get_fignums():
             logger.warning(f"Cannot validate chapter {chapter_number}: status is {chapter.status}")
             return False
         
+        if chapter.preview and chapter.raw_content:
+            # Rédigé sur l'échantillon : résultats définitifs calculés sur les données complètes
+            logger.info(f"Chapter {chapter_number} validated in preview mode, executing on full data")
+            chapter.content = self._execute_code_blocks(chapter.raw_content, chapter=chapter)
+            chapter.preview = False
+        
         chapter.status = ChapterStatus.VALIDATED
         chapter.validated_at = datetime.now()
         
@@ -1662,6 +2468,107 @@ if plt.get_fignums():
         
         return True
     
+    def revise_chapter(self, chapter_number: str, instructions: Dict) -> Dict:
+        """
+        Régénération ciblée d'un chapitre généré (en attente de validation)
+        
+        Seules les sections visées par la demande sont regénérées (voir
+        chapter_sections.affected_sections) ; les autres sont reprises avec leur
+        texte et leurs résultats. Si aucune section n'est identifiée, tout le
+        chapitre est regénéré avec les instructions. Le chapitre révisé n'est
+        pas forcément le chapitre en cours (brouillons en lot).
+        
+        Args:
+            instructions: {'request': str, 'keep_structure': bool, 'keep_code': bool,
+                           'sections': [numéros "n.k"] optionnel (sinon détection dans la demande)}
+        
+        Returns:
+            Même format que generate_current_chapter, plus
+            'regenerated' / 'reused' (numéros de sections) et 'reuse_ratio'
+        """
+        chapter = self._find_chapter(chapter_number)
+
+        if not chapter or chapter.status != ChapterStatus.GENERATED:
+            return {'success': False, 'chapter': chapter, 'error': f"Chapitre {chapter_number} non généré"}
+
+        chapter.regeneration_instructions = instructions
+
+        titles = [section.get('titre', '') for section in chapter.sections]
+        previous = self._previous_sections(chapter)
+        if previous is None:
+            # Découpage impossible (chapitre sans sections) : régénération complète
+            logger.info(f"Chapter {chapter_number}: sections not found, regenerating the whole chapter")
+            return {**self._generate_draft(chapter, [], 0), 'regenerated': [], 'reused': [], 'reuse_ratio': 0.0}
+
+        if instructions.get('sections'):
+            targets = sorted(
+                int(str(number).split('.')[-1]) - 1 for number in instructions['sections']
+                if 0 < int(str(number).split('.')[-1]) <= len(titles)
+            )
+        else:
+            targets = affected_sections(instructions.get('request', ''), chapter.number, titles,
+                                        [section['content'] for section in previous])
+        targets = targets or list(range(len(titles)))
+
+        revise = {
+            index: f"""
+
+    VERSION ACTUELLE DE LA SECTION {chapter.number}.{index + 1} (à modifier selon la demande) :
+{previous[index]['raw']}
+    {"Conservez les blocs de code à l'identique (résultats réutilisés), modifiez seulement le texte." if instructions.get('keep_code') else ""}
+"""
+            for index in targets
+        }
+        reuse = {index: {**section, 'cached': True} for index, section in enumerate(previous) if index not in targets}
+
+        logger.info(
+            f"Chapter {chapter_number}: revising sections {[index + 1 for index in targets]}, "
+            f"reusing {len(reuse)}/{len(titles)}"
+        )
+
+        chapter.status = ChapterStatus.GENERATING
+        chapter.attempts += 1
+
+        try:
+            context = get_context_for_chapter(self.user_id, chapter.number)
+            task_type = self._detect_task_type(chapter)
+            chapter.raw_content, content_with_results = self._generate_chapter_sections(
+                chapter, context, task_type, reuse=reuse, revise=revise
+            )
+            result = self._complete_chapter(chapter, content_with_results)
+        except Exception as e:
+            result = self._fail_chapter(chapter, e)
+
+        return {
+            **result,
+            'regenerated': [f"{chapter.number}.{index + 1}" for index in targets],
+            'reused': [f"{chapter.number}.{index + 1}" for index in sorted(reuse)],
+            'reuse_ratio': len(reuse) / len(titles)
+        }
+
+    def _previous_sections(self, chapter: Chapter) -> Optional[List[Dict]]:
+        """Sections du chapitre généré (génération par section, sinon découpage du texte), ou None"""
+        if not chapter.sections:
+            return None
+
+        if len(chapter.section_results) == len(chapter.sections) and all(
+            section and section['success'] for section in chapter.section_results
+        ):
+            return [dict(section) for section in chapter.section_results]
+
+        raws = split_sections(chapter.raw_content, chapter.number, len(chapter.sections))
+        contents = split_sections(chapter.content, chapter.number, len(chapter.sections))
+        if raws is None or contents is None:
+            return None
+
+        return [
+            {
+                'index': index, 'title': section.get('titre', ''), 'key': None, 'raw': raw, 'content': content,
+                'success': True, 'cached': True, 'attempts': 0, 'error': None
+            }
+            for index, (section, raw, content) in enumerate(zip(chapter.sections, raws, contents))
+        ]
+
     def _find_chapter(self, chapter_number: str) -> Optional[Chapter]:
         """Trouve un chapitre par son numéro"""
         for chapter in self.chapters:
@@ -1770,7 +2677,8 @@ if plt.get_fignums():
 # FONCTIONS POUR STREAMLIT
 # ============================================
 
-def initialize_workflow(user_id: str, plan: Dict, csv_path: str, cost_controller=None, study_context=None) -> ReportGenerationWorkflow:
+def initialize_workflow(user_id: str, plan: Dict, csv_path: str, cost_controller=None, study_context=None, dataframe=None,
+                        preview_mode: Optional[bool] = None) -> ReportGenerationWorkflow:
     """
     Initialise un workflow de génération
     
@@ -1780,6 +2688,8 @@ def initialize_workflow(user_id: str, plan: Dict, csv_path: str, cost_controller
         csv_path: Chemin vers le fichier CSV/Excel
         cost_controller: (Optionnel) Contrôleur de coûts
         study_context: (Optionnel) Contexte de l'étude
+        dataframe: (Optionnel) DataFrame déjà chargé depuis csv_path (évite un nouveau parsing)
+        preview_mode: (Optionnel) Exécuter les blocs sur l'échantillon jusqu'à la validation (défaut PREVIEW_EXECUTION)
     
     Usage dans Streamlit:
         if 'workflow' not in st.session_state:
@@ -1791,7 +2701,7 @@ def initialize_workflow(user_id: str, plan: Dict, csv_path: str, cost_controller
                 study_context=st.session_state.study_context
             )
     """
-    return ReportGenerationWorkflow(user_id, plan, csv_path, cost_controller, study_context)
+    return ReportGenerationWorkflow(user_id, plan, csv_path, cost_controller, study_context, dataframe, preview_mode)
 
 
 def display_workflow_progress(workflow: ReportGenerationWorkflow):
@@ -1885,4 +2795,4 @@ if __name__ == "__main__":
     print("   [OK] Interprétations obligatoires après chaque élément visuel")
     print("   [OK] Références correctes (tableau vs graphique)")
     print("   [OK] Support Excel + CSV")
-    print("   [OK] Gestion apostrophes dans noms de colonnes")
\ No newline at end of file
+    print("   [OK] Gestion apostrophes dans noms de colonnes")
\ No newline at end of file
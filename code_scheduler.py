@@ -0,0 +1,178 @@
+"""
+Ordonnanceur des blocs de code d'un chapitre
+Détecte les blocs sans dépendance de données entre eux et les répartit sur
+plusieurs "voies" (une sandbox par voie) exécutées en parallèle.
+
+Un bloc B dépend d'un bloc A (A avant B) si B lit une variable que A définit.
+Les noms fournis par le préambule (df, pd, plt, ...) ne créent pas de dépendance :
+chaque bloc reçoit sa propre copie de `df`.
+"""
+
+import ast
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Noms redéfinis en tête de chaque bloc (préambule + en-tête de bloc)
+PREAMBLE_NAMES = {
+    'df', 'pd', 'plt', 'sns', 'np', 'io',
+    'chapitre', 'tableau_counter', 'figure_counter',
+    '_dataset_df', '_datasets',
+}
+
+
+def analyze_block_names(code: str) -> Tuple[Set[str], Set[str]]:
+    """
+    Analyse les noms d'un bloc de code
+
+    Args:
+        code: Code Python du bloc
+
+    Returns:
+        (noms définis au niveau module, noms lus avant d'être définis dans le bloc)
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        # Le bloc échouera de toute façon : aucune dépendance
+        return set(), set()
+
+    first_store: Dict[str, Tuple[int, int]] = {}
+    local_names: Set[str] = set()  # arguments, variables de compréhension
+    loads: List[Tuple[str, Tuple[int, int]]] = []
+
+    for node in ast.walk(tree):
+        position = (getattr(node, 'lineno', 0), getattr(node, 'col_offset', 0))
+
+        if isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Load):
+                loads.append((node.id, position))
+            else:
+                if node.id not in first_store or position < first_store[node.id]:
+                    first_store[node.id] = position
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            first_store.setdefault(node.name, position)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                name = alias.asname or alias.name.split('.')[0]
+                first_store.setdefault(name, position)
+        elif isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name):
+            # `x += 1` lit x avant de l'écrire
+            loads.append((node.target.id, (position[0], position[1] - 1)))
+        elif isinstance(node, ast.arg):
+            local_names.add(node.arg)
+        elif isinstance(node, ast.comprehension):
+            for target in ast.walk(node.target):
+                if isinstance(target, ast.Name):
+                    local_names.add(target.id)
+
+    defined = {name for name in first_store if name not in local_names}
+
+    free = set()
+    for name, position in loads:
+        if name in local_names:
+            continue
+        if name not in first_store or position < first_store[name]:
+            free.add(name)
+
+    return defined - PREAMBLE_NAMES, free - PREAMBLE_NAMES
+
+
+def find_dependency_groups(codes: List[str]) -> List[List[int]]:
+    """
+    Regroupe les blocs liés par des dépendances de données
+
+    Args:
+        codes: Codes des blocs, dans l'ordre du chapitre
+
+    Returns:
+        Groupes d'indices (triés), dans l'ordre de leur premier bloc
+    """
+    # Union-find sur les dépendances
+    parent = list(range(len(codes)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    names = [analyze_block_names(code) for code in codes]
+
+    for j, (_, free_j) in enumerate(names):
+        for i in range(j):
+            if free_j & names[i][0]:
+                parent[find(j)] = find(i)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(codes)):
+        groups.setdefault(find(i), []).append(i)
+
+    return list(groups.values())
+
+
+def assign_lanes(groups: List[List[int]], max_lanes: int = 3) -> List[List[int]]:
+    """
+    Répartit des groupes de blocs sur au plus `max_lanes` voies
+
+    Répartition gloutonne : les plus gros groupes d'abord, sur la voie la moins chargée.
+    """
+    if not groups:
+        return []
+
+    lanes: List[List[int]] = [[] for _ in range(max(1, min(max_lanes, len(groups))))]
+    for group in sorted(groups, key=len, reverse=True):
+        min(lanes, key=len).extend(group)
+
+    return [sorted(lane) for lane in lanes if lane]
+
+
+def plan_block_lanes(codes: List[str], max_lanes: int = 3) -> List[List[int]]:
+    """
+    Répartit les blocs en voies d'exécution indépendantes
+
+    Les blocs liés par une dépendance restent sur la même voie (dans l'ordre du
+    chapitre) ; les groupes indépendants sont répartis sur au plus `max_lanes` voies.
+
+    Args:
+        codes: Codes des blocs, dans l'ordre du chapitre
+        max_lanes: Nombre maximal de voies (1 = exécution séquentielle)
+
+    Returns:
+        Liste de voies, chacune étant une liste d'indices de blocs triés
+    """
+    return assign_lanes(find_dependency_groups(codes), max_lanes)
+
+
+def run_lanes(
+    lanes: List[List[int]],
+    prepare_lane: Callable[[int], Dict],
+    run_block: Callable[[Dict, int], Dict]
+) -> Dict[int, Dict]:
+    """
+    Exécute les voies en parallèle (blocs séquentiels au sein d'une voie)
+
+    Args:
+        lanes: Voies issues de plan_block_lanes
+        prepare_lane: Prépare le contexte d'une voie (sandbox, dataset) à partir de son indice
+        run_block: Exécute un bloc dans le contexte de sa voie
+
+    Returns:
+        {indice du bloc: résultat}
+    """
+    def run_lane(lane_index: int) -> Dict[int, Dict]:
+        lane_context = prepare_lane(lane_index)
+        return {index: run_block(lane_context, index) for index in lanes[lane_index]}
+
+    if len(lanes) <= 1:
+        return run_lane(0) if lanes else {}
+
+    results: Dict[int, Dict] = {}
+    with ThreadPoolExecutor(max_workers=len(lanes), thread_name_prefix="code-lane") as executor:
+        for lane_results in executor.map(run_lane, range(len(lanes))):
+            results.update(lane_results)
+
+    return results
@@ -0,0 +1,255 @@
+"""
+Cache colonnaire (Parquet) des jeux de données
+Le CSV/Excel uploadé est converti UNE fois en Parquet, adressé par le hash de
+son contenu ; toutes les lectures suivantes (profilage, prompts, sandbox)
+chargent ce fichier colonnaire, typé, plus rapide à lire et plus léger à
+transférer. L'encodage du fichier source est conservé dans les métadonnées.
+Les copies gardent le typage du chargement : leur nom porte le suffixe de
+typage (voir dtype_optimizer.dtype_cache_tag).
+
+Une copie Arrow IPC non compressée est écrite à côté : elle est ouverte en
+mémoire partagée (memory map) par tous les lecteurs du processus et par les
+workers locaux. Les colonnes numériques restent des vues sur le fichier
+mappé ; N lecteurs d'un dataset de 1 Go ne font pas N copies en RAM.
+
+pyarrow est optionnel : sans lui, les lecteurs retombent sur le fichier source.
+
+Configuration :
+    COLUMNAR_CACHE_ENABLED  true/false (défaut true)
+    COLUMNAR_CACHE_DIR      Dossier du cache (défaut cache/datasets)
+    COLUMNAR_MMAP_ENABLED   true/false (défaut true) : lecture via Arrow IPC mappé
+    COLUMNAR_SHARED_MAX     Datasets mappés gardés ouverts dans le processus (défaut 8)
+"""
+
+import os
+import threading
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from dataset_staging import dataset_stager
+from dtype_optimizer import dtype_cache_tag
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    logger.warning("pyarrow not available - columnar dataset cache disabled")
+
+
+# Clé des métadonnées Parquet contenant l'encodage du fichier source
+ENCODING_METADATA_KEY = b'source_encoding'
+
+# pandas >= 3 : copy-on-write, une copie superficielle isole chaque lecteur
+COPY_ON_WRITE = int(pd.__version__.split('.')[0]) >= 3
+
+
+class ColumnarDatasetCache:
+    """Fichiers Parquet adressés par le hash du fichier source"""
+
+    def __init__(self, cache_dir: str = "cache/datasets", max_shared: int = 8):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_shared = max_shared
+        self.lock = threading.Lock()
+        self._shared: "OrderedDict[str, Tuple[pd.DataFrame, str]]" = OrderedDict()  # hash+typage -> (frame mappé, encodage)
+
+    def path_for(self, file_hash: str) -> Path:
+        """Chemin du Parquet correspondant à un contenu (et au typage courant)"""
+        return self.cache_dir / f"{file_hash}{dtype_cache_tag()}.parquet"
+
+    def ipc_path_for(self, file_hash: str) -> Path:
+        """Chemin de la copie Arrow IPC (mappable) correspondant à un contenu (et au typage courant)"""
+        return self.cache_dir / f"{file_hash}{dtype_cache_tag()}.arrow"
+
+    def lookup(self, file_path: str) -> Optional[str]:
+        """Chemin du Parquet du fichier s'il a déjà été converti, sinon None"""
+        path = self.path_for(dataset_stager.get_file_hash(file_path))
+        return str(path) if path.exists() else None
+
+    def load(self, file_path: str) -> Optional[Tuple[pd.DataFrame, str]]:
+        """
+        Charge la version colonnaire du fichier
+
+        Returns:
+            (DataFrame, encodage du fichier source), ou None si absente
+        """
+        path = self.lookup(file_path)
+        if not path:
+            return None
+
+        try:
+            table = pq.read_table(path)
+        except Exception as e:
+            logger.warning(f"Unreadable columnar cache entry {path}: {e}")
+            return None
+
+        metadata = table.schema.metadata or {}
+        encoding = metadata.get(ENCODING_METADATA_KEY, b'unknown').decode()
+
+        return table.to_pandas(), encoding
+
+    def store(self, file_path: str, df: pd.DataFrame, encoding: str = 'unknown') -> Optional[str]:
+        """
+        Enregistre la version colonnaire d'un fichier déjà parsé
+
+        Returns:
+            Chemin du Parquet, ou None si le DataFrame n'est pas convertible
+            (noms de colonnes non textuels, colonnes de types mélangés...)
+        """
+        file_hash = dataset_stager.get_file_hash(file_path)
+        path = self.path_for(file_hash)
+        if path.exists():
+            return str(path)
+
+        if not all(isinstance(col, str) for col in df.columns):
+            logger.info(f"Columnar cache skipped for {file_path}: non-string column names")
+            return None
+
+        tmp_path = path.with_name(f"{path.name}.tmp{threading.get_ident()}")
+
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            metadata = dict(table.schema.metadata or {})
+            metadata[ENCODING_METADATA_KEY] = encoding.encode()
+            table = table.replace_schema_metadata(metadata)
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, path)
+
+        except Exception as e:
+            logger.warning(f"Columnar conversion failed for {file_path}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return None
+
+        try:
+            self._write_ipc(table, self.ipc_path_for(file_hash))
+        except Exception as e:
+            logger.warning(f"Arrow IPC copy failed for {file_path}: {e}")
+
+        logger.info(f"Columnar copy stored: {path} ({path.stat().st_size} bytes)")
+        return str(path)
+
+    # ═══════════════════════════════════════════════════════════════
+    # PARTAGE EN MÉMOIRE (ARROW IPC MAPPÉ)
+    # ═══════════════════════════════════════════════════════════════
+
+    @staticmethod
+    def _write_ipc(table, ipc_path: Path):
+        """Écrit une table en Arrow IPC non compressé (lisible sans copie via memory map)"""
+        tmp_path = ipc_path.with_name(f"{ipc_path.name}.tmp{threading.get_ident()}")
+        try:
+            with pa.OSFile(str(tmp_path), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, ipc_path)
+        except Exception:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def ipc_lookup(self, file_path: str) -> Optional[str]:
+        """
+        Chemin de la copie Arrow IPC du fichier (créée depuis le Parquet si besoin)
+
+        Returns:
+            Chemin, ou None si le fichier n'a pas encore été converti
+        """
+        file_hash = dataset_stager.get_file_hash(file_path)
+        ipc_path = self.ipc_path_for(file_hash)
+        if ipc_path.exists():
+            return str(ipc_path)
+
+        parquet_path = self.path_for(file_hash)
+        if not parquet_path.exists():
+            return None
+
+        try:
+            self._write_ipc(pq.read_table(parquet_path), ipc_path)
+        except Exception as e:
+            logger.warning(f"Arrow IPC conversion failed for {file_path}: {e}")
+            return None
+
+        return str(ipc_path)
+
+    @staticmethod
+    def read_ipc(ipc_path: str) -> Tuple[pd.DataFrame, str]:
+        """
+        Ouvre un fichier Arrow IPC en memory map
+
+        Les colonnes numériques sans valeur manquante sont des vues en lecture
+        seule sur le fichier mappé (aucune copie) ; les pages sont partagées
+        par le cache système entre tous les processus qui l'ouvrent.
+        """
+        table = pa.ipc.open_file(pa.memory_map(ipc_path, 'r')).read_all()
+        metadata = table.schema.metadata or {}
+        encoding = metadata.get(ENCODING_METADATA_KEY, b'unknown').decode()
+
+        return table.to_pandas(split_blocks=True), encoding
+
+    def open_shared(self, file_path: str) -> Optional[Tuple[pd.DataFrame, str]]:
+        """
+        DataFrame partagé du fichier pour ce processus
+
+        pandas >= 3 : tous les appelants reçoivent une copie superficielle du
+        même frame mappé ; les données ne sont pas dupliquées, et grâce au
+        copy-on-write une modification faite par un lecteur reste invisible
+        pour les autres. Avant pandas 3, les vues mappées sont en lecture
+        seule : chaque appelant reçoit une copie complète, modifiable.
+
+        Returns:
+            (DataFrame, encodage du fichier source), ou None si pas de copie colonnaire
+        """
+        shared_key = dataset_stager.get_file_hash(file_path) + dtype_cache_tag()
+
+        with self.lock:
+            shared = self._shared.get(shared_key)
+            if shared is not None:
+                self._shared.move_to_end(shared_key)
+                return shared[0].copy(deep=not COPY_ON_WRITE), shared[1]
+
+        ipc_path = self.ipc_lookup(file_path)
+        if not ipc_path:
+            return None
+
+        try:
+            shared = self.read_ipc(ipc_path)
+        except Exception as e:
+            logger.warning(f"Unreadable Arrow IPC entry {ipc_path}: {e}")
+            return None
+
+        with self.lock:
+            shared = self._shared.setdefault(shared_key, shared)
+            while len(self._shared) > self.max_shared:
+                self._shared.popitem(last=False)
+
+        return shared[0].copy(deep=not COPY_ON_WRITE), shared[1]
+
+
+def mmap_enabled() -> bool:
+    """True si les lecteurs doivent passer par la copie Arrow IPC mappée"""
+    return os.getenv("COLUMNAR_MMAP_ENABLED", "true").lower() == "true"
+
+
+_columnar_cache = None
+
+
+def get_columnar_cache() -> Optional[ColumnarDatasetCache]:
+    """Instance globale du cache (None si désactivé ou si pyarrow est absent)"""
+    global _columnar_cache
+
+    if not PYARROW_AVAILABLE or os.getenv("COLUMNAR_CACHE_ENABLED", "true").lower() != "true":
+        return None
+
+    if _columnar_cache is None:
+        _columnar_cache = ColumnarDatasetCache(
+            cache_dir=os.getenv("COLUMNAR_CACHE_DIR", "cache/datasets"),
+            max_shared=int(os.getenv("COLUMNAR_SHARED_MAX", "8"))
+        )
+
+    return _columnar_cache
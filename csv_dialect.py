@@ -0,0 +1,164 @@
+"""
+Détection rapide de l'encodage et du séparateur des CSV
+Un échantillon d'octets (64 Ko) est inspecté UNE fois par contenu de fichier :
+BOM, décodage UTF-8, octets propres à Windows-1252, puis csv.Sniffer pour le
+séparateur et repérage de la virgule décimale. Le résultat est mémorisé par
+hash du fichier et passé explicitement à tous les lecteurs (parsing local,
+profilage par blocs, sandboxes) : plus de parsing complet raté avec chaque
+encodage candidat.
+"""
+
+import re
+import csv
+import codecs
+import threading
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+# Taille de l'échantillon inspecté
+SNIFF_BYTES = 64 * 1024
+
+# Séparateurs acceptés
+DELIMITERS = ',;\t|'
+
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# Octets 0x80-0x9F : caractères imprimables en Windows-1252 (€, œ, ’...), contrôles en latin-1
+WINDOWS_1252_BYTES = re.compile(rb'[\x80-\x9f]')
+
+DECIMAL_COMMA = re.compile(r'^\s*-?\d+,\d+\s*$')
+DECIMAL_POINT = re.compile(r'^\s*-?\d+\.\d+\s*$')
+
+DEFAULT_DIALECT = {'encoding': 'utf-8', 'sep': ',', 'decimal': '.'}
+
+
+def detect_encoding(sample: bytes) -> str:
+    """Encodage d'un échantillon d'octets (BOM, puis UTF-8, puis Windows-1252 / latin-1)"""
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+
+    try:
+        # final=False : un caractère coupé en fin d'échantillon n'est pas une erreur
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    if WINDOWS_1252_BYTES.search(sample):
+        try:
+            sample.decode('windows-1252')
+            return 'windows-1252'
+        except UnicodeDecodeError:
+            pass
+
+    return 'latin-1'
+
+
+def detect_delimiter(text: str) -> str:
+    """Séparateur des lignes complètes de l'échantillon (',' par défaut)"""
+    try:
+        return csv.Sniffer().sniff(text, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        return ','
+
+
+def detect_decimal(text: str, sep: str) -> str:
+    """',' si les nombres de l'échantillon s'écrivent avec une virgule décimale"""
+    if sep == ',':
+        return '.'
+
+    commas = points = 0
+    for row in csv.reader(text.splitlines(), delimiter=sep):
+        for field in row:
+            if DECIMAL_COMMA.match(field):
+                commas += 1
+            elif DECIMAL_POINT.match(field):
+                points += 1
+
+    return ',' if commas > points else '.'
+
+
+def sniff_csv(file_path: str, sample_size: int = SNIFF_BYTES) -> Dict[str, str]:
+    """
+    Inspecte le début d'un CSV
+
+    Returns:
+        {'encoding': str, 'sep': str, 'decimal': str} (paramètres de pd.read_csv)
+    """
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_size)
+        truncated = bool(f.read(1))
+
+    encoding = detect_encoding(sample)
+    text = codecs.getincrementaldecoder(encoding)(errors='replace').decode(sample, final=not truncated)
+
+    # Dernière ligne probablement coupée par l'échantillon
+    lines = text.splitlines()
+    if truncated and len(lines) > 1:
+        lines = lines[:-1]
+    text = "\n".join(lines)
+
+    sep = detect_delimiter(text)
+    dialect = {'encoding': encoding, 'sep': sep, 'decimal': detect_decimal(text, sep)}
+
+    logger.info(f"CSV dialect of {file_path}: {dialect}")
+    return dialect
+
+
+class CsvDialectRegistry:
+    """Dialecte détecté une fois par contenu de fichier (hash)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._dialects: Dict[str, Dict[str, str]] = {}
+
+    def get(self, file_path: str) -> Dict[str, str]:
+        from dataset_staging import dataset_stager
+
+        file_hash = dataset_stager.get_file_hash(file_path)
+
+        with self.lock:
+            dialect = self._dialects.get(file_hash)
+        if dialect is None:
+            dialect = sniff_csv(file_path)
+            with self.lock:
+                self._dialects[file_hash] = dialect
+
+        return dict(dialect)
+
+    def set(self, file_path: str, dialect: Dict[str, str]):
+        """Corrige le dialecte mémorisé (ex: encodage invalide au-delà de l'échantillon)"""
+        from dataset_staging import dataset_stager
+
+        with self.lock:
+            self._dialects[dataset_stager.get_file_hash(file_path)] = dict(dialect)
+
+
+# Instance globale
+csv_dialects = CsvDialectRegistry()
+
+
+def get_csv_dialect(file_path: str) -> Dict[str, str]:
+    """Helper function : dialecte du CSV (détecté au premier appel)"""
+    return csv_dialects.get(file_path)
+
+
+def read_csv_call(path: str, dialect: Dict[str, str], **extra) -> str:
+    """
+    Code `pd.read_csv(...)` avec les paramètres explicites du dialecte
+
+    Pour les scripts exécutés en sandbox, qui n'ont pas accès au fichier d'origine.
+    """
+    options = {**dialect, **extra}
+    arguments = "".join(f", {key}={value!r}" for key, value in options.items())
+    return f"pd.read_csv({path!r}{arguments})"
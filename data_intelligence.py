@@ -7,85 +7,92 @@ import pandas as pd
 from typing import Dict, List, Tuple
 import logging
 
+from data_profiler import profile_dataframe
+
 logger = logging.getLogger(__name__)
 
 
 class DataIntelligence:
     """Analyse intelligente des données pour guider la génération"""
     
-    def __init__(self, df: pd.DataFrame):
+    def __init__(self, df: pd.DataFrame, profile=None):
+        """
+        Args:
+            df: Données à analyser
+            profile: DataProfile déjà calculé pour ce DataFrame (sinon calculé ici)
+        """
         self.df = df
+        self.profile = profile or profile_dataframe(df)
         self.analysis = self._analyze()
     
     def _analyze(self) -> Dict:
         """Analyse complète du DataFrame"""
+        numeric_vars = self._detect_numeric_vars()
+        categorical_vars = self._detect_categorical_vars()
+        
         return {
             'shape': self.df.shape,
-            'numeric_vars': self._detect_numeric_vars(),
-            'categorical_vars': self._detect_categorical_vars(),
+            'numeric_vars': numeric_vars,
+            'categorical_vars': categorical_vars,
             'encoded_vars': self._detect_encoded_vars(),
-            'recommended_vars': self._recommend_variables(),
+            'recommended_vars': self._recommend_variables(numeric_vars=numeric_vars, categorical_vars=categorical_vars),
             'quality_issues': self._detect_quality_issues()
         }
     
     def _detect_numeric_vars(self) -> List[Dict]:
         """Détecte variables numériques réelles (non encodées)"""
-        numeric_cols = self.df.select_dtypes(include=['number']).columns
-        
         result = []
-        for col in numeric_cols:
-            unique_count = self.df[col].nunique()
+        for col in self.profile.numeric_columns:
+            unique_count = self.profile.unique_counts[col]
             
             # Si > 10 valeurs uniques → probablement continue
             if unique_count > 10:
+                stats = self.profile.numeric_stats[col]
                 result.append({
                     'name': col,
                     'type': 'continuous',
                     'unique_count': unique_count,
-                    'min': float(self.df[col].min()),
-                    'max': float(self.df[col].max()),
-                    'mean': float(self.df[col].mean()),
-                    'std': float(self.df[col].std())
+                    'min': float(stats['min']),
+                    'max': float(stats['max']),
+                    'mean': float(stats['mean']),
+                    'std': float(stats['std'])
                 })
         
         return result
     
     def _detect_categorical_vars(self) -> List[Dict]:
         """Détecte variables catégorielles"""
-        cat_cols = self.df.select_dtypes(include=['object', 'category']).columns
-        
         result = []
-        for col in cat_cols:
-            unique_count = self.df[col].nunique()
+        for col in self.profile.categorical_columns:
+            unique_count = self.profile.unique_counts[col]
             
             # Limiter à 50 modalités pour éviter explosion
             if unique_count <= 50:
                 result.append({
                     'name': col,
                     'unique_count': unique_count,
-                    'top_values': self.df[col].value_counts().head(10).to_dict()
+                    'top_values': self.profile.top_values(col).to_dict()
                 })
         
         return result
     
     def _detect_encoded_vars(self) -> List[Dict]:
         """Détecte variables encodées (numériques mais catégorielles)"""
-        numeric_cols = self.df.select_dtypes(include=['number']).columns
-        
         result = []
-        for col in numeric_cols:
-            unique_count = self.df[col].nunique()
+        for col in self.profile.numeric_columns:
+            unique_count = self.profile.unique_counts[col]
             
             # Si < 10 valeurs uniques → probablement encodée
             if unique_count < 10:
-                values = sorted(self.df[col].unique())
+                distribution = self.profile.distribution(col)
+                values = sorted(distribution.index)
                 labels = self._guess_labels(col, values)
                 
                 result.append({
                     'name': col,
                     'values': values,
                     'suggested_labels': labels,
-                    'distribution': self.df[col].value_counts().to_dict()
+                    'distribution': distribution.to_dict()
                 })
         
         return result
@@ -122,18 +129,19 @@ class DataIntelligence:
         # Par défaut : Tranche 1, 2, 3...
         return [f"Tranche {int(v)}" for v in values]
     
-    def _recommend_variables(self, max_vars: int = 10) -> Dict:
+    def _recommend_variables(self, max_vars: int = 10, numeric_vars: List[Dict] = None,
+                             categorical_vars: List[Dict] = None) -> Dict:
         """Recommande les variables les plus pertinentes à analyser"""
         # Exclure colonnes inutiles
         exclude_keywords = ['id', 'index', 'unnamed', 'key', 'code', 'numero']
         
         numeric_relevant = [
-            v for v in self._detect_numeric_vars()
+            v for v in (numeric_vars if numeric_vars is not None else self._detect_numeric_vars())
             if not any(kw in v['name'].lower() for kw in exclude_keywords)
         ]
         
         categorical_relevant = [
-            v for v in self._detect_categorical_vars()
+            v for v in (categorical_vars if categorical_vars is not None else self._detect_categorical_vars())
             if not any(kw in v['name'].lower() for kw in exclude_keywords)
         ]
         
@@ -159,31 +167,31 @@ class DataIntelligence:
         """Détecte problèmes de qualité"""
         issues = {
             'missing_values': {},
-            'duplicates': int(self.df.duplicated().sum()),
+            'duplicates': self.profile.duplicated_rows(),
             'constant_columns': [],
             'high_cardinality': []
         }
         
         # Valeurs manquantes
-        for col in self.df.columns:
-            missing = self.df[col].isnull().sum()
+        for col in self.profile.columns:
+            missing = self.profile.missing[col]
             if missing > 0:
                 issues['missing_values'][col] = {
                     'count': int(missing),
-                    'percent': round(missing / len(self.df) * 100, 2)
+                    'percent': self.profile.missing_percentage(col)
                 }
         
         # Colonnes constantes
-        for col in self.df.columns:
-            if self.df[col].nunique() == 1:
+        for col in self.profile.columns:
+            if self.profile.unique_counts[col] == 1:
                 issues['constant_columns'].append(col)
         
-        # Cardinalité trop élevée
-        for col in self.df.select_dtypes(include=['object']).columns:
-            if self.df[col].nunique() > 50:
+        # Cardinalité trop élevée (le texte à peu de modalités est chargé en category, voir dtype_optimizer)
+        for col in self.profile.categorical_columns:
+            if self.profile.unique_counts[col] > 50:
                 issues['high_cardinality'].append({
                     'column': col,
-                    'unique_count': self.df[col].nunique()
+                    'unique_count': self.profile.unique_counts[col]
                 })
         
         return issues
@@ -0,0 +1,379 @@
+"""
+Profilage vectorisé d'un DataFrame
+Toutes les statistiques utilisées par l'architecte (_analyze_csv_locally),
+l'aperçu qualité de l'app (analyze_data_quality) et DataIntelligence sont
+calculées en quelques passes sur des blocs 2D, au lieu d'une boucle Python
+par colonne et par statistique :
+
+    - une passe isna().sum() pour les valeurs manquantes
+    - un seul tri du bloc numérique, dont on tire effectif, moyenne, écart-type,
+      min, max, quartiles et nombre de valeurs distinctes de toutes les colonnes
+    - un value_counts() par colonne catégorielle, dont on tire modalités, effectif et top 10
+
+Les appelants partagent le même profil (voir `profile_dataframe`) ; pour un
+fichier, il est calculé une fois à l'upload et persisté à côté du hash du
+dataset (voir `get_dataset_profile`).
+
+Configuration :
+    DATASET_PROFILE_DIR  Dossier des profils persistés (défaut cache/datasets)
+"""
+
+import os
+import pickle
+import threading
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from dataset_staging import dataset_stager
+from dtype_optimizer import dtype_cache_tag, dtype_plan, optimization_enabled
+
+logger = logging.getLogger(__name__)
+
+
+# 'string' : dtype texte par défaut de pandas >= 3 (sélectionné explicitement)
+CATEGORICAL_DTYPES = ['object', 'category', 'string']
+
+# Modalités conservées par colonne catégorielle
+MAX_TOP_VALUES = 20
+
+# En dessous, une variable numérique est probablement encodée (distribution complète conservée)
+ENCODED_MAX_UNIQUE = 10
+
+# À incrémenter quand le contenu de DataProfile change (invalide les profils persistés)
+PROFILE_VERSION = 2
+
+
+QUANTILES = {'q25': 0.25, 'median': 0.5, 'q75': 0.75}
+
+
+def _numeric_block_stats(numeric: pd.DataFrame) -> pd.DataFrame:
+    """
+    Statistiques de toutes les colonnes numériques à partir d'un seul tri du bloc 2D
+
+    Effectif, moyenne, écart-type (ddof=1), min, max, quartiles (interpolation
+    linéaire, comme pandas) et nombre de valeurs distinctes, sans boucle par colonne.
+    """
+    names = ['count', 'mean', 'std', 'min', *QUANTILES, 'max', 'unique']
+    if numeric.shape[1] == 0:
+        return pd.DataFrame(columns=names, dtype=float)
+
+    values = numeric.to_numpy(dtype=float, na_value=np.nan)
+    if not values.flags.writeable:
+        values = values.copy()  # vue sur un dataset mappé (Arrow IPC)
+    values.sort(axis=0)  # NaN en dernier
+    present = ~np.isnan(values)
+    count = present.sum(axis=0)
+    has_values = count > 0
+    columns = np.arange(values.shape[1])
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(present, values, 0.0).sum(axis=0) / count
+        squares = np.where(present, (values - mean) ** 2, 0.0).sum(axis=0)
+        std = np.sqrt(squares / (count - 1))
+    std[count < 2] = np.nan
+
+    def at(position):
+        return np.where(has_values, values[np.clip(position, 0, None), columns], np.nan)
+
+    stats = {'count': count, 'mean': mean, 'std': std, 'min': at(np.zeros_like(count)), 'max': at(count - 1)}
+
+    for name, q in QUANTILES.items():
+        position = q * np.maximum(count - 1, 0)
+        lower = np.floor(position).astype(int)
+        upper = np.minimum(lower + 1, np.maximum(count - 1, 0))
+        stats[name] = at(lower) + (at(upper) - at(lower)) * (position - lower)
+
+    changes = (values[1:] != values[:-1]) & present[1:]
+    stats['unique'] = has_values.astype(int) + changes.sum(axis=0)
+
+    return pd.DataFrame(stats, index=numeric.columns)[names]
+
+
+class DataProfile:
+    """
+    Statistiques d'un DataFrame, calculées une fois
+
+    Le profil ne garde pas de référence au DataFrame : il est sérialisable et
+    persisté à côté du hash du dataset (voir DatasetProfileStore).
+
+    Attributs :
+        n_rows, columns, dtypes
+        numeric_columns, categorical_columns
+        missing          {col: nb de valeurs manquantes}
+        numeric_stats    {col: {count, mean, std, min, q25, median, q75, max}}
+        unique_counts    {col: nb de valeurs distinctes}
+        examples         {col: première valeur, en texte}
+        duplicates       nb de lignes dupliquées
+        file_hash, encoding  renseignés quand le profil vient d'un fichier
+        csv_dialect      {encoding, sep, decimal} détecté pour un CSV (voir csv_dialect)
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.n_rows = len(df)
+        self.columns: List = list(df.columns)
+        self.dtypes: Dict = df.dtypes.to_dict()
+        self.file_hash: Optional[str] = None
+        self.encoding: Optional[str] = None
+        self.csv_dialect: Optional[Dict[str, str]] = None
+
+        numeric = df.select_dtypes(include=['number'])
+        categorical = df.select_dtypes(include=CATEGORICAL_DTYPES)
+        self.numeric_columns: List = list(numeric.columns)
+        self.categorical_columns: List = list(categorical.columns)
+
+        self.missing: Dict = df.isna().sum().to_dict()
+        self.examples: Dict = {col: str(value) for col, value in df.iloc[0].items()} if self.n_rows else {}
+
+        # Bloc numérique : un seul tri sert à toutes les statistiques
+        stats = _numeric_block_stats(numeric)
+        self.numeric_stats: Dict[Any, Dict[str, float]] = stats.drop(columns='unique').to_dict(orient='index')
+
+        # Colonnes catégorielles : un seul value_counts() sert à tout (seul le haut est gardé)
+        unique_counts = stats['unique'].astype(int).to_dict()
+        self._top_values: Dict[Any, pd.Series] = {}
+        for col in self.categorical_columns:
+            counts = df[col].value_counts()
+            unique_counts[col] = len(counts)
+            self._top_values[col] = counts.head(MAX_TOP_VALUES)
+
+        for col in self.columns:
+            if col not in unique_counts:
+                # Booléens, dates... : rares, calcul direct
+                unique_counts[col] = int(df[col].nunique())
+        self.unique_counts: Dict = unique_counts
+
+        # Variables numériques à peu de modalités (probablement encodées) : distribution complète
+        self._distributions: Dict[Any, pd.Series] = {
+            col: df[col].value_counts()
+            for col in self.numeric_columns if unique_counts[col] < ENCODED_MAX_UNIQUE
+        }
+
+        self.duplicates = self._count_duplicates(df)
+
+    def _count_duplicates(self, df: pd.DataFrame) -> int:
+        """Lignes dupliquées, via un hash 64 bits par ligne (bien plus rapide que df.duplicated())"""
+        if any(count == self.n_rows for count in self.unique_counts.values()):
+            return 0  # une colonne identifiante : aucune ligne ne peut être répétée
+        if not self.columns:
+            return 0
+        return int(pd.util.hash_pandas_object(df, index=False).duplicated().sum())
+
+    def missing_percentage(self, col) -> float:
+        return round((self.missing[col] / self.n_rows) * 100, 2) if self.n_rows else 0.0
+
+    def top_values(self, col, n: int = 10) -> pd.Series:
+        """Modalités les plus fréquentes d'une colonne catégorielle (n <= MAX_TOP_VALUES)"""
+        return self._top_values[col].head(n)
+
+    def distribution(self, col) -> pd.Series:
+        """value_counts() d'une colonne catégorielle (haut) ou numérique à peu de modalités"""
+        if col in self._distributions:
+            return self._distributions[col]
+        return self._top_values[col]
+
+    def duplicated_rows(self) -> int:
+        return self.duplicates
+
+    def schema(self) -> List[Dict]:
+        """Nom, type et exemple (première valeur) de chaque colonne"""
+        return [
+            {'name': col, 'dtype': str(self.dtypes[col]), 'example': self.examples.get(col, "N/A")}
+            for col in self.columns
+        ]
+
+    def describe(self) -> pd.DataFrame:
+        """Statistiques des colonnes numériques, présentées comme df.describe()"""
+        if not self.numeric_columns:
+            return pd.DataFrame()
+
+        stats = pd.DataFrame(self.numeric_stats)
+        return stats.loc[['count', 'mean', 'std', 'min', 'q25', 'median', 'q75', 'max']].rename(
+            index={'q25': '25%', 'median': '50%', 'q75': '75%'}
+        )
+
+    def to_metadata(self, file_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Métadonnées au format de l'architecte (`_analyze_csv_locally`)"""
+        metadata = {
+            "file_info": file_info,
+            "shape": {
+                "rows": int(self.n_rows),
+                "columns": len(self.columns)
+            },
+            "columns": list(self.columns),
+            "dtypes": {col: str(dtype) for col, dtype in self.dtypes.items()},
+            "numeric_columns": list(self.numeric_columns),
+            "categorical_columns": list(self.categorical_columns),
+            "missing_values": {},
+            "basic_stats": {}
+        }
+
+        for col in self.columns:
+            metadata["missing_values"][col] = {
+                "count": int(self.missing[col]),
+                "percentage": self.missing_percentage(col)
+            }
+
+        for col in self.numeric_columns:
+            stats = self.numeric_stats[col]
+            if stats['count'] > 0:
+                metadata["basic_stats"][col] = {
+                    "count": int(stats['count']),
+                    **{key: float(stats[key]) for key in ['mean', 'median', 'std', 'min', 'max', 'q25', 'q75']}
+                }
+
+        for col in self.categorical_columns:
+            metadata["basic_stats"][col] = {
+                "unique_count": int(self.unique_counts[col]),
+                "most_common": {str(k): int(v) for k, v in self.top_values(col).items()}
+            }
+
+        return metadata
+
+
+def profile_dataframe(df: pd.DataFrame) -> DataProfile:
+    """Helper function pour profiler un DataFrame"""
+    return DataProfile(df)
+
+
+# ═══════════════════════════════════════════════════════════════
+# PROFIL PERSISTÉ PAR DATASET
+# ═══════════════════════════════════════════════════════════════
+
+class DatasetProfileStore:
+    """
+    Un profil par contenu de fichier, calculé une fois (à l'upload) puis relu
+
+    Le profil est gardé en mémoire et écrit dans `<hash><typage>.profile.pkl`,
+    à côté des copies colonnaires du dataset : génération du plan, aperçu des
+    données, DataIntelligence et prompts de chapitre le relisent au lieu de
+    reparcourir les données. Il décrit les types du chargement, d'où le
+    suffixe de typage (voir dtype_optimizer.dtype_cache_tag).
+    """
+
+    def __init__(self, cache_dir: str = "cache/datasets", max_profiles: int = 32):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_profiles = max_profiles
+        self.lock = threading.Lock()
+        self._profiles: "OrderedDict[str, DataProfile]" = OrderedDict()
+        self._computing: Dict[str, threading.RLock] = {}
+
+    def path_for(self, file_hash: str) -> Path:
+        return self.cache_dir / f"{file_hash}{dtype_cache_tag()}.profile.pkl"
+
+    def _remember(self, file_hash: str, profile: DataProfile) -> DataProfile:
+        with self.lock:
+            self._profiles[file_hash] = profile
+            self._profiles.move_to_end(file_hash)
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+        return profile
+
+    def lookup(self, file_path: str) -> Optional[DataProfile]:
+        """Profil du fichier s'il a déjà été calculé (mémoire puis disque), sinon None"""
+        file_hash = dataset_stager.get_file_hash(file_path)
+        profile_key = file_hash + dtype_cache_tag()
+
+        with self.lock:
+            profile = self._profiles.get(profile_key)
+            if profile is not None:
+                self._profiles.move_to_end(profile_key)
+                return profile
+
+        path = self.path_for(file_hash)
+        if not path.exists():
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                version, profile = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Unreadable dataset profile {path}: {e}")
+            return None
+
+        if version != PROFILE_VERSION:
+            return None
+
+        return self._remember(profile_key, profile)
+
+    def get(self, file_path: str, df: pd.DataFrame = None, encoding: str = None) -> DataProfile:
+        """
+        Profil du fichier, calculé au premier appel
+
+        Args:
+            file_path: Chemin du CSV / Excel
+            df, encoding: Données déjà chargées depuis ce fichier (sinon lues via read_dataset)
+        """
+        profile = self.lookup(file_path)
+        if profile is not None:
+            return profile
+
+        file_hash = dataset_stager.get_file_hash(file_path)
+        profile_key = file_hash + dtype_cache_tag()
+        with self.lock:
+            # Réentrant : read_dataset profile le fichier au premier parsing (typage compact)
+            computing = self._computing.setdefault(profile_key, threading.RLock())
+
+        # Un seul calcul par dataset, même si plusieurs sessions le demandent en même temps
+        with computing:
+            profile = self.lookup(file_path)
+            if profile is not None:
+                return profile
+
+            if df is None:
+                from dataset_handle import read_dataset
+                df, encoding = read_dataset(file_path)
+                profile = self.lookup(file_path)
+                if profile is not None:
+                    return profile
+
+            profile = DataProfile(df)
+            if optimization_enabled():
+                # Types compacts appliqués au chargement (voir dtype_optimizer) : le profil décrit le dataset chargé
+                profile.dtypes.update({col: pd.api.types.pandas_dtype(dtype) for col, dtype in dtype_plan(profile).items()})
+            profile.file_hash = file_hash
+            profile.encoding = encoding or 'unknown'
+            if file_path.lower().endswith('.csv'):
+                from csv_dialect import get_csv_dialect
+                profile.csv_dialect = get_csv_dialect(file_path)
+            logger.info(f"Dataset profiled once: {file_path} ({profile.n_rows} rows, {len(profile.columns)} columns)")
+
+            path = self.path_for(file_hash)
+            tmp_path = path.with_name(f"{path.name}.tmp{threading.get_ident()}")
+            try:
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump((PROFILE_VERSION, profile), f)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                logger.warning(f"Dataset profile not persisted for {file_path}: {e}")
+                tmp_path.unlink(missing_ok=True)
+
+            self._remember(profile_key, profile)
+
+        with self.lock:
+            self._computing.pop(profile_key, None)
+
+        return profile
+
+
+_profile_store = None
+
+
+def get_profile_store() -> DatasetProfileStore:
+    """Instance globale du store de profils"""
+    global _profile_store
+
+    if _profile_store is None:
+        _profile_store = DatasetProfileStore(cache_dir=os.getenv("DATASET_PROFILE_DIR", "cache/datasets"))
+
+    return _profile_store
+
+
+def get_dataset_profile(file_path: str, df: pd.DataFrame = None, encoding: str = None) -> DataProfile:
+    """Helper function pour obtenir le profil partagé d'un fichier"""
+    return get_profile_store().get(file_path, df=df, encoding=encoding)
@@ -0,0 +1,236 @@
+"""
+Jeu de données chargé une fois par workflow
+Le fichier est chargé une seule fois (depuis sa copie Parquet si elle existe,
+voir columnar_cache) ; schéma, dimensions et statistiques viennent du profil
+partagé du dataset (voir data_profiler), qui ne nécessite pas de recharger
+les données s'il a déjà été calculé.
+Tout est invalidé uniquement quand le hash du contenu du fichier change.
+"""
+
+import os
+import threading
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from dataset_staging import dataset_stager
+from columnar_cache import get_columnar_cache, mmap_enabled
+from data_profiler import get_profile_store
+from csv_dialect import get_csv_dialect, csv_dialects
+from dtype_optimizer import optimization_enabled, optimize_dtypes
+
+logger = logging.getLogger(__name__)
+
+
+# Encodages essayés dans l'ordre pour les CSV
+CSV_ENCODINGS = ['utf-8', 'latin-1', 'iso-8859-1', 'windows-1252']
+
+EXCEL_EXTENSIONS = ['.xlsx', '.xls']
+
+
+def parse_dataset(file_path: str) -> Tuple[pd.DataFrame, str]:
+    """
+    Parse le fichier source (CSV ou Excel)
+
+    Pour un CSV, encodage, séparateur et virgule décimale sont détectés sur un
+    échantillon (voir csv_dialect) puis passés explicitement à read_csv.
+
+    Returns:
+        (DataFrame, encodage utilisé ou 'excel')
+
+    Raises:
+        ValueError si le format n'est pas supporté
+    """
+    file_extension = os.path.splitext(file_path)[1].lower()
+
+    if file_extension in EXCEL_EXTENSIONS:
+        df = pd.read_excel(file_path, engine='openpyxl' if file_extension == '.xlsx' else None)
+        return df, 'excel'
+
+    if file_extension != '.csv':
+        raise ValueError(f"Format de fichier non supporté : {file_extension}")
+
+    dialect = get_csv_dialect(file_path)
+    try:
+        return pd.read_csv(file_path, **dialect), dialect['encoding']
+    except UnicodeDecodeError:
+        # Octet invalide au-delà de l'échantillon : encodage suivant de la liste
+        logger.warning(f"Sniffed encoding {dialect['encoding']} failed for {file_path}, trying fallbacks")
+
+    for encoding in CSV_ENCODINGS[1:-1]:
+        try:
+            df = pd.read_csv(file_path, **{**dialect, 'encoding': encoding})
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        encoding = CSV_ENCODINGS[-1]
+        df = pd.read_csv(file_path, **{**dialect, 'encoding': encoding})
+
+    csv_dialects.set(file_path, {**dialect, 'encoding': encoding})
+    return df, encoding
+
+
+def read_dataset(file_path: str, df: Optional[pd.DataFrame] = None, encoding: str = None) -> Tuple[pd.DataFrame, str]:
+    """
+    Charge un jeu de données depuis sa copie colonnaire si elle existe
+
+    Au premier chargement, le fichier source est parsé, profilé, ses colonnes
+    passent à des types compacts si DTYPE_OPTIMIZATION est actif (category,
+    int32 ; voir dtype_optimizer), puis il est converti : les lectures suivantes, dans ce processus ou un autre,
+    lisent la copie, déjà typée. Avec
+    le memory map (défaut), tous les lecteurs du processus partagent le même
+    frame mappé au lieu d'en avoir chacun une copie.
+
+    Args:
+        file_path: Chemin du CSV / Excel
+        df, encoding: Résultat d'un parsing déjà fait (ex: upload Streamlit), converti sans relecture
+
+    Returns:
+        (DataFrame, encodage du fichier source)
+    """
+    columnar_cache = get_columnar_cache()
+    shared = bool(columnar_cache) and mmap_enabled()
+
+    if columnar_cache and df is None:
+        cached = (columnar_cache.open_shared(file_path) if shared else None) or columnar_cache.load(file_path)
+        if cached is not None:
+            return cached
+
+    if df is None:
+        df, encoding = parse_dataset(file_path)
+    encoding = encoding or 'unknown'
+
+    if optimization_enabled():
+        # Le profil (calculé une fois, voir data_profiler) donne modalités et bornes de chaque colonne
+        df = optimize_dtypes(df, get_profile_store().get(file_path, df=df, encoding=encoding))
+
+    if columnar_cache and columnar_cache.store(file_path, df, encoding) and shared:
+        # Le frame parsé est remplacé par la version mappée partagée
+        mapped = columnar_cache.open_shared(file_path)
+        if mapped is not None:
+            return mapped[0], encoding
+
+    return df, encoding
+
+
+class DatasetHandle:
+    """
+    Accès au jeu de données d'un workflow
+
+    Usage:
+        dataset = DatasetHandle(csv_path)
+        dataset.df          # DataFrame typé (chargé au premier accès)
+        dataset.profile()   # profil partagé (DataProfile)
+        dataset.schema()    # [{'name', 'dtype', 'example'}, ...]
+        dataset.sample(5)   # premières lignes
+        dataset.stats()     # describe() des colonnes numériques
+    """
+
+    def __init__(self, file_path: str, df: Optional[pd.DataFrame] = None):
+        """
+        Args:
+            file_path: Chemin du CSV / Excel
+            df: DataFrame déjà chargé depuis ce fichier (ex: st.session_state.csv_data)
+        """
+        self.file_path = file_path
+        self.lock = threading.RLock()
+        self._reset()
+
+        if df is not None:
+            self._df = df
+            self._file_hash = self._current_hash()
+            self.encoding = 'preloaded'
+
+    def _reset(self):
+        self._df: Optional[pd.DataFrame] = None
+        self._file_hash: Optional[str] = None
+        self._derived: Dict = {}
+        self._profile = None
+        self.encoding: Optional[str] = None
+
+    def _current_hash(self) -> str:
+        return dataset_stager.get_file_hash(self.file_path)
+
+    @property
+    def file_hash(self) -> str:
+        """Hash du contenu du fichier (recalculé seulement si mtime/taille changent)"""
+        return self._current_hash()
+
+    @property
+    def file_type(self) -> str:
+        """'EXCEL' ou 'CSV'"""
+        return "EXCEL" if os.path.splitext(self.file_path)[1].lower() in EXCEL_EXTENSIONS else "CSV"
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """DataFrame typé, rechargé uniquement si le contenu du fichier a changé"""
+        with self.lock:
+            current_hash = self._current_hash()
+
+            if self._df is None or current_hash != self._file_hash:
+                if self._df is not None:
+                    logger.info(f"Dataset changed on disk, reloading: {self.file_path}")
+                self._reset()
+                self._df, self.encoding = read_dataset(self.file_path)
+                self._file_hash = current_hash
+                logger.info(f"Dataset loaded once: {self.file_path} ({len(self._df)} rows, encoding={self.encoding})")
+
+            return self._df
+
+    def loaded_df(self) -> Optional[pd.DataFrame]:
+        """DataFrame s'il est déjà en mémoire (et à jour), sans déclencher de chargement"""
+        with self.lock:
+            if self._df is not None and self._file_hash == self._current_hash():
+                return self._df
+            return None
+
+    def _cached(self, key, compute):
+        """Valeur dérivée du DataFrame, mémorisée tant que le fichier ne change pas"""
+        with self.lock:
+            df = self.df
+            if key not in self._derived:
+                self._derived[key] = compute(df)
+            return self._derived[key]
+
+    def profile(self):
+        """
+        Profil partagé du dataset (DataProfile)
+
+        Relu depuis le store s'il existe (sans charger les données), sinon
+        calculé depuis le DataFrame du workflow.
+        """
+        with self.lock:
+            current_hash = self._current_hash()
+            if self._profile is None or self._profile.file_hash != current_hash:
+                store = get_profile_store()
+                self._profile = store.lookup(self.file_path) or store.get(
+                    self.file_path, df=self.df, encoding=None if self.encoding == 'preloaded' else self.encoding
+                )
+            return self._profile
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.profile().columns)
+
+    @property
+    def n_rows(self) -> int:
+        return self.profile().n_rows
+
+    def schema(self) -> List[Dict]:
+        """Nom, type et exemple (première valeur) de chaque colonne"""
+        return self.profile().schema()
+
+    def sample(self, n: int = 5) -> pd.DataFrame:
+        """Premières lignes du jeu de données"""
+        return self._cached(('sample', n), lambda df: df.head(n).copy())
+
+    def stats(self) -> pd.DataFrame:
+        """Statistiques descriptives des colonnes numériques"""
+        return self.profile().describe()
+
+    def invalidate(self):
+        """Oublie le DataFrame et les valeurs dérivées (rechargement au prochain accès)"""
+        with self.lock:
+            self._reset()
@@ -0,0 +1,326 @@
+"""
+Échantillon persisté par dataset
+Un échantillon de quelques milliers de lignes est tiré une fois par contenu
+de fichier, en lisant les données par blocs (le fichier n'est jamais chargé
+entièrement), puis écrit à côté des copies colonnaires du dataset. Il sert :
+
+    - aux exemples de valeurs des prompts de chapitre (plusieurs valeurs
+      distinctes par colonne au lieu de la seule première ligne)
+    - au mode "aperçu" : les blocs de code s'exécutent sur l'échantillon
+      pendant la rédaction, les données complètes étant réservées aux
+      chapitres validés (voir ReportGenerationWorkflow.preview_mode)
+
+Méthodes :
+    reservoir   échantillon aléatoire uniforme (clés aléatoires, k plus petites)
+    stratified  même tirage dans chaque modalité d'une colonne catégorielle,
+                avec une allocation proportionnelle (au moins une ligne par modalité)
+
+Le tirage est reproductible (graine dérivée du hash du fichier) et les lignes
+gardent leur ordre et leur numéro de ligne d'origine.
+
+Configuration :
+    DATASET_SAMPLE_ROWS      Lignes de l'échantillon (défaut 10000)
+    DATASET_SAMPLE_METHOD    reservoir ou stratified (défaut stratified)
+    DATASET_SAMPLE_STRATIFY  Colonne de stratification, ou auto (défaut auto)
+    DATASET_SAMPLE_DIR       Dossier des échantillons (défaut cache/datasets)
+"""
+
+import os
+import hashlib
+import threading
+import logging
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from dataset_staging import dataset_stager
+from dtype_optimizer import dtype_cache_tag
+
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+SAMPLING_METHODS = ['reservoir', 'stratified']
+
+# Modalités acceptées pour la colonne de stratification (choix automatique)
+STRATA_MIN_LEVELS = 2
+STRATA_MAX_LEVELS = 20
+
+# Colonne technique : clé aléatoire du tirage
+_KEY = '__sample_key'
+
+# Strate des valeurs manquantes de la colonne de stratification
+_MISSING_STRATUM = '__sample_missing'
+
+
+def _bottom_k(frame: pd.DataFrame, k: int) -> pd.DataFrame:
+    """Les k lignes de plus petite clé"""
+    if len(frame) <= k:
+        return frame
+    return frame.nsmallest(k, _KEY)
+
+
+def proportional_allocation(totals: pd.Series, n: int) -> pd.Series:
+    """
+    Répartition de n lignes entre strates, proportionnelle à leurs effectifs
+
+    Chaque strate reçoit au moins une ligne (si n le permet) ; les restes sont
+    attribués aux plus grandes parties fractionnaires.
+    """
+    totals = totals[totals > 0]
+    if totals.sum() <= n:
+        return totals.copy()
+
+    minimum = 1 if n >= len(totals) else 0
+    shares = totals / totals.sum() * (n - minimum * len(totals))
+    allocation = np.floor(shares).astype(int) + minimum
+    remainder = n - allocation.sum()
+    if remainder > 0:
+        order = (shares - np.floor(shares)).sort_values(ascending=False).index[:remainder]
+        allocation[order] += 1
+
+    return allocation.clip(upper=totals).astype(int)
+
+
+class ReservoirSampler:
+    """
+    Échantillon uniforme de n lignes d'un flux de blocs
+
+    Chaque ligne reçoit une clé aléatoire ; garder les n plus petites clés
+    donne un tirage sans remise uniforme, fusionnable bloc par bloc (une
+    opération vectorisée par bloc au lieu d'une décision par ligne).
+    """
+
+    def __init__(self, n: int, seed: int = 0):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.rows = 0
+        self._sample: Optional[pd.DataFrame] = None
+
+    def _keyed(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        keyed = chunk.set_axis(pd.RangeIndex(self.rows, self.rows + len(chunk)))
+        keyed[_KEY] = self.rng.random(len(chunk))
+        self.rows += len(chunk)
+        return keyed
+
+    def update(self, chunk: pd.DataFrame):
+        keyed = self._keyed(chunk)
+        self._sample = _bottom_k(keyed if self._sample is None else pd.concat([self._sample, keyed]), self.n)
+
+    def result(self) -> pd.DataFrame:
+        """Lignes tirées, dans leur ordre d'origine (index = numéro de ligne)"""
+        if self._sample is None:
+            return pd.DataFrame()
+        return self._sample.drop(columns=_KEY).sort_index()
+
+
+class StratifiedSampler(ReservoirSampler):
+    """
+    Échantillon stratifié sur une colonne (allocation proportionnelle)
+
+    Les n plus petites clés sont gardées dans chaque strate (les allocations
+    ne sont connues qu'à la fin du flux), puis chaque strate est réduite à
+    sa part : le tirage reste uniforme à l'intérieur d'une strate.
+    """
+
+    def __init__(self, n: int, column: str, seed: int = 0):
+        super().__init__(n, seed)
+        self.column = column
+        self.totals = pd.Series(dtype='int64')
+
+    def _strata(self, frame: pd.DataFrame) -> pd.Series:
+        """Strate de chaque ligne (les valeurs manquantes forment leur propre strate)"""
+        values = frame[self.column]
+        return values.astype(str).where(values.notna(), _MISSING_STRATUM)
+
+    def update(self, chunk: pd.DataFrame):
+        keyed = self._keyed(chunk)
+        strata = self._strata(keyed)
+        self.totals = self.totals.add(strata.value_counts(), fill_value=0).astype('int64')
+
+        if self._sample is not None:
+            keyed = pd.concat([self._sample, keyed])
+        self._sample = self._bottom_per_stratum(keyed, self.n)
+
+    def _bottom_per_stratum(self, frame: pd.DataFrame, k) -> pd.DataFrame:
+        """Les k plus petites clés de chaque strate (k : entier ou Series par strate)"""
+        frame = frame.sort_values(_KEY)
+        strata = self._strata(frame)
+        rank = frame.groupby(strata, sort=False).cumcount()
+        limit = strata.map(k).fillna(0) if isinstance(k, pd.Series) else k
+        return frame[rank < limit]
+
+    def result(self) -> pd.DataFrame:
+        if self._sample is None:
+            return pd.DataFrame()
+
+        allocation = proportional_allocation(self.totals, self.n)
+        return self._bottom_per_stratum(self._sample, allocation).drop(columns=_KEY).sort_index()
+
+
+def choose_strata_column(file_path: str) -> Optional[str]:
+    """Colonne catégorielle de 2 à 20 modalités, la plus complète (profil du dataset), sinon None"""
+    from data_profiler import get_profile_store
+
+    profile = get_profile_store().lookup(file_path)
+    if profile is None:
+        return None
+
+    candidates = [
+        col for col in profile.categorical_columns
+        if STRATA_MIN_LEVELS <= profile.unique_counts.get(col, 0) <= STRATA_MAX_LEVELS
+    ]
+    if not candidates:
+        return None
+
+    return min(candidates, key=lambda col: profile.missing.get(col, 0))
+
+
+def iter_dataset_chunks(file_path: str, rows: int) -> Iterator[pd.DataFrame]:
+    """Blocs de lignes du dataset (copie Parquet si elle existe, sinon fichier source)"""
+    from streaming_profiler import _columnar_chunks
+    from dataset_handle import EXCEL_EXTENSIONS, parse_dataset
+    from csv_dialect import get_csv_dialect
+
+    columnar = _columnar_chunks(file_path, rows)
+    if columnar:
+        yield from columnar[0]
+        return
+
+    if os.path.splitext(file_path)[1].lower() in EXCEL_EXTENSIONS:
+        yield parse_dataset(file_path)[0]
+        return
+
+    # Un caractère mal décodé n'a pas d'importance pour un échantillon
+    yield from pd.read_csv(file_path, chunksize=rows, encoding_errors='replace', **get_csv_dialect(file_path))
+
+
+def sample_examples(sample: pd.DataFrame, n: int = 3) -> Dict[str, List[str]]:
+    """Jusqu'à n valeurs distinctes non vides par colonne (exemples des prompts)"""
+    return {
+        col: [str(value) for value in sample[col].dropna().unique()[:n]]
+        for col in sample.columns
+    }
+
+
+class DatasetSampler:
+    """Un échantillon par contenu de fichier, tiré une fois puis relu"""
+
+    def __init__(self, cache_dir: str = "cache/datasets", sample_rows: int = 10000,
+                 method: str = "stratified", stratify: str = "auto"):
+        if method not in SAMPLING_METHODS:
+            raise ValueError(f"Méthode d'échantillonnage inconnue : {method}")
+
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.sample_rows = sample_rows
+        self.method = method
+        self.stratify = stratify
+        self.lock = threading.Lock()
+        self._samples: Dict[str, pd.DataFrame] = {}
+
+    def path_for(self, file_hash: str, column: Optional[str] = None) -> Path:
+        """Fichier de l'échantillon (column : colonne de stratification retenue, voir _strata_column)"""
+        extension = 'parquet' if PYARROW_AVAILABLE else 'pkl'
+        strata_tag = f"-by{hashlib.sha256(column.encode()).hexdigest()[:8]}" if column else ""
+        return self.cache_dir / (
+            f"{file_hash}{dtype_cache_tag()}.sample-{self.method}-{self.sample_rows}{strata_tag}.{extension}"
+        )
+
+    def _strata_column(self, file_path: str) -> Optional[str]:
+        if self.method != 'stratified':
+            return None
+        if self.stratify != 'auto':
+            return self.stratify
+        return choose_strata_column(file_path)
+
+    def _draw(self, file_path: str, file_hash: str, column: Optional[str], df: pd.DataFrame = None) -> pd.DataFrame:
+        from streaming_profiler import chunk_rows
+
+        seed = int(file_hash[:8], 16)
+        sampler = StratifiedSampler(self.sample_rows, column, seed) if column else ReservoirSampler(self.sample_rows, seed)
+
+        chunks = [df] if df is not None else iter_dataset_chunks(file_path, chunk_rows())
+        for chunk in chunks:
+            if column and column not in chunk.columns:
+                logger.warning(f"Stratification column {column!r} not found, using a uniform sample")
+                column, sampler = None, ReservoirSampler(self.sample_rows, seed)
+            sampler.update(chunk)
+
+        sample = sampler.result()
+        logger.info(
+            f"Dataset sampled once: {file_path} ({len(sample)}/{sampler.rows} rows, "
+            f"{'stratified on ' + repr(column) if column else 'reservoir'})"
+        )
+        return sample
+
+    def sample_path(self, file_path: str, df: pd.DataFrame = None) -> Path:
+        """
+        Fichier de l'échantillon, tiré au premier appel
+
+        Args:
+            file_path: Chemin du CSV / Excel
+            df: Données déjà chargées depuis ce fichier (sinon lecture par blocs)
+        """
+        file_hash = dataset_stager.get_file_hash(file_path)
+        column = self._strata_column(file_path)
+        path = self.path_for(file_hash, column)
+
+        with self.lock:
+            if path.exists():
+                return path
+
+            sample = self._draw(file_path, file_hash, column, df)
+            tmp_path = path.with_name(f"{path.name}.tmp{threading.get_ident()}")
+            try:
+                if PYARROW_AVAILABLE:
+                    sample.to_parquet(tmp_path)
+                else:
+                    sample.to_pickle(tmp_path)
+                os.replace(tmp_path, path)
+            except Exception:
+                tmp_path.unlink(missing_ok=True)
+                raise
+
+            self._samples[path.name] = sample
+
+        return path
+
+    def sample(self, file_path: str, df: pd.DataFrame = None) -> pd.DataFrame:
+        """Échantillon du fichier (index = numéro de ligne dans le fichier)"""
+        path = self.sample_path(file_path, df=df)
+
+        with self.lock:
+            if path.name not in self._samples:
+                self._samples[path.name] = pd.read_parquet(path) if PYARROW_AVAILABLE else pd.read_pickle(path)
+            return self._samples[path.name]
+
+
+_dataset_sampler = None
+
+
+def get_dataset_sampler() -> DatasetSampler:
+    """Instance globale de l'échantillonneur (variables d'environnement)"""
+    global _dataset_sampler
+
+    if _dataset_sampler is None:
+        _dataset_sampler = DatasetSampler(
+            cache_dir=os.getenv("DATASET_SAMPLE_DIR", "cache/datasets"),
+            sample_rows=int(os.getenv("DATASET_SAMPLE_ROWS", "10000")),
+            method=os.getenv("DATASET_SAMPLE_METHOD", "stratified").lower(),
+            stratify=os.getenv("DATASET_SAMPLE_STRATIFY", "auto")
+        )
+
+    return _dataset_sampler
+
+
+def get_dataset_sample(file_path: str, df: pd.DataFrame = None) -> pd.DataFrame:
+    """Helper function pour obtenir l'échantillon persisté d'un fichier"""
+    return get_dataset_sampler().sample(file_path, df=df)
@@ -0,0 +1,252 @@
+"""
+Staging des jeux de données dans les sandboxes E2B
+Le fichier est uploadé UNE fois par sandbox (sandbox.files.write) puis chargé
+UNE fois dans le kernel persistant, au lieu d'être inliné dans chaque bloc.
+
+Un hash du contenu détecte quand un nouvel upload est nécessaire. Une sandbox
+garde tous les fichiers qu'elle a reçus (ex: échantillon du mode aperçu et
+dataset complet) : passer de l'un à l'autre ne renvoie ni ne re-parse rien.
+"""
+
+import os
+import hashlib
+import threading
+import logging
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Répertoire de travail dans la sandbox (les sandboxes locales exposent `home_dir`)
+REMOTE_HOME_DIR = "/home/user"
+
+# Dossier des jeux de données dans la sandbox
+REMOTE_DATA_DIR = f"{REMOTE_HOME_DIR}/datasets"
+
+# Taille des blocs lus pour le calcul du hash (1 Mo)
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Jeux de données gardés chargés dans un kernel (les plus anciens sont relus au besoin)
+KERNEL_MAX_DATASETS = 2
+
+
+def compute_file_hash(file_path: str) -> str:
+    """
+    Calcule le hash SHA-256 du contenu d'un fichier (lecture par blocs)
+
+    Args:
+        file_path: Chemin du fichier
+
+    Returns:
+        Hash hexadécimal
+    """
+    sha = hashlib.sha256()
+
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+
+class DatasetStager:
+    """
+    Gère l'upload des jeux de données dans les sandboxes
+
+    - Un upload par couple (sandbox, contenu du fichier)
+    - Un chargement pandas par couple (kernel, contenu) : `_datasets[clé]`,
+      `_dataset_df` désignant le jeu de données courant
+    - Chaque bloc reçoit une copie fraîche `df` sans re-parser le fichier
+
+    L'upload et le chargement ne tiennent que le verrou de la sandbox : un
+    gros dataset envoyé à une sandbox ne bloque pas les autres. Le verrou
+    global ne protège que les dictionnaires internes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._staged: Dict[str, Dict[str, Dict]] = {}  # sandbox_id -> {clé du contenu: dataset stagé}
+        self._sandbox_locks: Dict[str, threading.Lock] = {}
+        self._hash_cache: Dict[str, Tuple[float, int, str]] = {}  # path -> (mtime, size, hash)
+
+    def _get_sandbox_lock(self, sandbox_id: str) -> threading.Lock:
+        """Verrou propre à une sandbox (créé à la demande)"""
+        with self.lock:
+            sandbox_lock = self._sandbox_locks.get(sandbox_id)
+            if sandbox_lock is None:
+                sandbox_lock = threading.Lock()
+                self._sandbox_locks[sandbox_id] = sandbox_lock
+            return sandbox_lock
+
+    def get_file_hash(self, file_path: str) -> str:
+        """Hash du fichier, recalculé seulement si mtime/taille ont changé"""
+        stat = os.stat(file_path)
+        key = os.path.abspath(file_path)
+
+        cached = self._hash_cache.get(key)
+        if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            return cached[2]
+
+        file_hash = compute_file_hash(file_path)
+        self._hash_cache[key] = (stat.st_mtime, stat.st_size, file_hash)
+
+        return file_hash
+
+    @staticmethod
+    def remote_path(file_hash: str, file_extension: str, data_dir: str = REMOTE_DATA_DIR, dtype_tag: str = "") -> str:
+        """Chemin du fichier dans la sandbox (adressé par contenu et typage)"""
+        return f"{data_dir}/{file_hash[:16]}{dtype_tag}{file_extension}"
+
+    def stage(self, sandbox, file_path: str) -> Dict:
+        """
+        Uploade le fichier dans la sandbox et le charge dans le kernel si nécessaire
+
+        Si le fichier a une copie colonnaire (voir columnar_cache), c'est elle qui
+        est transférée et lue par le kernel ; en cas d'échec (pyarrow absent de la
+        sandbox...), le fichier source est utilisé. Les sandboxes locales, qui
+        voient le système de fichiers de l'hôte (`shares_host_filesystem`), ne
+        reçoivent pas de copie : elles mappent directement le fichier Arrow IPC.
+
+        Args:
+            sandbox: Instance de Sandbox E2B
+            file_path: Chemin local du fichier CSV/Excel
+
+        Returns:
+            {
+                'hash': str (hash du fichier source),
+                'key': str (hash + suffixe de typage, voir dtype_optimizer.dtype_cache_tag),
+                'remote_path': str,
+                'extension': str,
+                'uploaded': bool (True si le dataset vient d'être transmis)
+            }
+        """
+        from columnar_cache import get_columnar_cache, mmap_enabled
+        from csv_dialect import get_csv_dialect
+        from data_profiler import get_profile_store
+        from dtype_optimizer import compact_dtypes, dtype_cache_tag, optimization_enabled
+
+        file_hash = self.get_file_hash(file_path)
+        dtype_tag = dtype_cache_tag()
+        home_dir = getattr(sandbox, 'home_dir', REMOTE_HOME_DIR)
+        sandbox_id = getattr(sandbox, 'sandbox_id', str(id(sandbox)))
+
+        with self._get_sandbox_lock(sandbox_id):
+            with self.lock:
+                previous = self._staged.get(sandbox_id, {}).get(file_hash + dtype_tag)
+            if previous:
+                logger.debug(f"Dataset déjà présent dans {sandbox_id}")
+                return {**previous, 'uploaded': False}
+
+            sources = []  # (fichier local, extension, upload nécessaire)
+            columnar_cache = get_columnar_cache()
+            if columnar_cache:
+                ipc_path = columnar_cache.ipc_lookup(file_path) if mmap_enabled() else None
+                if ipc_path and getattr(sandbox, 'shares_host_filesystem', False):
+                    sources.append((ipc_path, '.arrow', False))
+                columnar_path = columnar_cache.lookup(file_path)
+                if columnar_path:
+                    sources.append((columnar_path, '.parquet', True))
+            sources.append((file_path, os.path.splitext(file_path)[1].lower(), True))
+
+            for source_path, file_extension, upload in sources:
+                staged = {
+                    'hash': file_hash,
+                    'key': file_hash + dtype_tag,
+                    'remote_path': (
+                        self.remote_path(file_hash, file_extension, f"{home_dir}/datasets", dtype_tag)
+                        if upload else os.path.abspath(source_path)
+                    ),
+                    'extension': file_extension,
+                    'uploaded': False
+                }
+                if file_extension == '.csv':
+                    # Encodage / séparateur détectés une fois sur l'hôte, passés explicitement au kernel
+                    staged['read_options'] = get_csv_dialect(file_path)
+                if file_extension not in ['.arrow', '.parquet'] and optimization_enabled():
+                    # Fichier source : typage compact appliqué par le kernel (les copies colonnaires l'ont déjà)
+                    profile = get_profile_store().lookup(file_path)
+                    if profile is not None:
+                        staged['dtypes'] = compact_dtypes(profile)
+
+                if upload:
+                    logger.info(f"Upload du dataset vers {sandbox_id} : {staged['remote_path']}")
+                    with open(source_path, 'rb') as f:
+                        sandbox.files.write(staged['remote_path'], f)
+                else:
+                    logger.info(f"Dataset partagé (memory map) avec {sandbox_id} : {staged['remote_path']}")
+
+                execution = sandbox.run_code("import pandas as pd\n" + self.build_load_code(staged))
+                if not execution.error:
+                    break
+
+                error = f"{execution.error.name}: {execution.error.value}"
+                if file_extension in ['.arrow', '.parquet']:
+                    logger.warning(f"Columnar dataset unreadable in {sandbox_id}, trying next format: {error}")
+                    continue
+
+                raise RuntimeError(f"Chargement du dataset impossible : {error}")
+
+            with self.lock:
+                self._staged.setdefault(sandbox_id, {})[staged['key']] = staged
+            staged['uploaded'] = True
+
+        return staged
+
+    @staticmethod
+    def build_load_code(staged: Dict) -> str:
+        """
+        Code qui charge le dataset dans le kernel s'il n'y est pas déjà, et en fait `_dataset_df`
+
+        Les datasets chargés sont gardés par clé (hash et typage) dans `_datasets` :
+        après le premier chargement, le code ne coûte plus rien, même en alternant
+        entre échantillon et dataset complet (et recharge si le kernel a redémarré).
+        Suppose `pd` déjà importé dans le kernel.
+        """
+        from dtype_optimizer import astype_code
+
+        if staged['extension'] == '.arrow':
+            # Colonnes numériques = vues sur le fichier mappé, partagées avec les autres processus
+            reader = (
+                f"__import__('pyarrow').ipc.open_file(__import__('pyarrow').memory_map('{staged['remote_path']}', 'r'))"
+                ".read_all().to_pandas(split_blocks=True)"
+            )
+        elif staged['extension'] == '.parquet':
+            reader = f"pd.read_parquet('{staged['remote_path']}')"
+        elif staged['extension'] in ['.xlsx', '.xls']:
+            reader = f"pd.read_excel('{staged['remote_path']}')"
+        else:
+            from csv_dialect import DEFAULT_DIALECT, read_csv_call
+            reader = read_csv_call(
+                staged['remote_path'], staged.get('read_options') or DEFAULT_DIALECT, encoding_errors='replace'
+            )
+
+        return f"""_datasets = globals().get('_datasets', {{}})
+if '{staged['key']}' not in _datasets:
+    _datasets['{staged['key']}'] = {reader}{astype_code(staged.get('dtypes'))}
+    while len(_datasets) > {KERNEL_MAX_DATASETS}:
+        _datasets.pop(next(iter(_datasets)))
+_dataset_df = _datasets['{staged['key']}']
+"""
+
+    def build_binding_code(self, staged: Dict) -> str:
+        """Code à placer en tête de bloc : garantit le chargement et fournit une copie `df`"""
+        if staged['extension'] == '.arrow':
+            # pandas >= 3 (copy-on-write) : une copie superficielle isole le bloc sans
+            # recopier le fichier mappé ; avant, les vues mappées sont en lecture seule
+            return self.build_load_code(staged) + "df = _dataset_df.copy(deep=int(pd.__version__.split('.')[0]) < 3)\n"
+
+        return self.build_load_code(staged) + "df = _dataset_df.copy()\n"
+
+    def forget_sandbox(self, sandbox_id: str):
+        """Oublie une sandbox (fermée ou recréée)"""
+        with self.lock:
+            self._staged.pop(sandbox_id, None)
+
+
+# Instance globale
+dataset_stager = DatasetStager()
+
+
+def stage_dataset(sandbox, file_path: str) -> Dict:
+    """Helper function pour stager un dataset dans une sandbox"""
+    return dataset_stager.stage(sandbox, file_path)
@@ -0,0 +1,145 @@
+"""
+Typage compact des jeux de données
+Les colonnes sont chargées avec les types par défaut de pandas (texte en
+object / str, entiers en int64, décimaux en float64). À partir du profil du
+dataset (voir data_profiler), sans nouvelle passe sur les données :
+
+    - texte à peu de modalités  -> category (un code entier par ligne au lieu d'une chaîne)
+    - int64 dont les bornes tiennent sur 32 bits -> int32
+    - float64 -> float32 (optionnel : précision des statistiques du rapport)
+
+Le plan est calculé avec le profil et y est enregistré (le profil décrit le
+dataset tel qu'il est chargé) ; il est appliqué une fois, au premier parsing du
+fichier, avant l'écriture des copies colonnaires : Parquet et Arrow IPC gardent
+ces types, donc le workflow, les workers et les sandboxes qui les lisent en
+profitent sans conversion. Une sandbox qui reçoit le fichier source applique
+les mêmes types dans son code de chargement (voir DatasetStager.build_load_code).
+
+Désactivé par défaut : le `df` du code généré change de comportement en
+category (value_counts / crosstab d'un sous-ensemble listent les modalités
+absentes avec un effectif nul, select_dtypes(include='object') ne renvoie plus
+ces colonnes, affecter une nouvelle modalité lève une TypeError). Tout ce qui
+dépend du typage (copies colonnaires, profil, échantillon, résultats
+d'exécution) est clé par `dtype_cache_tag` : changer la configuration ne
+ressert pas les copies ou les résultats de l'autre typage.
+
+Les entiers ne descendent pas sous 32 bits : l'arithmétique élément par
+élément du code généré (somme de plusieurs items d'échelle, produits...)
+déborderait sans erreur en int8 / int16.
+
+Configuration :
+    DTYPE_OPTIMIZATION        true/false (défaut false)
+    DTYPE_CATEGORY_MAX_RATIO  Modalités / lignes maximal pour passer en category (défaut 0.5)
+    DTYPE_DOWNCAST_FLOATS     true/false (défaut false) : float64 -> float32
+"""
+
+import os
+import logging
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+# Au-delà, les codes et le dictionnaire n'apportent plus grand-chose
+CATEGORY_MAX_UNIQUE = 10000
+
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+# Types texte convertibles en category
+TEXT_DTYPES = ['object', 'str', 'string']
+
+# Types produits par le plan
+COMPACT_DTYPES = ['category', 'int32', 'float32']
+
+
+def optimization_enabled() -> bool:
+    return os.getenv("DTYPE_OPTIMIZATION", "false").lower() == "true"
+
+
+def dtype_cache_tag() -> str:
+    """
+    Suffixe des clés de cache dépendant du typage (vide si DTYPE_OPTIMIZATION=false)
+
+    Pour un contenu de fichier donné, le plan ne dépend que de cette configuration.
+    """
+    if not optimization_enabled():
+        return ""
+
+    tag = f".compact-r{float(os.getenv('DTYPE_CATEGORY_MAX_RATIO', '0.5')):g}"
+    if os.getenv("DTYPE_DOWNCAST_FLOATS", "false").lower() == "true":
+        tag += "-f32"
+    return tag
+
+
+def dtype_plan(profile) -> Dict[str, str]:
+    """
+    Types compacts des colonnes, déduits du profil
+
+    Args:
+        profile: DataProfile du dataset (types, modalités, min/max)
+
+    Returns:
+        {colonne: type cible}, uniquement pour les colonnes à convertir
+    """
+    max_ratio = float(os.getenv("DTYPE_CATEGORY_MAX_RATIO", "0.5"))
+    downcast_floats = os.getenv("DTYPE_DOWNCAST_FLOATS", "false").lower() == "true"
+
+    plan = {}
+    for col in profile.columns:
+        if not isinstance(col, str):
+            continue
+        dtype = str(profile.dtypes[col])
+
+        if dtype in TEXT_DTYPES:
+            unique = profile.unique_counts.get(col, 0)
+            if 0 < unique <= min(CATEGORY_MAX_UNIQUE, profile.n_rows * max_ratio):
+                plan[col] = 'category'
+
+        elif dtype == 'int64':
+            stats = profile.numeric_stats.get(col, {})
+            if stats.get('count') and INT32_MIN <= stats['min'] and stats['max'] <= INT32_MAX:
+                plan[col] = 'int32'
+
+        elif dtype == 'float64' and downcast_floats:
+            plan[col] = 'float32'
+
+    return plan
+
+
+def apply_dtype_plan(df: pd.DataFrame, plan: Dict[str, str]) -> pd.DataFrame:
+    """Applique le plan aux colonnes présentes (les autres sont ignorées)"""
+    plan = {col: dtype for col, dtype in plan.items() if col in df.columns and str(df[col].dtype) != dtype}
+    if not plan:
+        return df
+
+    before = df.memory_usage(deep=False).sum()
+    optimized = df.astype(plan)
+    logger.info(
+        f"Dataset dtypes compacted: {len(plan)} column(s) converted "
+        f"({sum(1 for dtype in plan.values() if dtype == 'category')} to category), "
+        f"shallow memory {before / 1e6:.1f} MB -> {optimized.memory_usage(deep=False).sum() / 1e6:.1f} MB"
+    )
+    return optimized
+
+
+def compact_dtypes(profile) -> Dict[str, str]:
+    """Types compacts enregistrés dans le profil (colonnes à convertir au chargement du fichier source)"""
+    return {
+        col: str(dtype) for col, dtype in profile.dtypes.items()
+        if isinstance(col, str) and str(dtype) in COMPACT_DTYPES
+    }
+
+
+def optimize_dtypes(df: pd.DataFrame, profile) -> pd.DataFrame:
+    """Helper function : DataFrame aux types compacts du profil (inchangé si DTYPE_OPTIMIZATION=false)"""
+    if not optimization_enabled():
+        return df
+    return apply_dtype_plan(df, compact_dtypes(profile))
+
+
+def astype_code(plan: Dict[str, str]) -> str:
+    """Suffixe `.astype({...})` appliquant le plan dans une sandbox (vide si rien à convertir)"""
+    return f".astype({plan!r})" if plan else ""
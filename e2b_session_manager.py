@@ -7,12 +7,24 @@ VERSION CORRIGÉE - Janvier 2026
 
 import os
 import time
+import asyncio
+import hashlib
 import threading
 import logging
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, Optional
-from e2b_code_interpreter import Sandbox
+from typing import Any, Callable, Dict, Optional
 from dotenv import load_dotenv
+from sandbox_pool import pool_from_env
+from execution_backends import get_execution_backend
+from dataset_staging import dataset_stager
+
+try:
+    from e2b_code_interpreter import Sandbox, AsyncSandbox
+except ImportError:
+    # Backends locaux uniquement (EXECUTION_BACKEND=local)
+    Sandbox = Any
+    AsyncSandbox = None
 
 # [OK] CHARGEMENT DES VARIABLES D'ENVIRONNEMENT
 load_dotenv()
@@ -28,16 +40,32 @@ logger = logging.getLogger(__name__)
 class E2BSessionManager:
     """Gestionnaire centralisé des sessions E2B"""
     
-    def __init__(self):
+    def __init__(self, sandbox_factory: Optional[Callable[[], Sandbox]] = None):
+        """
+        Args:
+            sandbox_factory: (Optionnel) Fabrique de sandboxes, par ex. LocalSandbox.create
+                pour les tests. Par défaut : backend de EXECUTION_BACKEND (E2B si absent).
+        """
         self.sessions: Dict[str, Dict] = {}
+        # Verrou global : protège uniquement les dictionnaires (sections courtes)
         self.lock = threading.Lock()
+        # Verrous par utilisateur : tenus pendant la création d'une sandbox
+        self._user_locks: Dict[str, threading.RLock] = {}
+        # Créations non bloquantes en cours
+        self._pending_creations: Dict[str, Future] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("E2B_CREATION_WORKERS", "4")),
+            thread_name_prefix="e2b-create"
+        )
         self.max_idle_time = timedelta(minutes=30)
         self._heartbeat_enabled = False
         
         # [OK] VÉRIFICATION CLÉ API AU DÉMARRAGE
         self.api_key = os.getenv("E2B_API_KEY")
+        self.backend = None if sandbox_factory else get_execution_backend()
+        self.sandbox_factory = sandbox_factory or self.backend.create_sandbox
         
-        if not self.api_key:
+        if not self.api_key and self.backend and self.backend.requires_api_key:
             logger.error("=" * 60)
             logger.error("[ERROR] ERREUR CRITIQUE : E2B_API_KEY non trouvée !")
             logger.error("=" * 60)
@@ -48,65 +76,227 @@ class E2BSessionManager:
             logger.error("=" * 60)
             raise ValueError("E2B_API_KEY manquante dans les variables d'environnement")
         
+        # Pool de sandboxes pré-chauffées (désactivé si E2B_POOL_MIN_SIZE=0)
+        self.pool = pool_from_env(self.sandbox_factory)
+        
         logger.info(f"[OK] E2B Session Manager initialized")
-        logger.info(f"   Clé API : {self.api_key[:10]}...{self.api_key[-5:]}")
+        if self.api_key:
+            logger.info(f"   Clé API : {self.api_key[:10]}...{self.api_key[-5:]}")
+        logger.info(f"   Backend : {self.backend.name if self.backend else 'personnalisé'}")
         logger.info(f"   Heartbeat : désactivé")
+        logger.info(f"   Pool : {'min=' + str(self.pool.min_size) if self.pool else 'désactivé'}")
+    
+    def _new_sandbox(self) -> Sandbox:
+        """Sandbox pré-chauffée du pool si disponible, sinon création directe"""
+        if self.pool:
+            return self.pool.acquire()
+        return self.sandbox_factory()
+    
+    def _get_user_lock(self, user_id: str) -> threading.RLock:
+        """Verrou propre à un utilisateur (créé à la demande)"""
+        with self.lock:
+            user_lock = self._user_locks.get(user_id)
+            if user_lock is None:
+                user_lock = threading.RLock()
+                self._user_locks[user_id] = user_lock
+            return user_lock
     
     def get_sandbox_for_user(self, user_id: str) -> Sandbox:
         """
         Récupère ou crée une sandbox pour un utilisateur
         
+        Seul le verrou de l'utilisateur est tenu pendant la création : la
+        création lente d'une sandbox ne bloque pas les autres utilisateurs.
+        
         Args:
             user_id: ID de l'utilisateur
         
         Returns:
             Instance de Sandbox E2B
         """
-        with self.lock:
-            # Si session existe et est active, la réutiliser
-            if user_id in self.sessions:
-                session_info = self.sessions[user_id]
-                
-                # Vérifier si la session n'est pas expirée
-                idle_time = datetime.now() - session_info['last_used']
-                if idle_time > self.max_idle_time:
-                    logger.warning(f"Session expirée pour {user_id}, recréation...")
-                    self._cleanup_session(user_id)
-                else:
-                    session_info['last_used'] = datetime.now()
-                    logger.debug(f"Réutilisation sandbox pour {user_id}")
-                    return session_info['sandbox']
+        with self._get_user_lock(user_id):
+            expired_session = None
+            
+            with self.lock:
+                # Si session existe et est active, la réutiliser
+                if user_id in self.sessions:
+                    session_info = self.sessions[user_id]
+                    
+                    # Vérifier si la session n'est pas expirée
+                    idle_time = datetime.now() - session_info['last_used']
+                    if idle_time > self.max_idle_time:
+                        logger.warning(f"Session expirée pour {user_id}, recréation...")
+                        expired_session = self.sessions.pop(user_id)
+                    else:
+                        logger.debug(f"Réutilisation sandbox pour {user_id}")
+                        return self._reuse_session(user_id, session_info)
             
-            # Créer nouvelle session
+            if expired_session:
+                self._kill_session(user_id, expired_session)
+            
+            # Créer nouvelle session (hors du verrou global)
             logger.info(f"Création nouvelle sandbox pour {user_id}")
             
             try:
-                # [OK] CORRECTION CRITIQUE : Passer la clé API
-                sandbox = Sandbox.create(
-                    api_key=self.api_key,  # ← LIGNE CRITIQUE AJOUTÉE
-                    timeout=1800  # 30 minutes
-                )
-                
+                sandbox = self._new_sandbox()
+            
+            except Exception as e:
+                logger.error(f"[ERROR] Échec création sandbox pour {user_id}: {e}")
+                if self.api_key:
+                    logger.error(f"   Clé API utilisée : {self.api_key[:10]}...")
+                raise
+            
+            with self.lock:
                 self.sessions[user_id] = {
                     'sandbox': sandbox,
                     'created_at': datetime.now(),
                     'last_used': datetime.now(),
-                    'heartbeat_count': 0
+                    'heartbeat_count': 0,
+                    'restarts': getattr(sandbox, 'restarts', 0)
                 }
-                
-                logger.info(f"[OK] Sandbox créé pour {user_id}: {sandbox.sandbox_id}")
-                return sandbox
             
-            except Exception as e:
-                logger.error(f"[ERROR] Échec création sandbox pour {user_id}: {e}")
-                logger.error(f"   Clé API utilisée : {self.api_key[:10]}...")
-                raise
+            logger.info(f"[OK] Sandbox créé pour {user_id}: {sandbox.sandbox_id}")
+            return sandbox
+    
+    def _reuse_session(self, user_id: str, session_info: Dict) -> Sandbox:
+        """
+        Marque la session comme utilisée et retourne sa sandbox (appelé AVEC le verrou global)
+        
+        Si le kernel de la sandbox a redémarré depuis le dernier appel (worker
+        local relancé après un timeout ou un crash, voir `restarts`), son état
+        est perdu : le préambule et le dataset seront rechargés.
+        """
+        sandbox = session_info['sandbox']
+        session_info['last_used'] = datetime.now()
+        
+        restarts = getattr(sandbox, 'restarts', 0)
+        if restarts != session_info.get('restarts', 0):
+            logger.warning(f"Kernel redémarré pour {user_id}, préambule et dataset à recharger")
+            session_info['restarts'] = restarts
+            session_info.pop('preamble_hash', None)
+            dataset_stager.forget_sandbox(sandbox.sandbox_id)
+        
+        return sandbox
+    
+    def get_sandbox_for_user_async(self, user_id: str) -> Future:
+        """
+        Version non bloquante de get_sandbox_for_user
+        
+        Les appels concurrents pour un même utilisateur partagent le même Future.
+        
+        Returns:
+            Future dont le résultat est la Sandbox
+        """
+        with self.lock:
+            session_info = self.sessions.get(user_id)
+            if session_info and datetime.now() - session_info['last_used'] <= self.max_idle_time:
+                future = Future()
+                future.set_result(self._reuse_session(user_id, session_info))
+                return future
+            
+            pending = self._pending_creations.get(user_id)
+            if pending and not pending.done():
+                return pending
+            
+            future = self._executor.submit(self.get_sandbox_for_user, user_id)
+            self._pending_creations[user_id] = future
+        
+        future.add_done_callback(lambda f: self._forget_pending(user_id, f))
+        return future
+    
+    async def aget_sandbox_for_user(self, user_id: str) -> Sandbox:
+        """Version asyncio de get_sandbox_for_user (création dans les threads de création, sans bloquer la boucle)"""
+        return await asyncio.wrap_future(self.get_sandbox_for_user_async(user_id))
+    
+    async def arun_code(self, user_id: str, code: str):
+        """
+        Exécute du code dans la sandbox de l'utilisateur sans bloquer la boucle asyncio
+        
+        Sandbox E2B : client AsyncSandbox connecté une fois à la même sandbox
+        (même kernel que les appels synchrones), l'annulation de la tâche
+        interrompt la requête. Backends locaux : exécution dans le pool de
+        threads par défaut de la boucle.
+        """
+        sandbox = await self.aget_sandbox_for_user(user_id)
+        
+        if AsyncSandbox is None or not self.backend or self.backend.name != 'e2b':
+            return await asyncio.to_thread(sandbox.run_code, code)
+        
+        with self.lock:
+            session_info = self.sessions.get(user_id, {})
+            async_sandbox = session_info.get('async_sandbox')
+        
+        if async_sandbox is None:
+            async_sandbox = await AsyncSandbox.connect(sandbox.sandbox_id, api_key=self.api_key)
+            with self.lock:
+                if user_id in self.sessions and self.sessions[user_id]['sandbox'] is sandbox:
+                    self.sessions[user_id]['async_sandbox'] = async_sandbox
+        
+        return await async_sandbox.run_code(code)
+    
+    def _forget_pending(self, user_id: str, future: Future):
+        with self.lock:
+            if self._pending_creations.get(user_id) is future:
+                del self._pending_creations[user_id]
+    
+    def ensure_preamble(self, user_id: str, preamble: str) -> bool:
+        """
+        Exécute le préambule (imports, style) une seule fois par session
+        
+        Mode "warm kernel" : le kernel de la sandbox est persistant, les blocs
+        suivants n'envoient plus que leur propre code.
+        
+        Args:
+            user_id: ID de l'utilisateur
+            preamble: Code à exécuter une fois
+        
+        Returns:
+            True si le préambule vient d'être exécuté, False s'il l'était déjà
+        """
+        preamble_hash = hashlib.md5(preamble.encode()).hexdigest()
+        
+        with self._get_user_lock(user_id):
+            sandbox = self.get_sandbox_for_user(user_id)
+            
+            with self.lock:
+                session_info = self.sessions.get(user_id)
+                if session_info and session_info.get('preamble_hash') == preamble_hash:
+                    return False
+            
+            logger.info(f"Préchauffage du kernel pour {user_id}")
+            execution = sandbox.run_code(preamble)
+            
+            if execution.error:
+                raise RuntimeError(f"Échec du préambule : {execution.error.name}: {execution.error.value}")
+            
+            with self.lock:
+                session_info = self.sessions.get(user_id)
+                if session_info and session_info['sandbox'] is sandbox:
+                    session_info['preamble_hash'] = preamble_hash
+        
+        return True
     
     def cleanup_session(self, user_id: str):
-        """Nettoie une session utilisateur"""
+        """
+        Nettoie une session utilisateur et ses sessions annexes
+        
+        Les sessions annexes (`{user_id}::…`) sont celles des voies parallèles,
+        des workers du mode brouillons en lot et des sections générées en
+        parallèle : chacune a sa propre sandbox et sa copie du dataset.
+        """
         with self.lock:
-            if user_id in self.sessions:
-                self._cleanup_session(user_id)
+            session_ids = [
+                session_id for session_id in self.sessions
+                if session_id == user_id or session_id.startswith(f"{user_id}::")
+            ]
+        
+        for session_id in session_ids:
+            with self._get_user_lock(session_id):
+                with self.lock:
+                    session_info = self.sessions.pop(session_id, None)
+                
+                if session_info:
+                    self._kill_session(session_id, session_info)
     
     def get_session_info(self, user_id: str) -> Optional[Dict]:
         """Récupère les informations d'une session"""
@@ -122,29 +312,31 @@ class E2BSessionManager:
                 'last_used': session_info['last_used'].isoformat(),
                 'idle_time': (datetime.now() - session_info['last_used']).total_seconds(),
                 'heartbeat_count': session_info['heartbeat_count'],
+                'kernel_warm': 'preamble_hash' in session_info,
             }
     
-    def _cleanup_session(self, user_id: str):
-        """Nettoie une session (doit être appelé avec le lock)"""
-        if user_id in self.sessions:
-            session_info = self.sessions[user_id]
-            
-            try:
-                sandbox = session_info['sandbox']
-                sandbox.kill()
-                logger.info(f"Sandbox fermé pour {user_id}")
-            except Exception as e:
-                logger.error(f"Erreur fermeture sandbox pour {user_id}: {e}")
-            
-            del self.sessions[user_id]
+    def _kill_session(self, user_id: str, session_info: Dict):
+        """Ferme la sandbox d'une session déjà retirée (appelé SANS le verrou global)"""
+        try:
+            sandbox = session_info['sandbox']
+            sandbox.kill()
+            logger.info(f"Sandbox fermé pour {user_id}")
+        except Exception as e:
+            logger.error(f"Erreur fermeture sandbox pour {user_id}: {e}")
     
     def cleanup_all(self):
         """Nettoie toutes les sessions"""
         logger.info("Nettoyage de toutes les sessions...")
         
         with self.lock:
-            for user_id in list(self.sessions.keys()):
-                self._cleanup_session(user_id)
+            sessions = list(self.sessions.items())
+            self.sessions.clear()
+        
+        for user_id, session_info in sessions:
+            self._kill_session(user_id, session_info)
+        
+        if getattr(self, 'pool', None):
+            self.pool.shutdown()
         
         logger.info("Toutes les sessions nettoyées")
     
@@ -172,6 +364,16 @@ def get_sandbox_for_user(user_id: str) -> Sandbox:
     return get_session_manager().get_sandbox_for_user(user_id)
 
 
+def prefetch_sandbox_for_user(user_id: str) -> Future:
+    """Lance la création de la sandbox en arrière-plan (non bloquant)"""
+    return get_session_manager().get_sandbox_for_user_async(user_id)
+
+
+def warm_kernel_for_user(user_id: str, preamble: str) -> bool:
+    """Helper function pour exécuter le préambule une fois par session"""
+    return get_session_manager().ensure_preamble(user_id, preamble)
+
+
 def execute_python_code(user_id: str, code: str) -> Dict:
     """
     Exécute le code et retourne les résultats formatés
@@ -196,69 +398,94 @@ def execute_python_code(user_id: str, code: str) -> Dict:
         # Exécution du code
         execution = sandbox.run_code(code)
         
-        execution_time = time.time() - start_time
-        
-        # [OK] Gestion des erreurs Python (IndentationError, SyntaxError, etc.)
-        if execution.error:
-            error_msg = f"{execution.error.name}: {execution.error.value}"
-            
-            # Ajouter traceback si disponible
-            if hasattr(execution.error, 'traceback') and execution.error.traceback:
-                error_msg += f"\n{execution.error.traceback}"
-            
-            logger.error(f"Erreur d'exécution : {error_msg}")
-            
-            return {
-                'success': False,
-                'output': '',
-                'charts': [],
-                'error': error_msg,
-                'execution_time': execution_time
-            }
-        
-        # [OK] Collecte du texte (stdout)
-        output_text = ""
-        if execution.logs and execution.logs.stdout:
-            output_text = "\n".join(execution.logs.stdout)
-            logger.info(f"Output capturé : {len(output_text)} chars")
-        
-        # [OK] Collecte des graphiques (PNG base64)
-        charts = []
-        if execution.results:
-            for result in execution.results:
-                if hasattr(result, 'png') and result.png:
-                    charts.append(result.png)
-                    logger.info(f"Graphique capturé")
-        
-        logger.info(f"[OK] Exécution réussie en {execution_time:.2f}s - "
-                   f"{len(output_text)} chars, {len(charts)} graphiques")
+        return _execution_to_result(execution, time.time() - start_time)
+    
+    except Exception as e:
+        return _execution_failure(e, time.time() - start_time)
+
+
+async def aexecute_python_code(user_id: str, code: str) -> Dict:
+    """Version asyncio de execute_python_code (même format de retour)"""
+    start_time = time.time()
+    
+    try:
+        logger.info(f"Exécution code (asyncio) pour {user_id} ({len(code)} chars)")
+        execution = await get_session_manager().arun_code(user_id, code)
         
-        return {
-            'success': True,
-            'output': output_text.strip(),
-            'charts': charts,
-            'error': None,
-            'execution_time': execution_time
-        }
+        return _execution_to_result(execution, time.time() - start_time)
+    
+    except asyncio.CancelledError:
+        logger.info(f"Exécution annulée pour {user_id}")
+        raise
     
     except Exception as e:
-        execution_time = time.time() - start_time
-        logger.error(f"[ERROR] Erreur lors de l'exécution : {e}")
+        return _execution_failure(e, time.time() - start_time)
+
+
+def _execution_to_result(execution, execution_time: float) -> Dict:
+    """Résultat d'exécution d'une sandbox -> dict de execute_python_code"""
+    # [OK] Gestion des erreurs Python (IndentationError, SyntaxError, etc.)
+    if execution.error:
+        error_msg = f"{execution.error.name}: {execution.error.value}"
+        
+        # Ajouter traceback si disponible
+        if hasattr(execution.error, 'traceback') and execution.error.traceback:
+            error_msg += f"\n{execution.error.traceback}"
         
-        import traceback
-        logger.error(f"Traceback :\n{traceback.format_exc()}")
+        logger.error(f"Erreur d'exécution : {error_msg}")
         
         return {
             'success': False,
             'output': '',
             'charts': [],
-            'error': str(e),
+            'error': error_msg,
             'execution_time': execution_time
         }
+    
+    # [OK] Collecte du texte (stdout)
+    output_text = ""
+    if execution.logs and execution.logs.stdout:
+        output_text = "\n".join(execution.logs.stdout)
+        logger.info(f"Output capturé : {len(output_text)} chars")
+    
+    # [OK] Collecte des graphiques (PNG base64)
+    charts = []
+    if execution.results:
+        for result in execution.results:
+            if hasattr(result, 'png') and result.png:
+                charts.append(result.png)
+                logger.info(f"Graphique capturé")
+    
+    logger.info(f"[OK] Exécution réussie en {execution_time:.2f}s - "
+               f"{len(output_text)} chars, {len(charts)} graphiques")
+    
+    return {
+        'success': True,
+        'output': output_text.strip(),
+        'charts': charts,
+        'error': None,
+        'execution_time': execution_time
+    }
+
+
+def _execution_failure(e: Exception, execution_time: float) -> Dict:
+    """Exception levée pendant l'exécution -> dict d'échec de execute_python_code"""
+    logger.error(f"[ERROR] Erreur lors de l'exécution : {e}")
+    
+    import traceback
+    logger.error(f"Traceback :\n{traceback.format_exc()}")
+    
+    return {
+        'success': False,
+        'output': '',
+        'charts': [],
+        'error': str(e),
+        'execution_time': execution_time
+    }
 
 
 def cleanup_user_session(user_id: str):
-    """Nettoie la session d'un utilisateur"""
+    """Nettoie la session d'un utilisateur (et ses sessions annexes)"""
     get_session_manager().cleanup_session(user_id)
 
 
@@ -383,4 +610,4 @@ print("Graphique généré")
     
     print("\n" + "=" * 60)
     print("[OK] TOUS LES TESTS RÉUSSIS")
-    print("=" * 60)
\ No newline at end of file
+    print("=" * 60)
\ No newline at end of file
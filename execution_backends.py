@@ -0,0 +1,101 @@
+"""
+Backends d'exécution du code Python
+Interface commune pour créer les sandboxes utilisées par e2b_session_manager :
+toutes exposent run_code / files.write / kill, et execute_python_code retourne
+le même dict quel que soit le backend.
+
+Sélection par variable d'environnement EXECUTION_BACKEND :
+    e2b        Sandbox E2B distante (défaut, nécessite E2B_API_KEY)
+    local      Sous-processus local avec limites de ressources (on-prem de confiance)
+    inprocess  Exécution dans le processus courant (tests uniquement)
+"""
+
+import os
+import logging
+from typing import Any, Dict, Type
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionBackend:
+    """Interface d'un backend d'exécution"""
+
+    name = "base"
+    requires_api_key = False
+
+    def create_sandbox(self) -> Any:
+        """Crée une sandbox (run_code, files.write, kill, sandbox_id)"""
+        raise NotImplementedError
+
+
+class E2BBackend(ExecutionBackend):
+    """Sandboxes E2B distantes"""
+
+    name = "e2b"
+    requires_api_key = True
+
+    def __init__(self, api_key: str = None, timeout: int = 1800):
+        self.api_key = api_key or os.getenv("E2B_API_KEY")
+        self.timeout = timeout
+
+    def create_sandbox(self) -> Any:
+        from e2b_code_interpreter import Sandbox
+
+        return Sandbox.create(
+            api_key=self.api_key,
+            timeout=self.timeout  # 30 minutes
+        )
+
+
+class LocalProcessBackend(ExecutionBackend):
+    """Un sous-processus Python par sandbox, sans latence réseau"""
+
+    name = "local"
+
+    def __init__(self, timeout: float = None, memory_mb: int = None, cpu_seconds: int = None):
+        self.timeout = timeout or float(os.getenv("LOCAL_SANDBOX_TIMEOUT", "120"))
+        self.memory_mb = memory_mb if memory_mb is not None else int(os.getenv("LOCAL_SANDBOX_MEMORY_MB", "4096"))
+        self.cpu_seconds = cpu_seconds if cpu_seconds is not None else int(os.getenv("LOCAL_SANDBOX_CPU_SECONDS", "0"))
+
+    def create_sandbox(self) -> Any:
+        from local_sandbox import LocalProcessSandbox
+
+        return LocalProcessSandbox(
+            timeout=self.timeout,
+            memory_mb=self.memory_mb,
+            cpu_seconds=self.cpu_seconds
+        )
+
+
+class InProcessBackend(ExecutionBackend):
+    """Exécution dans le processus courant (tests, aucune isolation)"""
+
+    name = "inprocess"
+
+    def create_sandbox(self) -> Any:
+        from local_sandbox import LocalSandbox
+
+        return LocalSandbox()
+
+
+BACKENDS: Dict[str, Type[ExecutionBackend]] = {
+    E2BBackend.name: E2BBackend,
+    LocalProcessBackend.name: LocalProcessBackend,
+    InProcessBackend.name: InProcessBackend,
+}
+
+
+def get_execution_backend(name: str = None) -> ExecutionBackend:
+    """
+    Instancie le backend demandé (ou celui de EXECUTION_BACKEND)
+
+    Raises:
+        ValueError si le backend est inconnu
+    """
+    name = (name or os.getenv("EXECUTION_BACKEND", "e2b")).lower()
+
+    if name not in BACKENDS:
+        raise ValueError(f"Backend d'exécution inconnu : {name} (choix : {', '.join(BACKENDS)})")
+
+    logger.info(f"Execution backend: {name}")
+    return BACKENDS[name]()
@@ -0,0 +1,224 @@
+"""
+Cache des résultats d'exécution de code (adressé par contenu)
+Lorsqu'un chapitre est regénéré, le LLM réémet souvent des blocs identiques :
+leurs résultats (stdout + graphiques PNG) sont servis depuis le disque.
+
+Clé = hash(dataset, code normalisé du bloc et de ses dépendances, versions des
+bibliothèques, contexte du bloc). Éviction LRU quand la taille dépasse la limite :
+la taille est tenue à jour à chaque écriture, le dossier n'est parcouru que
+lorsque la limite est dépassée.
+
+Configuration :
+    EXECUTION_CACHE_ENABLED  true/false (défaut true)
+    EXECUTION_CACHE_DIR      Dossier du cache (défaut cache/executions)
+    EXECUTION_CACHE_MAX_MB   Taille maximale (défaut 500)
+"""
+
+import os
+import ast
+import json
+import time
+import base64
+import shutil
+import hashlib
+import threading
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_code(code: str) -> str:
+    """
+    Forme canonique d'un bloc : commentaires, espaces et lignes vides ignorés
+
+    Deux blocs qui ne diffèrent que par la mise en forme ont la même clé.
+    """
+    try:
+        return ast.unparse(ast.parse(code))
+    except SyntaxError:
+        return "\n".join(line.rstrip() for line in code.strip().splitlines() if line.strip())
+
+
+class ExecutionResultCache:
+    """Cache disque des résultats d'exécution, avec éviction LRU par taille"""
+
+    def __init__(self, cache_dir: str = "cache/executions", max_size_mb: int = 500):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0}
+        # Taille courante estimée (resynchronisée par evict, le dossier pouvant être partagé entre processus)
+        self._total_size = self.get_size()
+
+    @staticmethod
+    def make_key(
+        dataset_hash: str,
+        code: str,
+        dependency_codes: List[str] = (),
+        library_versions: Optional[Dict[str, str]] = None,
+        context: Optional[Dict] = None
+    ) -> str:
+        """
+        Clé de cache d'un bloc
+
+        Args:
+            dataset_hash: Hash du contenu du dataset
+            code: Code du bloc
+            dependency_codes: Codes des blocs précédents dont il dépend (état du kernel)
+            library_versions: Versions pandas/numpy/matplotlib/... de la sandbox
+            context: Autres valeurs injectées dans le bloc (numéro de chapitre, ...)
+        """
+        payload = json.dumps({
+            'dataset': dataset_hash,
+            'code': normalize_code(code),
+            'dependencies': [normalize_code(c) for c in dependency_codes],
+            'libraries': library_versions or {},
+            'context': context or {},
+        }, sort_keys=True)
+
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    @staticmethod
+    def _dir_size(entry_dir: Path) -> int:
+        return sum(f.stat().st_size for f in entry_dir.iterdir())
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Récupère un résultat (même format que execute_python_code)
+
+        Returns:
+            Dict résultat avec 'cached': True, ou None
+        """
+        entry_dir = self._entry_dir(key)
+        meta_file = entry_dir / "result.json"
+
+        try:
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+
+            charts = []
+            for i in range(meta['chart_count']):
+                charts.append(base64.b64encode((entry_dir / f"chart_{i}.png").read_bytes()).decode('utf-8'))
+        except (OSError, ValueError, KeyError):
+            with self.lock:
+                self.stats['misses'] += 1
+            return None
+
+        # LRU : la date de modification sert de date de dernier accès
+        os.utime(meta_file, None)
+
+        with self.lock:
+            self.stats['hits'] += 1
+
+        return {
+            'success': True,
+            'output': meta['output'],
+            'charts': charts,
+            'error': None,
+            'execution_time': 0.0,
+            'cached': True
+        }
+
+    def set(self, key: str, result: Dict):
+        """Enregistre un résultat réussi (les erreurs ne sont jamais mises en cache)"""
+        if not result.get('success'):
+            return
+
+        entry_dir = self._entry_dir(key)
+        tmp_dir = entry_dir.with_name(f"{key}.tmp{threading.get_ident()}")
+
+        try:
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+
+            charts = result.get('charts') or []
+            for i, chart_b64 in enumerate(charts):
+                (tmp_dir / f"chart_{i}.png").write_bytes(base64.b64decode(chart_b64))
+
+            with open(tmp_dir / "result.json", 'w', encoding='utf-8') as f:
+                json.dump({
+                    'output': result.get('output') or '',
+                    'chart_count': len(charts),
+                    'original_execution_time': result.get('execution_time'),
+                    'stored_at': time.time()
+                }, f, ensure_ascii=False)
+
+            size = self._dir_size(tmp_dir)
+            replaced = 0
+            if entry_dir.exists():
+                replaced = self._dir_size(entry_dir)
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            tmp_dir.rename(entry_dir)
+
+        except Exception as e:
+            logger.warning(f"Failed to store execution result in cache: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        with self.lock:
+            self.stats['stored'] += 1
+            self._total_size += size - replaced
+            over_limit = self._total_size > self.max_size_bytes
+
+        if over_limit:
+            self.evict()
+
+    def evict(self):
+        """Supprime les entrées les moins récemment utilisées au-delà de la taille maximale (parcourt tout le cache)"""
+        with self.lock:
+            entries = []
+            total_size = 0
+
+            for meta_file in self.cache_dir.glob("*/*/result.json"):
+                entry_dir = meta_file.parent
+                try:
+                    size = self._dir_size(entry_dir)
+                    entries.append((meta_file.stat().st_mtime, size, entry_dir))
+                except OSError:
+                    continue
+                total_size += size
+
+            if total_size > self.max_size_bytes:
+                for _, size, entry_dir in sorted(entries):
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                    total_size -= size
+                    self.stats['evicted'] += 1
+                    if total_size <= self.max_size_bytes:
+                        break
+
+            self._total_size = total_size
+
+    def get_size(self) -> int:
+        """Taille du cache en octets"""
+        return sum(f.stat().st_size for f in self.cache_dir.glob("*/*/*") if f.is_file())
+
+    def clear(self):
+        """Vide le cache"""
+        with self.lock:
+            for entry_dir in self.cache_dir.glob("*/*"):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            self._total_size = 0
+
+
+_execution_cache = None
+
+
+def get_execution_cache() -> Optional[ExecutionResultCache]:
+    """Instance globale du cache (None si désactivé par EXECUTION_CACHE_ENABLED=false)"""
+    global _execution_cache
+
+    if os.getenv("EXECUTION_CACHE_ENABLED", "true").lower() != "true":
+        return None
+
+    if _execution_cache is None:
+        _execution_cache = ExecutionResultCache(
+            cache_dir=os.getenv("EXECUTION_CACHE_DIR", "cache/executions"),
+            max_size_mb=int(os.getenv("EXECUTION_CACHE_MAX_MB", "500"))
+        )
+
+    return _execution_cache
@@ -0,0 +1,634 @@
+"""
+File de jobs de génération de rapport (hors du cycle de rerun Streamlit)
+La génération des chapitres restants est soumise comme un job dans une base
+SQLite locale ; des processus workers la réclament et génèrent les brouillons
+(ReportGenerationWorkflow.generate_drafts), en enregistrant l'état de chaque
+chapitre au fur et à mesure. L'interface interroge la base et reprend les
+brouillons terminés : un rerun ou une déconnexion du navigateur ne perd plus
+le travail, et le processus Streamlit n'est plus occupé pendant la génération.
+
+    - réclamation atomique (BEGIN IMMEDIATE) : plusieurs workers, sur autant de
+      processus que nécessaire, partagent la même file
+    - un worker tient son job par un battement régulier ; un job dont le
+      battement s'arrête (worker tué) est repris par un autre worker, sans
+      regénérer les chapitres déjà terminés
+    - seul le worker qui tient le job écrit ses résultats : un worker qui a
+      perdu son bail (battement en retard) s'arrête sans rien écraser
+    - annulation : un job en attente est annulé aussitôt, un job en cours
+      s'arrête avant de démarrer un nouveau chapitre
+
+Workers :
+    - lancés par l'application (JOB_LOCAL_WORKERS processus, voir ensure_local_workers)
+    - ou séparément : python generation_jobs.py --workers 4
+
+Configuration :
+    GENERATION_JOBS        true/false (défaut false) : génération en lot via la file de jobs
+    JOB_QUEUE_PATH         Base SQLite de la file (défaut cache/generation_jobs.sqlite3)
+    JOB_LOCAL_WORKERS      Workers lancés par l'application (défaut 2, 0 = workers externes)
+    JOB_LEASE_SECONDS      Délai sans battement avant reprise d'un job (défaut 300)
+    JOB_MAX_ATTEMPTS       Reprises maximales d'un job (défaut 3)
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# États d'un job
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATUSES = [JOB_DONE, JOB_FAILED, JOB_CANCELLED]
+
+# États d'un chapitre dans un job
+CHAPTER_QUEUED = "queued"
+CHAPTER_GENERATING = "generating"
+CHAPTER_GENERATED = "generated"
+CHAPTER_FAILED = "failed"
+
+JOB_STATUS_LABELS = {
+    JOB_QUEUED: "En file d'attente",
+    JOB_RUNNING: "En cours",
+    JOB_DONE: "Terminé",
+    JOB_FAILED: "Échec",
+    JOB_CANCELLED: "Annulé",
+}
+
+CHAPTER_STATUS_LABELS = {
+    CHAPTER_QUEUED: "En attente",
+    CHAPTER_GENERATING: "En cours de génération",
+    CHAPTER_GENERATED: "Brouillon prêt",
+    CHAPTER_FAILED: "Erreur",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_chapters (
+    job_id TEXT NOT NULL,
+    number TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT,
+    status TEXT NOT NULL,
+    content TEXT,
+    raw_content TEXT,
+    preview INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL,
+    PRIMARY KEY (job_id, number)
+);
+"""
+
+
+def jobs_enabled() -> bool:
+    return os.getenv("GENERATION_JOBS", "false").lower() == "true"
+
+
+class JobCancelled(Exception):
+    """Levée dans un worker quand l'annulation du job est demandée"""
+
+
+class JobLeaseLost(Exception):
+    """Levée dans un worker dont le job a été repris par un autre worker"""
+
+
+class JobQueue:
+    """File de jobs persistée dans SQLite (une connexion courte par opération, sûre entre processus)"""
+
+    def __init__(self, db_path: str = "cache/generation_jobs.sqlite3", lease_seconds: float = 300,
+                 max_attempts: int = 3):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        """Transaction en écriture exclusive (réclamation atomique entre processus)"""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    # ─── Côté application ─────────────────────────────────────────
+
+    def submit(self, user_id: str, payload: Dict) -> str:
+        """
+        Ajoute un job à la file
+
+        Args:
+            payload: Voir job_payload ('chapters' : [(numéro, titre)] à générer)
+
+        Returns:
+            Identifiant du job
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO jobs (id, user_id, payload, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, user_id, json.dumps(payload, ensure_ascii=False, default=str), JOB_QUEUED, now)
+            )
+            db.executemany(
+                "INSERT INTO job_chapters (job_id, number, position, title, status, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(job_id, str(number), position, title, CHAPTER_QUEUED, now)
+                 for position, (number, title) in enumerate(payload['chapters'])]
+            )
+
+        logger.info(f"Generation job {job_id} submitted for {user_id} ({len(payload['chapters'])} chapters)")
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """État du job et de ses chapitres (dans l'ordre du plan), None si inconnu"""
+        with self._connect() as db:
+            job = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            chapters = db.execute(
+                "SELECT * FROM job_chapters WHERE job_id = ? ORDER BY position", (job_id,)
+            ).fetchall()
+
+        status = {key: job[key] for key in job.keys() if key != 'payload'}
+        status['chapters'] = [dict(chapter) for chapter in chapters]
+        status['generated'] = sum(1 for chapter in chapters if chapter['status'] == CHAPTER_GENERATED)
+        status['finished'] = job['status'] in FINISHED_STATUSES
+        return status
+
+    def jobs_for_user(self, user_id: str, active_only: bool = True) -> List[str]:
+        """Identifiants des jobs d'un utilisateur, du plus récent au plus ancien"""
+        query = "SELECT id FROM jobs WHERE user_id = ?"
+        if active_only:
+            query += f" AND status IN ('{JOB_QUEUED}', '{JOB_RUNNING}')"
+        with self._connect() as db:
+            return [row['id'] for row in db.execute(query + " ORDER BY created_at DESC", (user_id,))]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Annule un job : immédiatement s'il est en attente, sinon au prochain chapitre
+
+        Returns:
+            True si le job n'était pas déjà terminé
+        """
+        with self._transaction() as db:
+            job = db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None or job['status'] in FINISHED_STATUSES:
+                return False
+            if job['status'] == JOB_QUEUED:
+                db.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?",
+                    (JOB_CANCELLED, time.time(), job_id)
+                )
+            else:
+                db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+
+        logger.info(f"Generation job {job_id} cancellation requested")
+        return True
+
+    # ─── Côté worker ──────────────────────────────────────────────
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """
+        Réclame le plus ancien job en attente, ou un job dont le worker ne bat plus
+
+        Returns:
+            {'id', 'user_id', 'payload', 'attempts'} ou None si la file est vide
+        """
+        now = time.time()
+
+        with self._transaction() as db:
+            # Jobs abandonnés trop souvent : en échec plutôt que repris indéfiniment
+            db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? "
+                "WHERE status = ? AND heartbeat_at < ? AND attempts >= ?",
+                (JOB_FAILED, now, "Worker arrêté trop souvent pendant ce job",
+                 JOB_RUNNING, now - self.lease_seconds, self.max_attempts)
+            )
+            job = db.execute(
+                "SELECT * FROM jobs WHERE status = ? OR (status = ? AND heartbeat_at < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (JOB_QUEUED, JOB_RUNNING, now - self.lease_seconds)
+            ).fetchone()
+            if job is None:
+                return None
+
+            if job['status'] == JOB_RUNNING:
+                logger.warning(f"Generation job {job['id']} abandoned by {job['worker']}, resumed by {worker_id}")
+            db.execute(
+                "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, "
+                "started_at = COALESCE(started_at, ?), heartbeat_at = ? WHERE id = ?",
+                (JOB_RUNNING, worker_id, now, now, job['id'])
+            )
+
+        return {
+            'id': job['id'],
+            'user_id': job['user_id'],
+            'payload': json.loads(job['payload']),
+            'attempts': job['attempts'] + 1
+        }
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Prolonge le bail du worker sur le job (False s'il a été repris par un autre)"""
+        with self._connect() as db:
+            updated = db.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (time.time(), job_id, worker_id, JOB_RUNNING)
+            ).rowcount
+        return updated == 1
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._connect() as db:
+            job = db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(job and job['cancel_requested'])
+
+    def update_chapter(self, job_id: str, worker_id: str, number: str, status: str, content: str = None,
+                       raw_content: str = None, preview: bool = False, error: str = None) -> bool:
+        """Enregistre l'état d'un chapitre (False si le worker ne tient plus le job)"""
+        with self._connect() as db:
+            updated = db.execute(
+                "UPDATE job_chapters SET status = ?, content = ?, raw_content = ?, preview = ?, error = ?, updated_at = ? "
+                "WHERE job_id = ? AND number = ? "
+                "AND EXISTS (SELECT 1 FROM jobs WHERE id = ? AND worker = ? AND status = ?)",
+                (status, content, raw_content, int(preview), error, time.time(), job_id, str(number),
+                 job_id, worker_id, JOB_RUNNING)
+            ).rowcount
+        return updated == 1
+
+    def finish(self, job_id: str, worker_id: str, status: str, error: str = None) -> bool:
+        """Termine le job (False si le worker ne le tient plus : rien n'est modifié)"""
+        with self._connect() as db:
+            updated = db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (status, error, time.time(), job_id, worker_id, JOB_RUNNING)
+            ).rowcount
+        if updated != 1:
+            logger.warning(f"Generation job {job_id} not finished by {worker_id}: lease lost")
+            return False
+
+        logger.info(f"Generation job {job_id} {status}" + (f": {error}" if error else ""))
+        return True
+
+
+def queue_from_env(db_path: str = None) -> JobQueue:
+    """File configurée par les variables d'environnement (db_path : autre base que JOB_QUEUE_PATH)"""
+    return JobQueue(
+        db_path=db_path or os.getenv("JOB_QUEUE_PATH", "cache/generation_jobs.sqlite3"),
+        lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", "300")),
+        max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    )
+
+
+_job_queue = None
+
+
+def get_job_queue() -> JobQueue:
+    """Instance globale de la file (variables d'environnement)"""
+    global _job_queue
+
+    if _job_queue is None:
+        _job_queue = queue_from_env()
+
+    return _job_queue
+
+
+# ═══════════════════════════════════════════════════════════════
+# APPLICATION : SOUMISSION ET REPRISE DES RÉSULTATS
+# ═══════════════════════════════════════════════════════════════
+
+def job_payload(workflow, study_context=None) -> Dict:
+    """
+    Tout ce dont un worker a besoin pour reconstruire le workflow dans son processus
+
+    Les chapitres à générer sont les chapitres restants en attente, rejetés ou
+    en erreur (comme generate_drafts) ; les brouillons déjà générés sont
+    transmis pour servir de contexte aux synthèses.
+    """
+    from chapter_workflow import ChapterStatus
+
+    remaining = workflow.chapters[workflow.current_chapter_index:]
+    return {
+        'plan': workflow.plan,
+        'csv_path': workflow.csv_path,
+        'preview_mode': workflow.preview_mode,
+        'study_context': study_context.to_dict() if study_context else None,
+        'current_chapter_index': workflow.current_chapter_index,
+        'chapters': [
+            (chapter.number, chapter.title) for chapter in remaining
+            if chapter.status in [ChapterStatus.PENDING, ChapterStatus.REJECTED, ChapterStatus.ERROR]
+        ],
+        'drafts': {
+            chapter.number: chapter.content for chapter in remaining
+            if chapter.status == ChapterStatus.GENERATED and chapter.content
+        },
+        'instructions': {
+            chapter.number: chapter.regeneration_instructions for chapter in remaining
+            if chapter.regeneration_instructions
+        }
+    }
+
+
+def submit_generation_job(workflow, study_context=None) -> str:
+    """Helper function pour soumettre la génération des chapitres restants d'un workflow"""
+    return get_job_queue().submit(workflow.user_id, job_payload(workflow, study_context))
+
+
+def apply_job_results(workflow, status: Dict) -> List[str]:
+    """
+    Reporte dans le workflow de l'interface les chapitres terminés par le job
+
+    Returns:
+        Numéros des chapitres mis à jour
+    """
+    from chapter_workflow import ChapterStatus
+
+    applied = []
+    for job_chapter in status['chapters']:
+        chapter = workflow._find_chapter(job_chapter['number'])
+        if chapter is None or chapter.status in [ChapterStatus.GENERATED, ChapterStatus.VALIDATED]:
+            continue
+
+        if job_chapter['status'] == CHAPTER_GENERATED:
+            chapter.content = job_chapter['content']
+            chapter.raw_content = job_chapter['raw_content']
+            chapter.preview = bool(job_chapter['preview'])
+            chapter.status = ChapterStatus.GENERATED
+            chapter.generated_at = datetime.fromtimestamp(job_chapter['updated_at'])
+            applied.append(chapter.number)
+
+        elif job_chapter['status'] == CHAPTER_FAILED and chapter.status != ChapterStatus.ERROR:
+            chapter.status = ChapterStatus.ERROR
+            chapter.error_message = job_chapter['error']
+            applied.append(chapter.number)
+
+    return applied
+
+
+# ═══════════════════════════════════════════════════════════════
+# WORKERS
+# ═══════════════════════════════════════════════════════════════
+
+def build_job_workflow(user_id: str, payload: Dict, done: Dict[str, Dict] = None):
+    """
+    Workflow reconstruit dans le worker à partir du payload
+
+    Args:
+        done: Chapitres déjà générés par une tentative précédente du job
+              (repris comme brouillons, non regénérés)
+    """
+    from chapter_workflow import ChapterStatus, ReportGenerationWorkflow
+
+    study_context = None
+    if payload.get('study_context'):
+        from study_context import StudyContext
+        study_context = StudyContext.from_dict(payload['study_context'])
+
+    workflow = ReportGenerationWorkflow(
+        user_id, payload['plan'], payload['csv_path'],
+        study_context=study_context, preview_mode=payload.get('preview_mode')
+    )
+    workflow.current_chapter_index = payload.get('current_chapter_index', 0)
+
+    to_generate = {str(number) for number, _ in payload['chapters']} - set(done or {})
+    drafts = {**payload.get('drafts', {}), **{number: chapter['content'] for number, chapter in (done or {}).items()}}
+
+    for chapter in workflow.chapters[workflow.current_chapter_index:]:
+        chapter.regeneration_instructions = payload.get('instructions', {}).get(chapter.number)
+        if chapter.number in to_generate:
+            continue
+        # Hors du lot : brouillon existant (contexte des synthèses) ou chapitre ignoré
+        chapter.status = ChapterStatus.GENERATED if chapter.number in drafts else ChapterStatus.VALIDATED
+        chapter.content = drafts.get(chapter.number)
+
+    return workflow
+
+
+class _Heartbeat(threading.Thread):
+    """Battement du worker sur son job pendant toute la génération (`lost` : bail perdu)"""
+
+    def __init__(self, queue: JobQueue, job_id: str, worker_id: str):
+        super().__init__(name=f"job-heartbeat-{job_id[:8]}", daemon=True)
+        self.queue = queue
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.stopped = threading.Event()
+        self.lost = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(max(1.0, self.queue.lease_seconds / 3)):
+            if not self.queue.heartbeat(self.job_id, self.worker_id):
+                logger.warning(f"Generation job {self.job_id} lease lost by {self.worker_id}")
+                self.lost.set()
+                return
+
+
+def process_job(queue: JobQueue, job: Dict, worker_id: str):
+    """
+    Génère les chapitres d'un job réclamé, en enregistrant chaque chapitre terminé
+
+    Si le bail est perdu (job repris par un autre worker), les chapitres
+    suivants ne sont pas démarrés et le job est laissé à son nouveau worker.
+    """
+    job_id = job['id']
+    heartbeat = _Heartbeat(queue, job_id, worker_id)
+    heartbeat.start()
+
+    def update_chapter(number: str, status: str, **fields):
+        if heartbeat.lost.is_set() or not queue.update_chapter(job_id, worker_id, number, status, **fields):
+            heartbeat.lost.set()
+            raise JobLeaseLost(f"Job {job_id} repris par un autre worker")
+
+    try:
+        status = queue.status(job_id)
+        done = {c['number']: c for c in status['chapters'] if c['status'] == CHAPTER_GENERATED}
+        if done:
+            logger.info(f"Generation job {job_id}: resuming, {len(done)} chapter(s) already generated")
+
+        workflow = build_job_workflow(job['user_id'], job['payload'], done)
+
+        def progress(chapter, result):
+            if result is None:
+                if queue.cancel_requested(job_id):
+                    raise JobCancelled(f"Job {job_id} annulé")
+                update_chapter(chapter.number, CHAPTER_GENERATING)
+            elif result['success']:
+                update_chapter(
+                    chapter.number, CHAPTER_GENERATED,
+                    content=result['content'], raw_content=chapter.raw_content, preview=chapter.preview
+                )
+            else:
+                update_chapter(chapter.number, CHAPTER_FAILED, error=result['error'])
+
+        results = workflow.generate_drafts(on_progress=progress)
+
+        if heartbeat.lost.is_set():
+            logger.warning(f"Generation job {job_id} left to its new worker by {worker_id}")
+            return
+
+        if queue.cancel_requested(job_id):
+            for number, result in results.items():
+                if isinstance(result, JobCancelled):
+                    update_chapter(number, CHAPTER_QUEUED)
+            queue.finish(job_id, worker_id, JOB_CANCELLED)
+            return
+
+        failed = [
+            number for number, result in results.items()
+            if isinstance(result, Exception) or not result['success']
+        ]
+        queue.finish(job_id, worker_id, JOB_DONE,
+                     error=f"Chapitre(s) en échec : {', '.join(failed)}" if failed else None)
+
+    except JobLeaseLost as e:
+        logger.warning(f"Generation job {job_id} stopped: {e}")
+
+    except Exception as e:
+        logger.error(f"Generation job {job_id} failed: {e}")
+        queue.finish(job_id, worker_id, JOB_FAILED, error=str(e))
+
+    finally:
+        heartbeat.stopped.set()
+
+
+def run_worker(db_path: str = None, worker_id: str = None, poll_interval: float = 1.0,
+               stop: threading.Event = None, max_jobs: int = None):
+    """
+    Boucle d'un worker : réclame et traite les jobs jusqu'à l'arrêt
+
+    Args:
+        db_path: Base de la file (défaut JOB_QUEUE_PATH)
+        stop: Événement d'arrêt (défaut : jamais)
+        max_jobs: Nombre de jobs à traiter avant de s'arrêter (défaut : illimité)
+    """
+    queue = queue_from_env(db_path) if db_path else get_job_queue()
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    stop = stop or threading.Event()
+    handled = 0
+
+    logger.info(f"Generation worker {worker_id} started ({queue.db_path})")
+
+    while not stop.is_set():
+        job = queue.claim(worker_id)
+        if job is None:
+            stop.wait(poll_interval)
+            continue
+
+        logger.info(f"Worker {worker_id} processing job {job['id']} (attempt {job['attempts']})")
+        process_job(queue, job, worker_id)
+
+        handled += 1
+        if max_jobs and handled >= max_jobs:
+            break
+
+
+_local_workers: List = []
+_local_workers_stopper_registered = False
+
+
+def ensure_local_workers(count: int = None) -> int:
+    """
+    Lance les processus workers de l'application (une fois par processus serveur)
+
+    Les workers sont des processus séparés (démarrage spawn) : la génération
+    continue pendant les reruns Streamlit et n'occupe pas le serveur.
+
+    Returns:
+        Nombre de workers locaux actifs
+    """
+    import atexit
+    import multiprocessing
+
+    global _local_workers_stopper_registered
+
+    if count is None:
+        count = int(os.getenv("JOB_LOCAL_WORKERS", "2"))
+
+    _local_workers[:] = [process for process in _local_workers if process.is_alive()]
+    if len(_local_workers) >= count:
+        return len(_local_workers)
+
+    # Non daemon : les sandboxes locales lancent elles-mêmes des processus
+    context = multiprocessing.get_context('spawn')
+    for _ in range(count - len(_local_workers)):
+        process = context.Process(
+            target=run_worker,
+            kwargs={'db_path': str(get_job_queue().db_path)},
+            name="generation-worker"
+        )
+        process.start()
+        _local_workers.append(process)
+
+    if not _local_workers_stopper_registered:
+        atexit.register(lambda: [process.terminate() for process in _local_workers if process.is_alive()])
+        _local_workers_stopper_registered = True
+
+    logger.info(f"{len(_local_workers)} local generation worker(s) running")
+    return len(_local_workers)
+
+
+if __name__ == "__main__":
+    import argparse
+    import multiprocessing
+
+    parser = argparse.ArgumentParser(description="Workers de la file de génération de rapports")
+    parser.add_argument("--workers", type=int, default=1, help="Nombre de processus workers")
+    parser.add_argument("--queue", default=None, help="Base SQLite de la file (défaut JOB_QUEUE_PATH)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.workers == 1:
+        run_worker(db_path=args.queue)
+    else:
+        context = multiprocessing.get_context('spawn')
+        processes = [
+            context.Process(target=run_worker, kwargs={'db_path': args.queue}, name=f"generation-worker-{i}")
+            for i in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
@@ -0,0 +1,303 @@
+"""
+Registre des fournisseurs LLM
+Les clients (Gemini, google-genai, Anthropic) sont créés une seule fois par
+processus et réutilisés par tous les chapitres et tous les utilisateurs :
+plus de genai.configure / GenerativeModel / Anthropic() à chaque appel, et les
+connexions HTTP restent ouvertes (keep-alive) entre deux requêtes.
+
+Chaque fournisseur a aussi une interface asyncio (agenerate / astream) pour
+AsyncReportGenerationWorkflow : clients asynchrones natifs quand le SDK en
+fournit, sinon appel synchrone dans le pool de threads de la boucle.
+
+Fournisseurs :
+    gemini     google.generativeai (GMINI_API_KEY), un GenerativeModel par modèle
+    genai      google.genai Client (GMINI_API_KEY)
+    anthropic  SDK Anthropic (ANTHROPIC_API_KEY)
+    fake       Réponses scriptées, sans réseau (tests)
+"""
+
+import os
+import asyncio
+import threading
+import logging
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Type
+
+logger = logging.getLogger(__name__)
+
+
+class LLMProvider:
+    """Interface d'un fournisseur LLM (instance partagée, thread-safe)"""
+
+    name = "base"
+    default_model: Optional[str] = None
+
+    def generate(self, prompt: str, model: str = None, temperature: float = None, max_tokens: int = None) -> str:
+        """Retourne la réponse complète"""
+        raise NotImplementedError
+
+    def stream(self, prompt: str, model: str = None, temperature: float = None, max_tokens: int = None) -> Iterator[str]:
+        """Retourne la réponse fragment par fragment (par défaut : en un seul fragment)"""
+        yield self.generate(prompt, model=model, temperature=temperature, max_tokens=max_tokens)
+
+    async def agenerate(self, prompt: str, model: str = None, temperature: float = None, max_tokens: int = None) -> str:
+        """Version asyncio de generate (par défaut : generate dans le pool de threads de la boucle)"""
+        return await asyncio.to_thread(self.generate, prompt, model=model, temperature=temperature, max_tokens=max_tokens)
+
+    async def astream(self, prompt: str, model: str = None, temperature: float = None,
+                      max_tokens: int = None) -> AsyncIterator[str]:
+        """Version asyncio de stream (par défaut : la réponse complète en un seul fragment)"""
+        yield await self.agenerate(prompt, model=model, temperature=temperature, max_tokens=max_tokens)
+
+
+class GeminiProvider(LLMProvider):
+    """google.generativeai : configuration unique, un GenerativeModel réutilisé par modèle"""
+
+    name = "gemini"
+    default_model = "gemini-1.5-flash"
+
+    def __init__(self, api_key: str = None):
+        import google.generativeai as genai
+
+        self._genai = genai
+        self._genai.configure(api_key=api_key or os.getenv("GMINI_API_KEY"))
+        self._models: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def get_model(self, model: str = None):
+        """GenerativeModel mis en cache par nom de modèle"""
+        model = model or self.default_model
+
+        with self._lock:
+            if model not in self._models:
+                self._models[model] = self._genai.GenerativeModel(model)
+            return self._models[model]
+
+    def _generation_config(self, temperature: float = None, max_tokens: int = None) -> Optional[Dict]:
+        config = {}
+        if temperature is not None:
+            config['temperature'] = temperature
+        if max_tokens is not None:
+            config['max_output_tokens'] = max_tokens
+        return config or None
+
+    def generate(self, prompt: str, model: str = None, temperature: float = None, max_tokens: int = None) -> str:
+        response = self.get_model(model).generate_content(
+            prompt,
+            generation_config=self._generation_config(temperature, max_tokens)
+        )
+        return response.text
+
+    def stream(self, prompt: str, model: str = None, temperature: float = None, max_tokens: int = None) -> Iterator[str]:
+        response = self.get_model(model).generate_content(
+            prompt,
+            generation_config=self._generation_config(temperature, max_tokens),
+            stream=True
+        )
+
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Fragment sans texte (fin de flux, filtre de sécurité)
+                continue
+            if text:
+                yield text
+
+    async def agenerate(self, prompt: str, model: str = None, temperature: float = None, max_tokens: int = None) -> str:
+        response = await self.get_model(model).generate_content_async(
+            prompt,
+            generation_config=self._generation_config(temperature, max_tokens)
+        )
+        return response.text
+
+    async def astream(self, prompt: str, model: str = None, temperature: float = None,
+                      max_tokens: int = None) -> AsyncIterator[str]:
+        response = await self.get_model(model).generate_content_async(
+            prompt,
+            generation_config=self._generation_config(temperature, max_tokens),
+            stream=True
+        )
+
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            if text:
+                yield text
+
+
+class GenAIProvider(LLMProvider):
+    """google.genai : un seul Client (pool HTTP) pour tout le processus"""
+
+    name = "genai"
+    default_model = "gemini-2.5-flash"
+
+    def __init__(self, api_key: str = None):
+        from google.genai import Client as GminiClient
+
+        self.client = GminiClient(api_key=api_key or os.getenv("GMINI_API_KEY"))
+
+    @staticmethod
+    def extract_text(gres) -> Optional[str]:
+        """Texte de la première candidate d'une réponse google.genai"""
+        gen = None
+        if hasattr(gres, "candidates") and gres.candidates:
+            first = gres.candidates[0]
+            if hasattr(first, "content"):
+                gen = first.content
+                if not isinstance(gen, str) and hasattr(gen, "parts"):
+                    parts = getattr(gen, "parts") or []
+                    texts = [getattr(p, "text", "") for p in parts if getattr(p, "text", None)]
+                    gen = "\n".join(texts).strip()
+
+        return str(gen) if gen else None
+
+    def generate(self, prompt: str, model: str = None, temperature: float = None, max_tokens: int = None) -> str:
+        chat = self.client.chats.create(model=model or self.default_model)
+        return self.extract_text(chat.send_message(prompt))
+
+    async def agenerate(self, prompt: str, model: str = None, temperature: float = None, max_tokens: int = None) -> str:
+        chat = self.client.aio.chats.create(model=model or self.default_model)
+        return self.extract_text(await chat.send_message(prompt))
+
+
+class AnthropicProvider(LLMProvider):
+    """SDK Anthropic : un seul client (pool de connexions keep-alive)"""
+
+    name = "anthropic"
+    default_model = "claude-3-5-sonnet-20241022"
+    default_max_tokens = 4000
+
+    def __init__(self, api_key: str = None):
+        try:
+            from anthropic import Anthropic
+        except ImportError:
+            raise ImportError("Package 'anthropic' requis. Installez avec: pip install anthropic")
+
+        self.client = Anthropic(api_key=api_key or os.getenv("ANTHROPIC_API_KEY"))
+        self._api_key = api_key
+        self._async_client = None
+
+    @property
+    def async_client(self):
+        """Client AsyncAnthropic (créé au premier appel asyncio)"""
+        if self._async_client is None:
+            from anthropic import AsyncAnthropic
+            self._async_client = AsyncAnthropic(api_key=self._api_key or os.getenv("ANTHROPIC_API_KEY"))
+        return self._async_client
+
+    def _request(self, prompt: str, model: str = None, temperature: float = None, max_tokens: int = None) -> Dict:
+        request = {
+            'model': model or self.default_model,
+            'max_tokens': max_tokens or self.default_max_tokens,
+            'messages': [{"role": "user", "content": prompt}]
+        }
+        if temperature is not None:
+            request['temperature'] = temperature
+        return request
+
+    def generate(self, prompt: str, model: str = None, temperature: float = None, max_tokens: int = None) -> str:
+        response = self.client.messages.create(**self._request(prompt, model, temperature, max_tokens))
+        return response.content[0].text
+
+    def stream(self, prompt: str, model: str = None, temperature: float = None, max_tokens: int = None) -> Iterator[str]:
+        with self.client.messages.stream(**self._request(prompt, model, temperature, max_tokens)) as stream:
+            for text in stream.text_stream:
+                yield text
+
+    async def agenerate(self, prompt: str, model: str = None, temperature: float = None, max_tokens: int = None) -> str:
+        response = await self.async_client.messages.create(**self._request(prompt, model, temperature, max_tokens))
+        return response.content[0].text
+
+    async def astream(self, prompt: str, model: str = None, temperature: float = None,
+                      max_tokens: int = None) -> AsyncIterator[str]:
+        async with self.async_client.messages.stream(**self._request(prompt, model, temperature, max_tokens)) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+
+class FakeProvider(LLMProvider):
+    """
+    Fournisseur local pour les tests : réponses scriptées, appels enregistrés
+
+    Args:
+        responses: Réponses retournées dans l'ordre (la dernière est répétée)
+        chunk_size: Taille des fragments en streaming
+        error: Exception levée à chaque appel (simulation de quota, panne...)
+        delay: Attente entre deux fragments en asyncio (simulation de latence réseau)
+    """
+
+    name = "fake"
+
+    def __init__(self, responses: List[str] = None, chunk_size: int = 16, error: Exception = None, delay: float = 0):
+        self.responses = list(responses or ["Réponse de test"])
+        self.chunk_size = chunk_size
+        self.error = error
+        self.delay = delay
+        self.calls: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, model: str = None, temperature: float = None, max_tokens: int = None) -> str:
+        with self._lock:
+            self.calls.append({'prompt': prompt, 'model': model, 'temperature': temperature, 'max_tokens': max_tokens})
+            if self.error:
+                raise self.error
+            index = min(len(self.calls), len(self.responses)) - 1
+            return self.responses[index]
+
+    def stream(self, prompt: str, model: str = None, temperature: float = None, max_tokens: int = None) -> Iterator[str]:
+        text = self.generate(prompt, model=model, temperature=temperature, max_tokens=max_tokens)
+        for start in range(0, len(text), self.chunk_size):
+            yield text[start:start + self.chunk_size]
+
+    async def agenerate(self, prompt: str, model: str = None, temperature: float = None, max_tokens: int = None) -> str:
+        await asyncio.sleep(self.delay)
+        return self.generate(prompt, model=model, temperature=temperature, max_tokens=max_tokens)
+
+    async def astream(self, prompt: str, model: str = None, temperature: float = None,
+                      max_tokens: int = None) -> AsyncIterator[str]:
+        text = self.generate(prompt, model=model, temperature=temperature, max_tokens=max_tokens)
+        for start in range(0, len(text), self.chunk_size):
+            await asyncio.sleep(self.delay)
+            yield text[start:start + self.chunk_size]
+
+
+PROVIDERS: Dict[str, Type[LLMProvider]] = {
+    GeminiProvider.name: GeminiProvider,
+    GenAIProvider.name: GenAIProvider,
+    AnthropicProvider.name: AnthropicProvider,
+    FakeProvider.name: FakeProvider,
+}
+
+_providers: Dict[str, LLMProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name: str) -> LLMProvider:
+    """
+    Instance partagée du fournisseur (créée au premier appel)
+
+    Raises:
+        ValueError si le fournisseur est inconnu
+    """
+    with _providers_lock:
+        if name not in _providers:
+            if name not in PROVIDERS:
+                raise ValueError(f"Fournisseur LLM inconnu : {name} (choix : {', '.join(PROVIDERS)})")
+            logger.info(f"Creating shared LLM provider: {name}")
+            _providers[name] = PROVIDERS[name]()
+
+        return _providers[name]
+
+
+def set_provider(name: str, provider: LLMProvider):
+    """Remplace l'instance d'un fournisseur (ex: FakeProvider dans les tests)"""
+    with _providers_lock:
+        _providers[name] = provider
+
+
+def reset_providers():
+    """Oublie les instances (elles seront recréées au prochain appel)"""
+    with _providers_lock:
+        _providers.clear()
@@ -0,0 +1,318 @@
+"""
+Sandboxes locales (alternative à E2B)
+Même interface que `e2b_code_interpreter.Sandbox` (run_code, files.write, kill,
+sandbox_id).
+
+- LocalSandbox : exécution dans le processus courant, pour les tests (AUCUNE isolation)
+- LocalProcessSandbox : un sous-processus par sandbox, avec limites de ressources
+  et timeout, pour les déploiements on-prem de confiance
+"""
+
+import io
+import os
+import uuid
+import base64
+import shutil
+import tempfile
+import threading
+import traceback
+import logging
+from contextlib import redirect_stdout, redirect_stderr
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# pyplot est global au processus : une seule exécution à la fois
+_exec_lock = threading.Lock()
+
+
+class LocalExecutionError:
+    """Erreur d'exécution (même attributs que E2B)"""
+
+    def __init__(self, name: str, value: str, traceback_text: str = ""):
+        self.name = name
+        self.value = value
+        self.traceback = traceback_text
+
+
+class LocalLogs:
+    """Sorties standard capturées"""
+
+    def __init__(self, stdout: List[str], stderr: List[str]):
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+class LocalResult:
+    """Résultat riche (graphique PNG en base64)"""
+
+    def __init__(self, png: Optional[str] = None):
+        self.png = png
+
+
+class LocalExecution:
+    """Résultat d'un run_code (même forme que E2B)"""
+
+    def __init__(self, results: List[LocalResult], logs: LocalLogs, error: Optional[LocalExecutionError] = None):
+        self.results = results
+        self.logs = logs
+        self.error = error
+
+
+class LocalFiles:
+    """Accès fichiers de la sandbox locale"""
+
+    def write(self, path: str, data):
+        """Écrit un fichier (str, bytes ou objet fichier)"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        if hasattr(data, 'read'):
+            with open(path, 'wb') as f:
+                shutil.copyfileobj(data, f)
+        else:
+            mode = 'w' if isinstance(data, str) else 'wb'
+            with open(path, mode) as f:
+                f.write(data)
+
+    def read(self, path: str) -> str:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(path)
+
+
+class LocalSandbox:
+    """
+    Sandbox locale en mémoire (kernel persistant = dictionnaire de variables)
+
+    Les figures matplotlib ouvertes par plt.show() sont capturées en PNG base64
+    comme le fait E2B.
+    """
+
+    # Le kernel voit les fichiers de l'hôte : les datasets peuvent être mappés sans copie
+    shares_host_filesystem = True
+
+    def __init__(self, home_dir: Optional[str] = None):
+        self.sandbox_id = f"local-{uuid.uuid4().hex[:12]}"
+        self.home_dir = home_dir or tempfile.mkdtemp(prefix="local_sandbox_")
+        self.files = LocalFiles()
+        self.namespace = {'__name__': '__main__'}
+
+    @classmethod
+    def create(cls, **kwargs) -> 'LocalSandbox':
+        """Même signature que Sandbox.create (arguments ignorés)"""
+        return cls()
+
+    def run_code(self, code: str) -> LocalExecution:
+        """Exécute du code dans le kernel de la sandbox"""
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+        charts: List[LocalResult] = []
+
+        def capture_show(*args, **kwargs):
+            for num in plt.get_fignums():
+                buffer = io.BytesIO()
+                plt.figure(num).savefig(buffer, format='png', bbox_inches='tight')
+                charts.append(LocalResult(png=base64.b64encode(buffer.getvalue()).decode('utf-8')))
+            plt.close('all')
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        error = None
+
+        with _exec_lock:
+            original_show = plt.show
+            plt.show = capture_show
+            try:
+                with redirect_stdout(stdout), redirect_stderr(stderr):
+                    exec(compile(code, '<sandbox>', 'exec'), self.namespace)
+            except Exception as e:
+                error = LocalExecutionError(type(e).__name__, str(e), traceback.format_exc())
+            finally:
+                plt.show = original_show
+
+        logs = LocalLogs(
+            stdout=[stdout.getvalue()] if stdout.getvalue() else [],
+            stderr=[stderr.getvalue()] if stderr.getvalue() else []
+        )
+
+        return LocalExecution(results=charts, logs=logs, error=error)
+
+    def kill(self):
+        """Supprime le répertoire de travail"""
+        shutil.rmtree(self.home_dir, ignore_errors=True)
+        self.namespace.clear()
+
+    def close(self):
+        self.kill()
+
+
+# ═══════════════════════════════════════════════════════════════
+# SANDBOX EN SOUS-PROCESSUS (backend d'exécution local)
+# ═══════════════════════════════════════════════════════════════
+
+def _execution_to_payload(execution: LocalExecution) -> Dict:
+    """Sérialise un résultat d'exécution pour le transfert entre processus"""
+    return {
+        'stdout': execution.logs.stdout,
+        'stderr': execution.logs.stderr,
+        'charts': [result.png for result in execution.results],
+        'error': (execution.error.name, execution.error.value, execution.error.traceback) if execution.error else None
+    }
+
+
+def _payload_to_execution(payload: Dict) -> LocalExecution:
+    error = LocalExecutionError(*payload['error']) if payload['error'] else None
+    return LocalExecution(
+        results=[LocalResult(png=png) for png in payload['charts']],
+        logs=LocalLogs(stdout=payload['stdout'], stderr=payload['stderr']),
+        error=error
+    )
+
+
+def _apply_resource_limits(memory_mb: int, cpu_seconds: int):
+    """Limites mémoire/CPU du worker (POSIX uniquement)"""
+    try:
+        import resource
+    except ImportError:
+        return
+
+    if memory_mb > 0:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if cpu_seconds > 0:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+
+
+def _worker_main(conn, home_dir: str, memory_mb: int, cpu_seconds: int):
+    """Boucle du worker : reçoit du code, renvoie le résultat sérialisé"""
+    os.environ['MPLBACKEND'] = 'Agg'
+    os.chdir(home_dir)
+    _apply_resource_limits(memory_mb, cpu_seconds)
+
+    kernel = LocalSandbox(home_dir=home_dir)
+
+    while True:
+        try:
+            code = conn.recv()
+        except EOFError:
+            break
+
+        if code is None:
+            break
+
+        conn.send(_execution_to_payload(kernel.run_code(code)))
+
+
+class LocalProcessSandbox:
+    """
+    Sandbox locale dans un sous-processus dédié (kernel persistant)
+
+    - limites mémoire / CPU (RLIMIT_AS, RLIMIT_CPU)
+    - timeout par exécution : le worker est tué puis relancé (état perdu,
+      compté dans `restarts` pour que la session rejoue préambule et dataset)
+    - capture stdout et graphiques matplotlib (backend Agg)
+
+    Réservé aux déploiements de confiance : l'isolation est celle d'un
+    processus utilisateur, pas d'une micro-VM comme E2B.
+    """
+
+    shares_host_filesystem = True
+
+    def __init__(self, timeout: float = 120.0, memory_mb: int = 4096, cpu_seconds: int = 0):
+        self.sandbox_id = f"localproc-{uuid.uuid4().hex[:12]}"
+        self.home_dir = tempfile.mkdtemp(prefix="local_sandbox_")
+        self.files = LocalFiles()
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self._lock = threading.Lock()
+        self._process = None
+        self._conn = None
+        # Redémarrages du worker (kernel vidé : préambule et dataset à recharger)
+        self.restarts = 0
+        self._start_worker()
+
+    @classmethod
+    def create(cls, **kwargs) -> 'LocalProcessSandbox':
+        """Même usage que Sandbox.create"""
+        return cls(**kwargs)
+
+    def _start_worker(self):
+        import multiprocessing
+
+        # spawn : pas d'héritage de l'état (threads Streamlit, verrous) du parent
+        context = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = context.Pipe()
+        self._process = context.Process(
+            target=_worker_main,
+            args=(child_conn, self.home_dir, self.memory_mb, self.cpu_seconds),
+            name=self.sandbox_id,
+            daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+
+    def _stop_worker(self):
+        if self._process is not None and self._process.is_alive():
+            self._process.terminate()
+            self._process.join(5)
+        if self._conn is not None:
+            self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def _restart_worker(self):
+        """Relance un worker vierge (l'état du kernel est perdu)"""
+        self._stop_worker()
+        self._start_worker()
+        self.restarts += 1
+
+    def run_code(self, code: str, timeout: Optional[float] = None) -> LocalExecution:
+        """Exécute du code dans le worker (timeout : worker relancé, état perdu)"""
+        timeout = timeout or self.timeout
+
+        with self._lock:
+            if self._process is None or not self._process.is_alive():
+                self._restart_worker()
+
+            try:
+                self._conn.send(code)
+
+                if not self._conn.poll(timeout):
+                    logger.warning(f"{self.sandbox_id}: timeout after {timeout}s, restarting worker")
+                    self._restart_worker()
+                    return LocalExecution([], LocalLogs([], []), LocalExecutionError(
+                        'TimeoutError', f"Exécution interrompue après {timeout}s"
+                    ))
+
+                payload = self._conn.recv()
+
+            except (EOFError, OSError) as e:
+                # Worker mort (limite mémoire/CPU atteinte, crash)
+                exit_code = self._process.exitcode if self._process else None
+                self._restart_worker()
+                return LocalExecution([], LocalLogs([], []), LocalExecutionError(
+                    'WorkerCrashed', f"Le worker s'est arrêté (code {exit_code}) : {e}"
+                ))
+
+        return _payload_to_execution(payload)
+
+    def kill(self):
+        """Arrête le worker et supprime le répertoire de travail"""
+        with self._lock:
+            if self._conn is not None and self._process is not None and self._process.is_alive():
+                try:
+                    self._conn.send(None)
+                    self._process.join(2)
+                except (OSError, EOFError):
+                    pass
+            self._stop_worker()
+
+        shutil.rmtree(self.home_dir, ignore_errors=True)
+
+    def close(self):
+        self.kill()
@@ -0,0 +1,142 @@
+"""
+Choix du profileur de dataset (local ou sandbox E2B)
+Le profilage se fait localement par défaut : pandas le calcule en quelques
+millisecondes, là où une sandbox jetable coûte plusieurs secondes (création,
+upload, exécution, fermeture). La sandbox n'est utilisée que pour les formats
+jugés non fiables ou les fichiers au-delà d'un seuil de taille.
+
+Chemins possibles :
+    cached     profil déjà calculé (upload), relu sans parcourir les données
+    local      profil vectorisé en mémoire (data_profiler)
+    streaming  lecture par blocs pour les fichiers plus gros que la RAM (streaming_profiler)
+    sandbox    profilage isolé dans une sandbox E2B
+
+Le temps passé dans chaque chemin est mesuré (voir `profiling_metrics`).
+
+Configuration :
+    PROFILER_BACKEND             auto (politique ci-dessous, défaut), local ou sandbox
+    PROFILER_SANDBOX_EXTENSIONS  Extensions profilées en sandbox, ex: ".xls,.xlsm" (défaut aucune)
+    PROFILER_SANDBOX_MIN_MB      Taille à partir de laquelle la sandbox est utilisée (défaut 0 = jamais)
+"""
+
+import os
+import threading
+import logging
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+PROFILER_PATHS = ['cached', 'local', 'streaming', 'sandbox']
+
+
+def sandbox_available() -> bool:
+    """True si le SDK E2B est installé"""
+    try:
+        import e2b_code_interpreter  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ProfilerPolicy:
+    """Décide du chemin de profilage d'un fichier"""
+
+    def __init__(self, backend: str = "auto", sandbox_extensions: List[str] = None, sandbox_min_mb: float = 0):
+        self.backend = backend
+        self.sandbox_extensions = [ext.lower() for ext in (sandbox_extensions or [])]
+        self.sandbox_min_mb = sandbox_min_mb
+
+    @classmethod
+    def from_env(cls) -> 'ProfilerPolicy':
+        extensions = os.getenv("PROFILER_SANDBOX_EXTENSIONS", "")
+        return cls(
+            backend=os.getenv("PROFILER_BACKEND", "auto").lower(),
+            sandbox_extensions=[ext.strip() for ext in extensions.split(",") if ext.strip()],
+            sandbox_min_mb=float(os.getenv("PROFILER_SANDBOX_MIN_MB", "0"))
+        )
+
+    def _wants_sandbox(self, file_path: str) -> Tuple[bool, str]:
+        if self.backend == "sandbox":
+            return True, "PROFILER_BACKEND=sandbox"
+        if self.backend == "local":
+            return False, "PROFILER_BACKEND=local"
+
+        extension = Path(file_path).suffix.lower()
+        if extension in self.sandbox_extensions:
+            return True, f"format {extension} profilé en sandbox"
+
+        size_mb = os.path.getsize(file_path) / (1024 * 1024)
+        if self.sandbox_min_mb > 0 and size_mb >= self.sandbox_min_mb:
+            return True, f"fichier de {size_mb:.0f} Mo (seuil {self.sandbox_min_mb:.0f} Mo)"
+
+        return False, "profilage local par défaut"
+
+    def choose(self, file_path: str) -> Tuple[str, str]:
+        """
+        Chemin de profilage du fichier
+
+        Returns:
+            (chemin parmi PROFILER_PATHS, raison du choix)
+        """
+        from data_profiler import get_profile_store
+        from streaming_profiler import should_stream
+
+        wants_sandbox, reason = self._wants_sandbox(file_path)
+
+        if wants_sandbox:
+            if sandbox_available():
+                return 'sandbox', reason
+            reason = f"{reason}, mais E2B indisponible"
+
+        if get_profile_store().lookup(file_path) is not None:
+            return 'cached', "profil déjà calculé"
+
+        if should_stream(file_path):
+            return 'streaming', "fichier plus gros que le seuil de lecture en mémoire"
+
+        return 'local', reason
+
+
+class ProfilingMetrics:
+    """Nombre d'appels et temps passé par chemin de profilage"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, float]] = {path: self._empty() for path in PROFILER_PATHS}
+
+    @staticmethod
+    def _empty() -> Dict[str, float]:
+        return {'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'last_seconds': 0.0}
+
+    def record(self, path: str, seconds: float):
+        with self.lock:
+            stats = self.stats.setdefault(path, self._empty())
+            stats['calls'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['last_seconds'] = seconds
+
+        logger.info(f"Dataset profiled via {path} in {seconds:.3f}s")
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """Statistiques par chemin, avec le temps moyen"""
+        with self.lock:
+            return {
+                path: {**stats, 'mean_seconds': stats['total_seconds'] / stats['calls'] if stats['calls'] else 0.0}
+                for path, stats in self.stats.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.stats = {path: self._empty() for path in PROFILER_PATHS}
+
+
+# Instance globale
+profiling_metrics = ProfilingMetrics()
+
+
+def select_profiler(file_path: str) -> Tuple[str, str]:
+    """Helper function : chemin de profilage selon la politique courante (variables d'environnement)"""
+    return ProfilerPolicy.from_env().choose(file_path)
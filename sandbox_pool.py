@@ -0,0 +1,295 @@
+"""
+Pool de sandboxes E2B pré-chauffées
+Des sandboxes sont créées à l'avance (pandas/matplotlib déjà importés) et
+distribuées aux nouveaux utilisateurs : plus de cold start de plusieurs
+secondes sur le premier chapitre.
+
+Configuration (variables d'environnement) :
+    E2B_POOL_MIN_SIZE          Sandboxes prêtes maintenues en permanence (0 = pool désactivé)
+    E2B_POOL_MAX_SIZE          Sandboxes prêtes au maximum
+    E2B_POOL_MAX_IDLE_MINUTES  Au-delà, les sandboxes en surplus sont fermées, les autres
+                               vérifiées et prolongées (avant le timeout E2B de la sandbox)
+"""
+
+import os
+import time
+import threading
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Code exécuté à la création de chaque sandbox du pool
+POOL_WARMUP_CODE = """import pandas as pd
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+import seaborn as sns
+"""
+
+# Code de vérification de santé (doit s'exécuter sans erreur)
+HEALTH_CHECK_CODE = "1 + 1"
+
+
+class SandboxPool:
+    """
+    Pool de sandboxes prêtes à l'emploi
+
+    - acquire() : retourne une sandbox saine du pool, ou en crée une si vide
+    - un thread de fond maintient `min_size` sandboxes prêtes
+    - les sandboxes en surplus inactives depuis `max_idle` sont fermées ; les
+      autres sont vérifiées et leur timeout prolongé (`sandbox_timeout`), sinon
+      elles expireraient côté E2B tout en comptant dans `min_size`
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 4,
+        max_idle: timedelta = timedelta(minutes=10),
+        warmup_code: str = POOL_WARMUP_CODE,
+        health_check_code: str = HEALTH_CHECK_CODE,
+        refill_interval: float = 5.0,
+        sandbox_timeout: int = 1800
+    ):
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size)
+        self.max_idle = max_idle
+        self.warmup_code = warmup_code
+        self.health_check_code = health_check_code
+        self.refill_interval = refill_interval
+        self.sandbox_timeout = sandbox_timeout
+
+        self.lock = threading.Lock()
+        self._idle: deque = deque()  # (sandbox, ready_at)
+        self._creating = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'hits': 0, 'misses': 0, 'created': 0, 'evicted': 0, 'unhealthy': 0, 'refreshed': 0}
+
+    # ═══════════════════════════════════════════════════════════════
+    # CYCLE DE VIE
+    # ═══════════════════════════════════════════════════════════════
+
+    def start(self):
+        """Démarre le thread de remplissage"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._maintain_loop, name="sandbox-pool", daemon=True)
+        self._thread.start()
+        logger.info(f"Sandbox pool started (min={self.min_size}, max={self.max_size})")
+
+    def shutdown(self):
+        """Arrête le thread et ferme toutes les sandboxes prêtes"""
+        self._stop.set()
+
+        with self.lock:
+            idle = list(self._idle)
+            self._idle.clear()
+
+        for sandbox, _ in idle:
+            self._kill(sandbox)
+
+    # ═══════════════════════════════════════════════════════════════
+    # DISTRIBUTION
+    # ═══════════════════════════════════════════════════════════════
+
+    def acquire(self) -> Any:
+        """
+        Retourne une sandbox prête (ou en crée une si le pool est vide)
+
+        La création éventuelle a lieu hors du verrou.
+        """
+        while True:
+            with self.lock:
+                if not self._idle:
+                    break
+                sandbox, _ = self._idle.popleft()
+
+            if self._is_healthy(sandbox):
+                with self.lock:
+                    self.stats['hits'] += 1
+                return sandbox
+
+            with self.lock:
+                self.stats['unhealthy'] += 1
+            self._kill(sandbox)
+
+        with self.lock:
+            self.stats['misses'] += 1
+
+        return self._create_warm()
+
+    def release(self, sandbox: Any):
+        """
+        Rend une sandbox au pool
+
+        À réserver aux sandboxes sans état utilisateur : une sandbox ayant
+        servi à un utilisateur doit être fermée, pas recyclée.
+        """
+        with self.lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append((sandbox, datetime.now()))
+                return
+
+        self._kill(sandbox)
+
+    def size(self) -> int:
+        """Nombre de sandboxes prêtes"""
+        with self.lock:
+            return len(self._idle)
+
+    def get_stats(self) -> Dict:
+        """Statistiques du pool"""
+        with self.lock:
+            return {**self.stats, 'ready': len(self._idle), 'creating': self._creating}
+
+    # ═══════════════════════════════════════════════════════════════
+    # MAINTENANCE
+    # ═══════════════════════════════════════════════════════════════
+
+    def fill(self):
+        """Crée des sandboxes jusqu'à atteindre min_size"""
+        while not self._stop.is_set():
+            with self.lock:
+                if len(self._idle) + self._creating >= self.min_size:
+                    return
+                self._creating += 1
+
+            try:
+                sandbox = self._create_warm()
+            except Exception as e:
+                logger.error(f"Sandbox pool refill failed: {e}")
+                return
+            finally:
+                with self.lock:
+                    self._creating -= 1
+
+            self.release(sandbox)
+
+    def evict_idle(self):
+        """Ferme les sandboxes en surplus (au-delà de min_size) inactives depuis trop longtemps"""
+        now = datetime.now()
+        evicted = []
+
+        with self.lock:
+            kept = deque()
+            for sandbox, ready_at in self._idle:
+                surplus = len(self._idle) - len(evicted) > self.min_size
+                if surplus and now - ready_at > self.max_idle:
+                    evicted.append(sandbox)
+                else:
+                    kept.append((sandbox, ready_at))
+            self._idle = kept
+            self.stats['evicted'] += len(evicted)
+
+        for sandbox in evicted:
+            self._kill(sandbox)
+
+    def refresh_idle(self):
+        """
+        Vérifie les sandboxes prêtes inactives depuis plus de `max_idle` (celles gardées pour min_size)
+
+        Le timeout de chaque sandbox saine est prolongé (set_timeout, sandboxes E2B)
+        et elle repart pour `max_idle` ; une sandbox expirée ou en erreur est
+        fermée, fill() la remplace.
+        """
+        now = datetime.now()
+
+        with self.lock:
+            stale = [sandbox for sandbox, ready_at in self._idle if now - ready_at > self.max_idle]
+            self._idle = deque((sandbox, ready_at) for sandbox, ready_at in self._idle if now - ready_at <= self.max_idle)
+
+        for sandbox in stale:
+            try:
+                if hasattr(sandbox, 'set_timeout'):
+                    sandbox.set_timeout(self.sandbox_timeout)
+                healthy = self._is_healthy(sandbox)
+            except Exception as e:
+                logger.warning(f"Pooled sandbox refresh failed: {e}")
+                healthy = False
+
+            if not healthy:
+                with self.lock:
+                    self.stats['unhealthy'] += 1
+                self._kill(sandbox)
+                continue
+
+            with self.lock:
+                self.stats['refreshed'] += 1
+            self.release(sandbox)
+
+    def _maintain_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.evict_idle()
+                self.refresh_idle()
+                self.fill()
+            except Exception as e:
+                logger.error(f"Sandbox pool maintenance error: {e}")
+            self._stop.wait(self.refill_interval)
+
+    # ═══════════════════════════════════════════════════════════════
+    # UTILITAIRES
+    # ═══════════════════════════════════════════════════════════════
+
+    def _create_warm(self) -> Any:
+        """Crée une sandbox et y pré-importe les bibliothèques"""
+        start_time = time.time()
+        sandbox = self.factory()
+
+        if self.warmup_code:
+            execution = sandbox.run_code(self.warmup_code)
+            if execution.error:
+                self._kill(sandbox)
+                raise RuntimeError(f"Warm-up failed: {execution.error.name}: {execution.error.value}")
+
+        with self.lock:
+            self.stats['created'] += 1
+
+        logger.info(f"Warm sandbox ready: {getattr(sandbox, 'sandbox_id', '?')} ({time.time() - start_time:.2f}s)")
+        return sandbox
+
+    def _is_healthy(self, sandbox: Any) -> bool:
+        try:
+            execution = sandbox.run_code(self.health_check_code)
+            return not execution.error
+        except Exception as e:
+            logger.warning(f"Sandbox health check failed: {e}")
+            return False
+
+    @staticmethod
+    def _kill(sandbox: Any):
+        try:
+            sandbox.kill()
+        except Exception as e:
+            logger.warning(f"Failed to kill pooled sandbox: {e}")
+
+
+def pool_from_env(factory: Callable[[], Any]) -> Optional[SandboxPool]:
+    """
+    Construit un pool depuis les variables d'environnement
+
+    Returns:
+        SandboxPool démarré, ou None si E2B_POOL_MIN_SIZE vaut 0
+    """
+    min_size = int(os.getenv("E2B_POOL_MIN_SIZE", "0"))
+    if min_size <= 0:
+        return None
+
+    pool = SandboxPool(
+        factory,
+        min_size=min_size,
+        max_size=int(os.getenv("E2B_POOL_MAX_SIZE", "4")),
+        max_idle=timedelta(minutes=int(os.getenv("E2B_POOL_MAX_IDLE_MINUTES", "10")))
+    )
+    pool.start()
+
+    return pool
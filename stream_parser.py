@@ -0,0 +1,98 @@
+"""
+Analyse incrémentale d'une réponse LLM en streaming
+Découpe le flux de tokens en texte et en blocs ```python complets, dès que la
+clôture d'un bloc arrive : le bloc peut être exécuté sans attendre la fin de
+la génération.
+
+Mêmes règles que l'expression régulière de ReportGenerationWorkflow._execute_code_blocks :
+ouverture = ligne "```python", clôture = première ligne commençant par "```".
+"""
+
+from typing import Dict, List
+
+
+class CodeFenceParser:
+    """
+    Parser incrémental de blocs de code
+
+    Usage:
+        parser = CodeFenceParser()
+        for token in stream:
+            for event in parser.feed(token):
+                ...  # {'type': 'text', 'text': str} ou {'type': 'code', 'code': str}
+        for event in parser.flush():
+            ...
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_code = False
+        self._code_lines: List[str] = []
+        self._opening_line = ""
+
+    @property
+    def partial_text(self) -> str:
+        """Ligne de texte en cours (incomplète), pour l'affichage progressif"""
+        return "" if self._in_code else self._buffer
+
+    @property
+    def in_code(self) -> bool:
+        """True si un bloc de code est en cours de réception"""
+        return self._in_code
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Ajoute un fragment et retourne les événements devenus complets"""
+        self._buffer += chunk
+        events: List[Dict] = []
+        text = ""
+
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+
+            if not self._in_code:
+                if line.strip() == "```python":
+                    if text:
+                        events.append({'type': 'text', 'text': text})
+                        text = ""
+                    self._in_code = True
+                    self._code_lines = []
+                    self._opening_line = line + "\n"
+                else:
+                    text += line + "\n"
+            elif line.lstrip().startswith("```") and self._code_lines:
+                events.append({'type': 'code', 'code': "\n".join(self._code_lines)})
+                self._in_code = False
+                self._code_lines = []
+                # Ce qui suit la clôture sur la même ligne reste du texte
+                text += line.lstrip()[3:] + "\n"
+            else:
+                self._code_lines.append(line)
+
+        if text:
+            events.append({'type': 'text', 'text': text})
+
+        return events
+
+    def flush(self) -> List[Dict]:
+        """
+        Fin du flux : le texte restant (et un bloc non fermé) est rendu comme texte
+
+        Une clôture sur la dernière ligne, sans saut de ligne final, ferme le bloc
+        (comme pour l'expression régulière du mode non pipeliné).
+        """
+        events: List[Dict] = []
+        remainder = self._buffer
+        if self._in_code and self._code_lines and remainder.lstrip(" \t").startswith("```"):
+            events.append({'type': 'code', 'code': "\n".join(self._code_lines)})
+            remainder = remainder.lstrip(" \t")[3:]
+        elif self._in_code:
+            remainder = self._opening_line + "\n".join(self._code_lines) + ("\n" if self._code_lines else "") + remainder
+
+        self._buffer = ""
+        self._in_code = False
+        self._code_lines = []
+
+        if remainder:
+            events.append({'type': 'text', 'text': remainder})
+
+        return events
@@ -0,0 +1,455 @@
+"""
+Profilage en flux des jeux de données plus gros que la RAM
+Le fichier est lu par blocs de lignes ; chaque colonne entretient des résumés
+fusionnables (sketches) au lieu de garder les données :
+
+    RunningMoments  effectif, moyenne, variance (Welford / Chan), min, max
+    KLLSketch       quantiles approchés (médiane, q25, q75)
+    HyperLogLog     nombre de valeurs distinctes approché
+    MisraGries      valeurs les plus fréquentes (top-k)
+
+La mémoire utilisée ne dépend que du nombre de colonnes, pas du nombre de
+lignes. Le résultat a la même forme que les métadonnées de
+`_analyze_csv_locally` : un fichier de 10 Go peut être planifié sans OOM.
+Sur un petit fichier (un seul bloc, peu de modalités), les valeurs sont exactes.
+
+Configuration :
+    STREAMING_PROFILE_THRESHOLD_MB  Taille à partir de laquelle le profilage passe en flux (défaut 512)
+    STREAMING_PROFILE_CHUNK_ROWS    Lignes par bloc (défaut 100000)
+"""
+
+import os
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+# ═══════════════════════════════════════════════════════════════
+# SKETCHES FUSIONNABLES
+# ═══════════════════════════════════════════════════════════════
+
+class RunningMoments:
+    """Effectif, moyenne et variance en une passe (Welford, fusion de Chan)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values: np.ndarray):
+        """Ajoute un bloc de valeurs (sans NaN)"""
+        if len(values) == 0:
+            return
+
+        other = RunningMoments()
+        other.count = len(values)
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other: 'RunningMoments'):
+        if other.count == 0:
+            return
+
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self) -> float:
+        """Écart-type corrigé (ddof=1, comme pandas)"""
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else float('nan')
+
+
+class KLLSketch:
+    """
+    Quantiles approchés (KLL) : des compacteurs par niveau, le niveau h pèse 2^h
+
+    Tant qu'aucune compaction n'a eu lieu (moins de `k` valeurs), les quantiles
+    sont exacts et interpolés comme pandas.
+    """
+
+    def __init__(self, k: int = 400, seed: int = 0):
+        self.k = k
+        self.n = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+
+                items = np.sort(items)
+                kept = items[-1:] if len(items) % 2 else items[:0]
+                paired = items[:len(items) - len(kept)]
+                promoted = paired[int(self._rng.integers(2))::2]
+
+                self.levels[level] = kept
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values: np.ndarray):
+        """Ajoute un bloc de valeurs (sans NaN)"""
+        if len(values) == 0:
+            return
+        self.levels[0] = np.concatenate([self.levels[0], np.asarray(values, dtype=float)])
+        self.n += len(values)
+        self._compress()
+
+    def merge(self, other: 'KLLSketch'):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+
+    def quantile(self, q: float) -> float:
+        if self.n == 0:
+            return float('nan')
+
+        if len(self.levels) == 1:
+            return float(np.quantile(self.levels[0], q))
+
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items_h), 2.0 ** h) for h, items_h in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        cumulative = np.cumsum(weights[order])
+        position = min(int(np.searchsorted(cumulative, q * cumulative[-1])), len(items) - 1)
+
+        return float(items[order][position])
+
+
+class HyperLogLog:
+    """Nombre de valeurs distinctes approché (2^p registres, erreur ~1.04/sqrt(2^p))"""
+
+    def __init__(self, p: int = 14):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def update_hashes(self, hashes: np.ndarray):
+        """Ajoute des hash 64 bits (pd.util.hash_pandas_object)"""
+        if len(hashes) == 0:
+            return
+
+        hashes = hashes.astype(np.uint64, copy=False)
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes << np.uint64(self.p)
+
+        # Rang = position du premier bit à 1 dans les 64-p bits restants
+        rank = np.full(len(hashes), 64 - self.p + 1, dtype=np.int64)
+        nonzero = rest != 0
+        rank[nonzero] = 64 - np.floor(np.log2(rest[nonzero].astype(float))).astype(np.int64)
+        np.maximum.at(self.registers, index, np.minimum(rank, 64 - self.p + 1).astype(np.uint8))
+
+    def merge(self, other: 'HyperLogLog'):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m ** 2 / np.sum(2.0 ** -self.registers.astype(float))
+
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * self.m and zeros:
+            # Petites cardinalités : comptage linéaire
+            return int(round(self.m * np.log(self.m / zeros)))
+
+        return int(round(raw))
+
+
+class MisraGries:
+    """
+    Valeurs les plus fréquentes (Misra-Gries, `capacity` compteurs)
+
+    Les compteurs sous-estiment d'au plus n/(capacity+1) ; tant que le nombre
+    de modalités ne dépasse pas `capacity`, ils sont exacts.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.counters = pd.Series(dtype='int64')
+        self.exact = True
+
+    def _merge_counts(self, counts: pd.Series):
+        combined = self.counters.add(counts, fill_value=0).astype('int64')
+
+        if len(combined) > self.capacity:
+            threshold = combined.nlargest(self.capacity + 1).iloc[-1]
+            combined = combined[combined > threshold] - threshold
+            self.exact = False
+
+        self.counters = combined
+
+    def update(self, values: pd.Series):
+        """Ajoute un bloc de valeurs (sans NaN)"""
+        if len(values):
+            self._merge_counts(values.value_counts())
+
+    def merge(self, other: 'MisraGries'):
+        self._merge_counts(other.counters)
+        self.exact = self.exact and other.exact
+
+    def most_common(self, n: int = 10) -> Dict[str, int]:
+        return {str(k): int(v) for k, v in self.counters.sort_values(ascending=False, kind='stable').head(n).items()}
+
+
+# ═══════════════════════════════════════════════════════════════
+# PROFIL D'UNE COLONNE / D'UN FICHIER
+# ═══════════════════════════════════════════════════════════════
+
+class ColumnProfile:
+    """Résumés d'une colonne, alimentés bloc par bloc"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.dtypes: List[str] = []    # dtype de chaque bloc contenant des valeurs
+        self.empty_dtype: Optional[str] = None  # dtype d'un bloc entièrement vide
+        self.kind: Optional[str] = None  # 'numeric', 'categorical' ou 'other'
+        self.missing = 0
+        self.moments = RunningMoments()
+        self.quantiles = KLLSketch()
+        self.distinct = HyperLogLog()
+        self.frequent = MisraGries()
+
+    @staticmethod
+    def _kind(series: pd.Series) -> str:
+        if pd.api.types.is_bool_dtype(series.dtype):
+            return 'other'
+        if pd.api.types.is_numeric_dtype(series.dtype):
+            return 'numeric'
+        if isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_object_dtype(series.dtype) \
+                or pd.api.types.is_string_dtype(series.dtype):
+            return 'categorical'
+        return 'other'
+
+    def update(self, series: pd.Series):
+        values = series.dropna()
+        self.missing += len(series) - len(values)
+
+        if not len(values):
+            # Un bloc entièrement vide est lu en float64 : son dtype n'est retenu que faute de mieux
+            self.empty_dtype = self.empty_dtype or str(series.dtype)
+            return
+        self.dtypes.append(str(series.dtype))
+
+        kind = self._kind(values)
+        if self.kind is None:
+            self.kind = kind
+        elif self.kind != kind:
+            # Colonne numérique jusque-là, texte dans ce bloc : elle devient catégorielle
+            self.kind = 'categorical' if 'categorical' in (self.kind, kind) else 'other'
+
+        if kind == 'numeric':
+            numbers = values.to_numpy(dtype=float)
+            self.moments.update(numbers)
+            self.quantiles.update(numbers)
+            # Même hash pour 5 (int64) et 5.0 (float64, bloc avec NaN)
+            values = values.astype(float)
+
+        self.distinct.update_hashes(pd.util.hash_pandas_object(values, index=False).to_numpy())
+        self.frequent.update(values)
+
+    @property
+    def dtype(self) -> str:
+        """dtype unifié des blocs (celui qu'aurait donné une lecture complète)"""
+        unique = list(dict.fromkeys(self.dtypes)) or [self.empty_dtype]
+        if len(unique) == 1:
+            return unique[0]
+        if self.kind == 'numeric':
+            return str(np.result_type(*[np.dtype(d) for d in unique]))
+        return 'object'
+
+    @property
+    def unique_count(self) -> int:
+        """Exact tant que Misra-Gries n'a rien évincé, estimé par HyperLogLog sinon"""
+        if self.frequent.exact:
+            return len(self.frequent.counters)
+        return max(self.distinct.estimate(), len(self.frequent.counters))
+
+
+class StreamingProfiler:
+    """
+    Profil d'un jeu de données construit bloc par bloc
+
+    Usage:
+        profiler = StreamingProfiler()
+        for chunk in pd.read_csv(path, chunksize=100_000):
+            profiler.update(chunk)
+        metadata = profiler.to_metadata(file_info)
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.columns: Dict[str, ColumnProfile] = {}
+
+    def update(self, chunk: pd.DataFrame):
+        self.rows += len(chunk)
+        for col in chunk.columns:
+            if col not in self.columns:
+                self.columns[col] = ColumnProfile(col)
+            self.columns[col].update(chunk[col])
+
+    def to_metadata(self, file_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Métadonnées au format de `_analyze_csv_locally`"""
+        profiles = list(self.columns.values())
+
+        metadata = {
+            "file_info": file_info,
+            "shape": {
+                "rows": int(self.rows),
+                "columns": len(profiles)
+            },
+            "columns": [p.name for p in profiles],
+            "dtypes": {p.name: p.dtype for p in profiles},
+            "numeric_columns": [p.name for p in profiles if p.kind == 'numeric'],
+            "categorical_columns": [p.name for p in profiles if p.kind == 'categorical'],
+            "missing_values": {},
+            "basic_stats": {}
+        }
+
+        for p in profiles:
+            metadata["missing_values"][p.name] = {
+                "count": int(p.missing),
+                "percentage": round((p.missing / self.rows) * 100, 2) if self.rows else 0.0
+            }
+
+        for p in profiles:
+            if p.kind == 'numeric' and p.moments.count > 0:
+                metadata["basic_stats"][p.name] = {
+                    "count": int(p.moments.count),
+                    "mean": float(p.moments.mean),
+                    "median": p.quantiles.quantile(0.5),
+                    "std": p.moments.std,
+                    "min": float(p.moments.min),
+                    "max": float(p.moments.max),
+                    "q25": p.quantiles.quantile(0.25),
+                    "q75": p.quantiles.quantile(0.75)
+                }
+            elif p.kind == 'categorical':
+                metadata["basic_stats"][p.name] = {
+                    "unique_count": p.unique_count,
+                    "most_common": p.frequent.most_common(10)
+                }
+
+        return metadata
+
+
+# ═══════════════════════════════════════════════════════════════
+# LECTURE PAR BLOCS
+# ═══════════════════════════════════════════════════════════════
+
+def chunk_rows() -> int:
+    return int(os.getenv("STREAMING_PROFILE_CHUNK_ROWS", "100000"))
+
+
+def should_stream(file_path: str) -> bool:
+    """True si le fichier est assez gros pour être profilé en flux"""
+    threshold_mb = float(os.getenv("STREAMING_PROFILE_THRESHOLD_MB", "512"))
+    return os.path.getsize(file_path) >= threshold_mb * 1024 * 1024
+
+
+def _columnar_chunks(file_path: str, rows: int) -> Optional[Tuple[Iterator[pd.DataFrame], str]]:
+    """Blocs lus depuis la copie Parquet si elle existe (types déjà résolus)"""
+    try:
+        from columnar_cache import get_columnar_cache, ENCODING_METADATA_KEY
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+
+    columnar_cache = get_columnar_cache()
+    path = columnar_cache.lookup(file_path) if columnar_cache else None
+    if not path:
+        return None
+
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.schema_arrow.metadata or {}
+    encoding = metadata.get(ENCODING_METADATA_KEY, b'unknown').decode()
+
+    return (batch.to_pandas() for batch in parquet_file.iter_batches(batch_size=rows)), encoding
+
+
+def profile_file(file_path: str, chunksize: int = None) -> Dict[str, Any]:
+    """
+    Profile un fichier CSV/Excel sans le charger entièrement
+
+    Args:
+        file_path: Chemin du fichier
+        chunksize: Lignes par bloc (défaut STREAMING_PROFILE_CHUNK_ROWS)
+
+    Returns:
+        Métadonnées au format de `_analyze_csv_locally`
+    """
+    from dataset_handle import CSV_ENCODINGS, EXCEL_EXTENSIONS, parse_dataset
+    from csv_dialect import get_csv_dialect, csv_dialects
+
+    path = Path(file_path)
+    file_extension = path.suffix.lower()
+    rows = chunksize or chunk_rows()
+
+    def file_info(encoding: str) -> Dict[str, Any]:
+        return {"filename": path.name, "extension": file_extension, "encoding": encoding}
+
+    columnar = _columnar_chunks(file_path, rows)
+    if columnar:
+        chunks, encoding = columnar
+        profiler = StreamingProfiler()
+        for chunk in chunks:
+            profiler.update(chunk)
+        return profiler.to_metadata(file_info(encoding))
+
+    if file_extension in EXCEL_EXTENSIONS:
+        # Pas de lecture par blocs pour Excel : un seul bloc
+        df, encoding = parse_dataset(file_path)
+        profiler = StreamingProfiler()
+        profiler.update(df)
+        return profiler.to_metadata(file_info(encoding))
+
+    if file_extension != '.csv':
+        raise ValueError(f"Format de fichier non supporté : {file_extension}")
+
+    # Encodage et séparateur détectés sur un échantillon ; les autres encodages
+    # ne sont essayés que si un octet invalide apparaît plus loin dans le fichier
+    dialect = get_csv_dialect(file_path)
+    encodings = [dialect['encoding']] + [e for e in CSV_ENCODINGS[1:] if e != dialect['encoding']]
+
+    for encoding in encodings:
+        profiler = StreamingProfiler()
+        try:
+            for chunk in pd.read_csv(file_path, chunksize=rows, **{**dialect, 'encoding': encoding}):
+                profiler.update(chunk)
+        except UnicodeDecodeError:
+            if encoding == encodings[-1]:
+                raise
+            continue
+
+        if encoding != dialect['encoding']:
+            csv_dialects.set(file_path, {**dialect, 'encoding': encoding})
+
+        logger.info(f"Streaming profile of {path.name}: {profiler.rows} rows, encoding={encoding}")
+        return profiler.to_metadata({
+            **file_info(encoding),
+            "delimiter": dialect['sep'],
+            "decimal": dialect['decimal']
+        })
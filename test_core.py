@@ -263,7 +263,1746 @@ class TestDataAnalysis:
         assert missing_pct == 40.0  # 2 sur 5 = 40%
 
 
+class FakeExecution:
+    """Résultat d'exécution minimal (même forme que E2B)"""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.results = []
+        self.logs = type('Logs', (), {'stdout': [], 'stderr': []})()
+
+
+class FakeSandbox:
+    """Sandbox factice qui enregistre les uploads et le code exécuté"""
+
+    def __init__(self, sandbox_id="sbx-test"):
+        self.sandbox_id = sandbox_id
+        self.written = {}
+        self.executed = []
+        self.files = self
+
+    def write(self, path, data):
+        self.written[path] = data.read() if hasattr(data, 'read') else data
+
+    def run_code(self, code):
+        self.executed.append(code)
+        return FakeExecution()
+
+    def kill(self):
+        pass
+
+
+class TestDatasetStaging:
+    """Tests pour l'upload unique du dataset dans la sandbox"""
+
+    def test_upload_once_per_sandbox(self, sample_csv_path):
+        """Le fichier n'est uploadé qu'une fois par sandbox"""
+        from dataset_staging import DatasetStager
+
+        stager = DatasetStager()
+        sandbox = FakeSandbox()
+
+        first = stager.stage(sandbox, sample_csv_path)
+        second = stager.stage(sandbox, sample_csv_path)
+
+        assert first['uploaded'] is True
+        assert second['uploaded'] is False
+        assert len(sandbox.written) == 1
+        assert first['remote_path'].endswith('.csv')
+
+    def test_reupload_when_content_changes(self, sample_csv_path):
+        """Un contenu modifié déclenche un nouvel upload"""
+        import os
+        from dataset_staging import DatasetStager
+
+        stager = DatasetStager()
+        sandbox = FakeSandbox()
+
+        first = stager.stage(sandbox, sample_csv_path)
+
+        with open(sample_csv_path, 'a') as f:
+            f.write("50,70000,Nice\n")
+        stat = os.stat(sample_csv_path)
+        os.utime(sample_csv_path, (stat.st_atime, stat.st_mtime + 1))
+
+        second = stager.stage(sandbox, sample_csv_path)
+
+        assert second['uploaded'] is True
+        assert second['hash'] != first['hash']
+
+    def test_binding_code_does_not_inline_data(self, sample_csv_path):
+        """Le code de chaque bloc référence le fichier distant, pas son contenu"""
+        from dataset_staging import DatasetStager
+
+        stager = DatasetStager()
+        staged = stager.stage(FakeSandbox(), sample_csv_path)
+        code = stager.build_binding_code(staged)
+
+        assert 'Marseille' not in code
+        assert staged['remote_path'] in code
+        assert 'df = _dataset_df.copy()' in code
+
+    def test_slow_upload_does_not_block_other_sandboxes(self, sample_csv_path):
+        """Un upload en cours ne tient que le verrou de sa sandbox"""
+        import threading
+        from dataset_staging import DatasetStager
+
+        stager = DatasetStager()
+        slow_sandbox = FakeSandbox("sbx-slow")
+        upload_started, release_upload = threading.Event(), threading.Event()
+        write = slow_sandbox.write
+
+        def slow_write(path, data):
+            upload_started.set()
+            release_upload.wait(timeout=10)
+            write(path, data)
+
+        slow_sandbox.files = type('Files', (), {'write': staticmethod(slow_write)})()
+        slow_staging = threading.Thread(target=stager.stage, args=(slow_sandbox, sample_csv_path))
+        slow_staging.start()
+        try:
+            assert upload_started.wait(timeout=10)
+            staged = stager.stage(FakeSandbox("sbx-other"), sample_csv_path)
+            assert staged['uploaded'] is True and not release_upload.is_set()
+        finally:
+            release_upload.set()
+            slow_staging.join(timeout=10)
+
+        assert stager.stage(slow_sandbox, sample_csv_path)['uploaded'] is False
+
+    def test_switching_datasets_does_not_resend(self, sample_csv_path, tmp_path):
+        """Échantillon puis dataset complet puis échantillon : chaque fichier est envoyé et chargé une fois"""
+        from dataset_staging import DatasetStager
+        from local_sandbox import LocalSandbox
+
+        sample_path = tmp_path / "echantillon.csv"
+        pd.read_csv(sample_csv_path).head(2).to_csv(sample_path, index=False)
+
+        stager = DatasetStager()
+        sandbox = LocalSandbox()
+        sandbox.run_code("import pandas as pd")
+        uploads = []
+        write = sandbox.files.write
+        sandbox.files.write = lambda path, data: uploads.append(path) or write(path, data)
+
+        rows = []
+        for path in [str(sample_path), sample_csv_path, str(sample_path)]:
+            staged = stager.stage(sandbox, path)
+            sandbox.run_code(stager.build_binding_code(staged))
+            rows.append(len(sandbox.namespace['df']))
+
+        assert rows == [2, 4, 2]
+        assert len(uploads) == 2
+        assert len(sandbox.namespace['_datasets']) == 2
+        sandbox.kill()
+
+
+@pytest.fixture
+def session_manager(monkeypatch):
+    """Gestionnaire E2B avec une session factice déjà ouverte"""
+    from datetime import datetime
+
+    monkeypatch.setenv('E2B_API_KEY', 'e2b_test_key_00000')
+    from e2b_session_manager import E2BSessionManager
+
+    manager = E2BSessionManager()
+    manager.sessions['user'] = {
+        'sandbox': FakeSandbox(),
+        'created_at': datetime.now(),
+        'last_used': datetime.now(),
+        'heartbeat_count': 0
+    }
+
+    return manager
+
+
+class TestWarmKernel:
+    """Tests pour le mode warm kernel"""
+
+    def test_cleanup_releases_auxiliary_sessions(self, session_manager):
+        """Voies, brouillons et sections de l'utilisateur sont fermés avec sa session, pas ceux des autres"""
+        from datetime import datetime
+
+        for user_id in ['user::lane1', 'user::draft1::lane2', 'user::draft0s1', 'username', 'other']:
+            session_manager.sessions[user_id] = {
+                'sandbox': FakeSandbox(f"sbx-{user_id}"),
+                'created_at': datetime.now(),
+                'last_used': datetime.now(),
+                'heartbeat_count': 0
+            }
+
+        session_manager.cleanup_session('user')
+
+        assert sorted(session_manager.sessions) == ['other', 'username']
+
+    def test_async_lookup_refreshes_session(self, session_manager):
+        """La sandbox servie sans création par la version non bloquante compte comme une utilisation"""
+        from datetime import datetime, timedelta
+
+        session = session_manager.sessions['user']
+        session['last_used'] = datetime.now() - timedelta(minutes=20)
+
+        assert session_manager.get_sandbox_for_user_async('user').result() is session['sandbox']
+        assert datetime.now() - session['last_used'] < timedelta(minutes=1)
+
+    def test_preamble_runs_once_per_session(self, session_manager):
+        """Le préambule n'est exécuté qu'une fois par session"""
+        sandbox = session_manager.sessions['user']['sandbox']
+
+        assert session_manager.ensure_preamble('user', "import pandas as pd") is True
+        assert session_manager.ensure_preamble('user', "import pandas as pd") is False
+        assert sandbox.executed == ["import pandas as pd"]
+        assert session_manager.get_session_info('user')['kernel_warm'] is True
+
+    def test_new_preamble_is_executed(self, session_manager):
+        """Un préambule différent est ré-exécuté"""
+        session_manager.ensure_preamble('user', "import pandas as pd")
+
+        assert session_manager.ensure_preamble('user', "import numpy as np") is True
+
+
+class TestCodeScheduler:
+    """Tests pour l'exécution parallèle des blocs indépendants"""
+
+    def test_independent_blocks_get_separate_lanes(self):
+        """Des blocs qui ne lisent que df sont répartis sur plusieurs voies"""
+        from code_scheduler import plan_block_lanes
+
+        codes = [
+            "counts = df['ville'].value_counts()\nprint(counts)",
+            "counts = df['age'].describe()\nprint(counts)",
+            "plt.hist(df['salaire'])",
+        ]
+
+        lanes = plan_block_lanes(codes, max_lanes=3)
+
+        assert len(lanes) == 3
+        assert sorted(i for lane in lanes for i in lane) == [0, 1, 2]
+
+    def test_dependent_blocks_share_a_lane(self):
+        """Un bloc qui lit une variable d'un bloc précédent reste sur la même voie"""
+        from code_scheduler import plan_block_lanes
+
+        codes = [
+            "ratio = df['salaire'] / df['age']",
+            "print(df.shape)",
+            "print(ratio.mean())",
+            "total = 0\nfor v in [x for x in range(3)]:\n    total += v",
+        ]
+
+        lanes = plan_block_lanes(codes, max_lanes=4)
+
+        assert [0, 2] in lanes
+        assert len(lanes) == 3
+
+    def test_single_lane_is_sequential(self):
+        """max_lanes=1 conserve l'exécution séquentielle dans l'ordre"""
+        from code_scheduler import plan_block_lanes
+
+        assert plan_block_lanes(["a = 1", "b = 2", "c = 3"], max_lanes=1) == [[0, 1, 2]]
+
+    def test_run_lanes_returns_every_block(self):
+        """Chaque bloc est exécuté une fois avec le contexte de sa voie"""
+        from code_scheduler import run_lanes
+
+        results = run_lanes(
+            [[0, 2], [1]],
+            lambda lane_index: {'lane': lane_index},
+            lambda lane, index: {'lane': lane['lane'], 'index': index}
+        )
+
+        assert results == {
+            0: {'lane': 0, 'index': 0},
+            1: {'lane': 1, 'index': 1},
+            2: {'lane': 0, 'index': 2},
+        }
+
+
+class TestSandboxPool:
+    """Tests pour le pool de sandboxes pré-chauffées (backend local)"""
+
+    def test_local_sandbox_captures_output_and_charts(self):
+        """Le stand-in local retourne stdout et graphiques comme E2B"""
+        from local_sandbox import LocalSandbox
+
+        sandbox = LocalSandbox.create()
+        execution = sandbox.run_code(
+            "import matplotlib.pyplot as plt\nx = 21\nprint(x * 2)\nplt.plot([1, 2])\nplt.show()"
+        )
+        follow_up = sandbox.run_code("print(x)")
+        failure = sandbox.run_code("1 / 0")
+        sandbox.kill()
+
+        assert execution.error is None
+        assert execution.logs.stdout == ["42\n"]
+        assert len(execution.results) == 1 and execution.results[0].png
+        assert follow_up.logs.stdout == ["21\n"]
+        assert failure.error.name == "ZeroDivisionError"
+
+    def test_acquire_uses_prewarmed_sandboxes(self):
+        """Les sandboxes pré-créées sont distribuées sans nouvelle création"""
+        from local_sandbox import LocalSandbox
+        from sandbox_pool import SandboxPool
+
+        pool = SandboxPool(LocalSandbox.create, min_size=2, max_size=2, warmup_code="import pandas as pd")
+        pool.fill()
+
+        assert pool.size() == 2
+
+        sandbox = pool.acquire()
+
+        assert 'pd' in sandbox.namespace
+        assert pool.get_stats()['hits'] == 1
+        assert pool.get_stats()['created'] == 2
+
+        pool.shutdown()
+        sandbox.kill()
+
+    def test_unhealthy_sandbox_is_replaced(self):
+        """Une sandbox qui échoue au health check est fermée et remplacée"""
+        from local_sandbox import LocalSandbox
+        from sandbox_pool import SandboxPool
+
+        pool = SandboxPool(LocalSandbox.create, min_size=1, warmup_code="", health_check_code="ok")
+        pool.fill()
+
+        sandbox = pool.acquire()
+        stats = pool.get_stats()
+
+        assert stats['unhealthy'] == 1
+        assert stats['misses'] == 1
+        sandbox.kill()
+
+    def test_idle_surplus_is_evicted(self):
+        """Les sandboxes au-delà de min_size inactives trop longtemps sont fermées"""
+        from datetime import timedelta
+        from local_sandbox import LocalSandbox
+        from sandbox_pool import SandboxPool
+
+        pool = SandboxPool(LocalSandbox.create, min_size=1, max_size=3, max_idle=timedelta(0), warmup_code="")
+        for _ in range(3):
+            pool.release(LocalSandbox.create())
+
+        pool.evict_idle()
+
+        assert pool.size() == 1
+        pool.shutdown()
+
+    def test_idle_sandboxes_within_min_size_are_refreshed(self):
+        """Les sandboxes gardées pour min_size sont prolongées si saines, remplacées sinon"""
+        from datetime import timedelta
+        from local_sandbox import LocalSandbox
+        from sandbox_pool import SandboxPool
+
+        class ExpiringSandbox(LocalSandbox):
+            timeouts = []
+
+            def set_timeout(self, timeout):
+                self.timeouts.append(timeout)
+
+        pool = SandboxPool(ExpiringSandbox, min_size=2, max_size=2, max_idle=timedelta(0), warmup_code="",
+                           sandbox_timeout=600)
+        healthy, expired = ExpiringSandbox(), ExpiringSandbox()
+        expired.run_code = lambda code: (_ for _ in ()).throw(RuntimeError("sandbox not found"))
+        pool.release(healthy)
+        pool.release(expired)
+
+        pool.evict_idle()
+        pool.refresh_idle()
+
+        assert pool.size() == 1 and pool.acquire() is healthy
+        assert ExpiringSandbox.timeouts == [600, 600]
+        assert pool.get_stats()['refreshed'] == 1 and pool.get_stats()['unhealthy'] == 1
+
+        pool.fill()
+        assert pool.size() == 2
+        pool.shutdown()
+        healthy.kill()
+
+    def test_session_manager_with_local_backend(self, monkeypatch):
+        """Le gestionnaire de sessions accepte une fabrique locale (sans clé API)"""
+        monkeypatch.setenv('E2B_API_KEY', 'e2b_test_key_00000')  # requis à l'import du module
+        from e2b_session_manager import E2BSessionManager
+        from local_sandbox import LocalSandbox
+
+        monkeypatch.delenv('E2B_API_KEY')
+        manager = E2BSessionManager(sandbox_factory=LocalSandbox.create)
+        sandbox = manager.get_sandbox_for_user('user')
+
+        assert manager.get_sandbox_for_user('user') is sandbox
+        manager.cleanup_all()
+
+
+class TestPerUserLocking:
+    """Tests pour le verrouillage par utilisateur du gestionnaire E2B"""
+
+    @pytest.fixture
+    def slow_manager(self, monkeypatch):
+        """Gestionnaire dont la création de sandbox pour 'slow' bloque jusqu'à libération"""
+        import threading
+        from local_sandbox import LocalSandbox
+
+        monkeypatch.setenv('E2B_API_KEY', 'e2b_test_key_00000')
+        monkeypatch.setenv('E2B_POOL_MIN_SIZE', '0')
+        from e2b_session_manager import E2BSessionManager
+
+        release = threading.Event()
+        started = threading.Event()
+        created = []
+
+        def factory():
+            if threading.current_thread().name.startswith('slow'):
+                started.set()
+                release.wait(5)
+            sandbox = LocalSandbox.create()
+            created.append(sandbox)
+            return sandbox
+
+        manager = E2BSessionManager(sandbox_factory=factory)
+        yield manager, release, started, created
+        release.set()
+        manager.cleanup_all()
+
+    def test_slow_creation_does_not_block_other_users(self, slow_manager):
+        """La création lente d'une sandbox ne bloque pas un autre utilisateur"""
+        import threading
+
+        manager, release, started, _ = slow_manager
+        slow = threading.Thread(target=manager.get_sandbox_for_user, args=('slow',), name='slow-user')
+        slow.start()
+        assert started.wait(5)
+
+        sandbox = manager.get_sandbox_for_user('fast')
+
+        assert sandbox is not None
+        assert slow.is_alive()  # toujours en création
+        release.set()
+        slow.join(5)
+        assert manager.get_session_info('slow') is not None
+
+    def test_async_creation_is_shared(self, slow_manager):
+        """Des demandes non bloquantes concurrentes partagent la même création"""
+        manager, _, _, created = slow_manager
+
+        first = manager.get_sandbox_for_user_async('user')
+        second = manager.get_sandbox_for_user_async('user')
+        sandbox = first.result(timeout=5)
+
+        assert second.result(timeout=5) is sandbox
+        assert len(created) == 1
+        assert manager.get_sandbox_for_user_async('user').result(timeout=1) is sandbox
+
+
+class TestLocalExecutionBackend:
+    """Tests pour le backend d'exécution local en sous-processus"""
+
+    def test_backend_selection(self, monkeypatch):
+        """EXECUTION_BACKEND choisit le backend, un nom inconnu est refusé"""
+        from execution_backends import get_execution_backend
+
+        monkeypatch.setenv('EXECUTION_BACKEND', 'local')
+        assert get_execution_backend().name == 'local'
+        assert get_execution_backend('e2b').requires_api_key is True
+
+        with pytest.raises(ValueError):
+            get_execution_backend('docker')
+
+    def test_process_sandbox_keeps_state_and_captures_charts(self, sample_csv_path):
+        """Le worker garde son état entre deux exécutions et capture les graphiques"""
+        from local_sandbox import LocalProcessSandbox
+
+        sandbox = LocalProcessSandbox(timeout=60)
+        try:
+            sandbox.files.write(f"{sandbox.home_dir}/data.csv", open(sample_csv_path, 'rb'))
+            first = sandbox.run_code(
+                f"import pandas as pd\nimport matplotlib.pyplot as plt\n"
+                f"df = pd.read_csv('{sandbox.home_dir}/data.csv')\nplt.bar(df['ville'], df['age'])\nplt.show()"
+            )
+            second = sandbox.run_code("print(len(df))")
+        finally:
+            sandbox.kill()
+
+        assert first.error is None
+        assert len(first.results) == 1
+        assert second.logs.stdout == ["4\n"]
+
+    def test_process_sandbox_timeout_restarts_worker(self):
+        """Un code trop long est interrompu et le worker relancé"""
+        from local_sandbox import LocalProcessSandbox
+
+        sandbox = LocalProcessSandbox(timeout=60)
+        try:
+            timed_out = sandbox.run_code("import time\ntime.sleep(30)", timeout=1)
+            after = sandbox.run_code("print('ok')")
+        finally:
+            sandbox.kill()
+
+        assert timed_out.error.name == 'TimeoutError'
+        assert after.logs.stdout == ["ok\n"]
+        assert sandbox.restarts == 1
+
+    def test_session_reloads_kernel_after_timeout(self, local_workflow, monkeypatch):
+        """Après un timeout, le préambule et le dataset sont rechargés dans le worker relancé"""
+        import e2b_session_manager
+        from local_sandbox import LocalProcessSandbox
+
+        manager = e2b_session_manager.E2BSessionManager(sandbox_factory=lambda: LocalProcessSandbox(timeout=60))
+        monkeypatch.setattr(e2b_session_manager, '_session_manager', manager)
+        try:
+            lane = local_workflow._prepare_execution_lane(0)
+            sandbox = manager.get_sandbox_for_user('test_user')
+
+            sandbox.timeout = 1
+            timed_out = local_workflow._run_code_block(lane, "import time\ntime.sleep(30)")
+            sandbox.timeout = 60
+            after = local_workflow._run_code_block(lane, "print(len(df))\nplt.plot([1, 2])")
+        finally:
+            manager.cleanup_all()
+
+        assert 'TimeoutError' in timed_out['error']
+        assert after['success'], after['error']
+        assert '4' in after['output']
+        assert len(after['charts']) == 1
+
+    def test_session_manager_without_api_key(self, monkeypatch):
+        """Le backend local ne nécessite pas de clé E2B"""
+        monkeypatch.setenv('E2B_API_KEY', 'e2b_test_key_00000')  # requis à l'import du module
+        from e2b_session_manager import E2BSessionManager
+
+        monkeypatch.delenv('E2B_API_KEY')
+        monkeypatch.setenv('EXECUTION_BACKEND', 'inprocess')
+        manager = E2BSessionManager()
+
+        assert manager.backend.name == 'inprocess'
+        assert manager.get_sandbox_for_user('user').run_code("x = 1").error is None
+        manager.cleanup_all()
+
+
+@pytest.fixture
+def local_workflow(monkeypatch, tmp_path, sample_csv_path):
+    """Workflow complet exécuté sur des sandboxes locales (sans E2B ni LLM)"""
+    monkeypatch.setenv('E2B_API_KEY', 'e2b_test_key_00000')  # requis à l'import du module
+    monkeypatch.setenv('EXECUTION_CACHE_DIR', str(tmp_path / "executions"))
+    import e2b_session_manager
+    import execution_cache
+    from chapter_workflow import ReportGenerationWorkflow
+    from local_sandbox import LocalSandbox
+
+    manager = e2b_session_manager.E2BSessionManager(sandbox_factory=LocalSandbox.create)
+    monkeypatch.setattr(e2b_session_manager, '_session_manager', manager)
+    monkeypatch.setattr(execution_cache, '_execution_cache', None)
+
+    plan = {'chapitres': [{'numero': '1', 'titre': 'Description des données', 'sections': []}]}
+    workflow = ReportGenerationWorkflow('test_user', plan, sample_csv_path)
+
+    yield workflow
+    manager.cleanup_all()
+
+
+class TestExecutionCache:
+    """Tests pour le cache des résultats d'exécution"""
+
+    def test_key_ignores_formatting(self):
+        """Commentaires et espaces ne changent pas la clé, le dataset si"""
+        from execution_cache import ExecutionResultCache
+
+        key = ExecutionResultCache.make_key('abc', "x = df['age'].mean()\nprint(x)")
+        reformatted = ExecutionResultCache.make_key('abc', "# moyenne\nx = df['age'].mean()\n\nprint( x )")
+        other_dataset = ExecutionResultCache.make_key('def', "x = df['age'].mean()\nprint(x)")
+
+        assert key == reformatted
+        assert key != other_dataset
+
+    def test_roundtrip_and_lru_eviction(self, tmp_path):
+        """Les résultats (texte + PNG) sont relus, les moins récents évincés"""
+        import base64
+        import os
+        from execution_cache import ExecutionResultCache
+
+        cache = ExecutionResultCache(cache_dir=str(tmp_path), max_size_mb=1)
+        png = base64.b64encode(b'\x89PNG' + b'0' * 400 * 1024).decode()
+
+        cache.set('a' * 64, {'success': True, 'output': 'A', 'charts': [png], 'execution_time': 2.0})
+        cache.set('b' * 64, {'success': False, 'output': '', 'charts': [], 'error': 'boom'})
+
+        cached = cache.get('a' * 64)
+        assert cached['output'] == 'A' and cached['charts'] == [png] and cached['cached'] is True
+        assert cache.get('b' * 64) is None
+
+        os.utime(tmp_path / 'aa' / ('a' * 64) / 'result.json', (0, 0))
+        cache.set('c' * 64, {'success': True, 'output': 'C', 'charts': [png], 'execution_time': 1.0})
+        cache.set('d' * 64, {'success': True, 'output': 'D', 'charts': [png], 'execution_time': 1.0})
+
+        assert cache.get('a' * 64) is None
+        assert cache.get('d' * 64)['output'] == 'D'
+
+    def test_directory_scanned_only_over_the_limit(self, tmp_path, monkeypatch):
+        """La taille est suivie à chaque écriture : le dossier n'est parcouru qu'au dépassement"""
+        from execution_cache import ExecutionResultCache
+
+        cache = ExecutionResultCache(cache_dir=str(tmp_path), max_size_mb=1)
+        scans = []
+        evict = cache.evict
+        monkeypatch.setattr(cache, 'evict', lambda: scans.append(1) or evict())
+
+        for key in 'abc':
+            cache.set(key * 64, {'success': True, 'output': key * 300 * 1024, 'charts': []})
+        cache.set('a' * 64, {'success': True, 'output': 'A', 'charts': []})  # remplacement : taille réduite
+        assert scans == []
+
+        cache.set('d' * 64, {'success': True, 'output': 'd' * 800 * 1024, 'charts': []})
+        assert scans == [1]
+        assert cache.get_size() <= cache.max_size_bytes and cache._total_size == cache.get_size()
+
+    def test_regenerated_chapter_reuses_results(self, local_workflow):
+        """Un chapitre regénéré avec les mêmes blocs n'est pas ré-exécuté"""
+        import e2b_session_manager
+
+        content = "Intro\n```python\nprint(df['age'].sum())\n```\nFin\n"
+
+        first = local_workflow._execute_code_blocks(content)
+        sandbox = e2b_session_manager.get_session_manager().get_sandbox_for_user('test_user')
+        sandbox.namespace['_dataset_df'] = None  # toute ré-exécution échouerait
+        second = local_workflow._execute_code_blocks(content.replace("print(df", "print( df"))
+
+        assert "130" in first
+        assert second == first
+
+
+STREAMED_CHAPTER = (
+    "## 1. Description\nLe dataset contient quatre individus.\n"
+    "```python\nprint(df['age'].sum())\n```\n"
+    "Interprétation de l'âge.\n"
+    "  ```python\n  total = df['salaire'].sum()\n  print(total)\n  ```\n"
+    "Conclusion.\n"
+)
+
+
+class TestStreamingGeneration:
+    """Tests pour la génération en streaming"""
+
+    def test_parser_handles_arbitrary_chunking(self):
+        """Le découpage des tokens ne change pas les événements produits"""
+        from stream_parser import CodeFenceParser
+
+        for size in (1, 3, 7, len(STREAMED_CHAPTER)):
+            parser = CodeFenceParser()
+            events = []
+            for start in range(0, len(STREAMED_CHAPTER), size):
+                events.extend(parser.feed(STREAMED_CHAPTER[start:start + size]))
+            events.extend(parser.flush())
+
+            codes = [e['code'] for e in events if e['type'] == 'code']
+            text = "".join(e['text'] for e in events if e['type'] == 'text')
+            assert codes == ["print(df['age'].sum())", "  total = df['salaire'].sum()\n  print(total)"]
+            assert "quatre individus" in text and "Conclusion." in text
+            assert "```" not in text
+
+    def test_unclosed_block_is_kept_as_text(self):
+        """Un bloc non fermé en fin de flux n'est pas exécuté"""
+        from stream_parser import CodeFenceParser
+
+        parser = CodeFenceParser()
+        events = parser.feed("Texte\n```python\nprint(1)\n") + parser.flush()
+
+        assert [e['type'] for e in events] == ['text', 'text']
+        assert events[1]['text'] == "```python\nprint(1)\n"
+
+    def test_closing_fence_at_end_of_stream(self):
+        """Une clôture en fin de flux, sans saut de ligne final, ferme le bloc"""
+        from stream_parser import CodeFenceParser
+
+        parser = CodeFenceParser()
+        events = parser.feed("Intro\n```python\nprint(1)\n```") + parser.flush()
+
+        assert events == [{'type': 'text', 'text': "Intro\n"}, {'type': 'code', 'code': "print(1)"}]
+
+    def test_blocks_execute_while_generating(self, local_workflow, monkeypatch):
+        """Un bloc s'exécute pendant que le LLM écrit la suite, le contenu final est celui du mode bloquant"""
+        import threading
+
+        first_block_done = threading.Event()
+        execute_block = local_workflow._execute_streamed_block
+
+        def tracking_execute(*args):
+            result = execute_block(*args)
+            first_block_done.set()
+            return result
+
+        def slow_stream(prompt, task_type):
+            split = STREAMED_CHAPTER.index("Interprétation")
+            yield STREAMED_CHAPTER[:split]
+            # Le LLM "écrit encore" : le premier bloc doit s'exécuter sans attendre la fin du flux
+            assert first_block_done.wait(timeout=10)
+            for i in range(split, len(STREAMED_CHAPTER), 5):
+                yield STREAMED_CHAPTER[i:i + 5]
+
+        monkeypatch.setattr(local_workflow, '_prepare_chapter_prompt', lambda chapter: ("prompt", "default"))
+        monkeypatch.setattr(local_workflow, '_stream_with_ai', slow_stream)
+        monkeypatch.setattr(local_workflow, '_execute_streamed_block', tracking_execute)
+
+        events = list(local_workflow.generate_current_chapter_stream())
+        types = [e['type'] for e in events]
+        done = events[-1]
+
+        assert types.count('block_result') == 2
+        # Le premier résultat est livré alors que des tokens restent à recevoir
+        assert types.index('block_result') < len(types) - 1 - types[::-1].index('token')
+        assert done['type'] == 'done' and done['success']
+        assert "130" in done['content'] and "```" not in done['content']
+        assert done['content'] == local_workflow._execute_code_blocks(STREAMED_CHAPTER)
+
+    def test_independent_groups_stream_on_separate_lanes(self, local_workflow, monkeypatch):
+        """Chaque groupe indépendant a sa voie (E2B_PARALLEL_LANES), un bloc dépendant suit son groupe"""
+        chapter_text = STREAMED_CHAPTER + "```python\nprint(total * 2)\n```\n"
+        execute_block = local_workflow._execute_streamed_block
+        lanes = []
+
+        def tracking_execute(codes, state, lane_index):
+            lanes.append(lane_index)
+            return execute_block(codes, state, lane_index)
+
+        monkeypatch.setattr(local_workflow, '_prepare_chapter_prompt', lambda chapter: ("prompt", "default"))
+        monkeypatch.setattr(local_workflow, '_stream_with_ai', lambda prompt, task_type: iter([chapter_text]))
+        monkeypatch.setattr(local_workflow, '_execute_streamed_block', tracking_execute)
+        monkeypatch.setenv("E2B_PARALLEL_LANES", "2")
+
+        *_, done = local_workflow.generate_current_chapter_stream()
+
+        assert sorted(lanes) == [0, 1, 1]
+        assert done['success'] and "360000" in done['content']
+        assert done['content'] == local_workflow._execute_code_blocks(chapter_text)
+
+    def test_blocking_generation_uses_pipeline(self, local_workflow, monkeypatch):
+        """generate_current_chapter retourne le même dict qu'avant, via le pipeline"""
+        monkeypatch.setattr(local_workflow, '_prepare_chapter_prompt', lambda chapter: ("prompt", "default"))
+        monkeypatch.setattr(local_workflow, '_stream_with_ai', lambda prompt, task_type: iter([STREAMED_CHAPTER]))
+
+        result = local_workflow.generate_current_chapter()
+
+        assert result['success'] and set(result) == {'success', 'chapter', 'content'}
+        assert "130" in result['content']
+        assert result['chapter'].status.value == "Généré (en attente validation)"
+
+    def test_last_block_runs_without_trailing_newline(self, local_workflow, monkeypatch):
+        """Réponse terminée par la clôture du dernier bloc : il est exécuté comme en mode non pipeliné"""
+        chapter_text = "## 1. Description\n```python\nprint(df['age'].sum())\n```"
+        monkeypatch.setattr(local_workflow, '_prepare_chapter_prompt', lambda chapter: ("prompt", "default"))
+        monkeypatch.setattr(local_workflow, '_stream_with_ai', lambda prompt, task_type: iter([chapter_text]))
+
+        result = local_workflow.generate_current_chapter()
+
+        assert result['success'] and "130" in result['content'] and "```" not in result['content']
+        assert result['content'] == local_workflow._execute_code_blocks(chapter_text)
+
+
+class TestChapterScheduler:
+    """Tests pour le mode brouillons en lot (DAG des chapitres)"""
+
+    def test_dag_from_plan(self):
+        """Synthèses après les chapitres qu'elles résument, dépendances explicites, cycles refusés"""
+        from chapter_scheduler import build_chapter_dag, run_dag
+
+        plan = [
+            {'numero': '0', 'titre': 'Synthèse exécutive'},
+            {'numero': '1', 'titre': 'Introduction'},
+            {'numero': '2', 'titre': 'Description des données'},
+            {'numero': '3', 'titre': 'Analyse des relations', 'dependances': ['2']},
+            {'numero': '4', 'titre': 'Conclusion et recommandations'},
+        ]
+        assert build_chapter_dag(plan) == {
+            '0': ['1', '2', '3'], '1': [], '2': [], '3': ['2'], '4': ['0', '1', '2', '3']
+        }
+
+        with pytest.raises(ValueError):
+            build_chapter_dag([{'numero': '1', 'titre': 'A', 'dependances': ['2']},
+                               {'numero': '2', 'titre': 'B', 'dependances': ['1']}])
+
+        # Un échec débloque quand même les chapitres qui en dépendent
+        def run(node, worker):
+            if node == '2':
+                raise RuntimeError("LLM indisponible")
+            return node
+
+        results = run_dag({'1': [], '2': [], '3': ['1', '2']}, run, max_workers=2)
+        assert results['1'] == '1' and results['3'] == '3' and isinstance(results['2'], RuntimeError)
+
+    def test_independent_chapters_drafted_concurrently(self, local_workflow, monkeypatch):
+        """Chapitres indépendants générés en même temps, la conclusion reçoit leurs brouillons, validation dans l'ordre"""
+        import threading
+
+        local_workflow.plan = {'chapitres': [
+            {'numero': '1', 'titre': 'Description des âges', 'sections': []},
+            {'numero': '2', 'titre': 'Description des salaires', 'sections': []},
+            {'numero': '3', 'titre': 'Conclusion', 'sections': []},
+        ]}
+        local_workflow.chapters = []
+        local_workflow._initialize_chapters()
+
+        both_started = threading.Barrier(2, timeout=10)
+        contexts = {}
+
+        def build_prompt(chapter, context):
+            contexts[chapter.number] = context
+            return chapter.number
+
+        def generate(prompt, task_type="default"):
+            if prompt in ('1', '2'):
+                both_started.wait()  # échoue si les deux chapitres ne tournent pas en parallèle
+            column = {'1': 'age', '2': 'salaire', '3': 'age'}[prompt]
+            return f"## Chapitre {prompt}\n```python\nprint(df['{column}'].sum())\n```\n"
+
+        monkeypatch.setattr(local_workflow, '_build_chapter_prompt', build_prompt)
+        monkeypatch.setattr(local_workflow, '_generate_with_ai', generate)
+
+        results = local_workflow.generate_drafts(max_workers=2)
+
+        assert list(results) == ['1', '2', '3'] and all(r['success'] for r in results.values())
+        assert "130" in results['1']['content'] and "180000" in results['2']['content']
+        assert "Chapitre 1" in contexts['3'] and "Chapitre 2" in contexts['3']
+        assert "brouillon" not in contexts['1']
+
+        for number in ['1', '2', '3']:
+            assert local_workflow.get_current_chapter().number == number
+            assert local_workflow.validate_chapter(number)
+        assert local_workflow.is_complete()
+
+
+class TestSectionGeneration:
+    """Tests pour la génération d'un chapitre section par section"""
+
+    def test_sections_renumbered_and_stitched(self):
+        """Numéros locaux de chaque section remplacés par la suite du chapitre"""
+        from chapter_sections import build_section_dag, stitch_sections
+
+        texts = [
+            "### 2.1. Âges\n**Tableau 2.1 : Âges**\nVoir Tableau 2.1.",
+            "### 2.2. Salaires\n**Tableau 2.1 : Salaires**\n**Graphique 2.1 : Salaires**\n**Tableau 2.2 : Villes**",
+        ]
+        stitched = stitch_sections('2', 'Description', texts)
+
+        assert stitched.startswith("## 2. Description\n\n### 2.1. Âges")
+        assert "Voir Tableau 2.1." in stitched
+        assert "Tableau 2.2 : Salaires" in stitched and "Tableau 2.3 : Villes" in stitched
+        assert "Graphique 2.1 : Salaires" in stitched
+
+        sections = [{'titre': 'Âges'}, {'titre': 'Salaires'}, {'titre': 'Synthèse'}]
+        assert build_section_dag(sections) == {'0': [], '1': [], '2': ['0', '1']}
+
+    def test_synthesis_keeps_references_to_its_dependencies(self):
+        """Une synthèse rédigée à partir des sections renumérotées garde leurs numéros"""
+        from chapter_sections import renumber_references, stitch_sections
+
+        texts = ["Tableau 2.1 âge", "Tableau 2.1 revenu"]
+        assert renumber_references(texts, '2') == ["Tableau 2.1 âge", "Tableau 2.2 revenu"]
+
+        synthesis = "Le Tableau 2.1 (âge) et le Tableau 2.2 (revenu) ; nouveau Tableau 2.3"
+        stitched = stitch_sections('2', 'Description', texts + [synthesis], resolved={2})
+
+        assert "Tableau 2.2 revenu" in stitched
+        assert "Le Tableau 2.1 (âge) et le Tableau 2.2 (revenu) ; nouveau Tableau 2.3" in stitched
+        assert "Tableau 2.4" not in stitched
+
+    def test_failed_section_retried_alone_then_cached(self, local_workflow, monkeypatch):
+        """Sections en parallèle, seule la section en échec est regénérée, puis tout vient du cache"""
+        import threading
+
+        monkeypatch.setenv("SECTION_GENERATION", "true")
+        local_workflow.plan = {'chapitres': [{'numero': '1', 'titre': 'Description', 'sections': [
+            {'titre': 'Âges', 'analyses': ['moyenne']},
+            {'titre': 'Salaires', 'analyses': ['somme']},
+            {'titre': 'Synthèse', 'analyses': ['bilan']},
+        ]}]}
+        local_workflow.chapters = []
+        local_workflow._initialize_chapters()
+
+        both_started = threading.Barrier(2, timeout=10)
+        calls = []
+
+        def build_prompt(chapter, context, section_index=None):
+            return f"section {section_index}" + ("\n" + context if section_index == 2 else "")
+
+        def generate(prompt, task_type="default"):
+            calls.append(prompt)
+            index = int(prompt.split()[1])
+            if index < 2 and len(calls) <= 2:
+                both_started.wait()  # échoue si les deux sections ne tournent pas en parallèle
+            if index == 1 and "[REFRESH]" not in prompt:
+                return "### 1.2. Salaires\n```python\nprint(df['salary'].sum())\n```\n"
+            if index == 2:
+                # Synthèse : cite le tableau de la section 1.1, son propre tableau suit la numérotation du kernel
+                return ("### 1.3. Section\nComme le montre le Tableau 1.1 :\n```python\n"
+                        "print(f'Tableau {chapitre}.{tableau_counter} : age')\nprint(df['age'].sum())\n```\n")
+            column = ['age', 'salaire'][index]
+            return f"### 1.{index + 1}. Section\n**Tableau 1.1 : {column}**\n```python\nprint(df['{column}'].sum())\n```\n"
+
+        monkeypatch.setattr(local_workflow, '_build_chapter_prompt', build_prompt)
+        monkeypatch.setattr(local_workflow, '_generate_with_ai', generate)
+
+        events = list(local_workflow.generate_current_chapter_stream())
+        done = events[-1]
+
+        assert done['success'], done.get('error')
+        assert sorted(e['index'] for e in events if e['type'] == 'section_done') == [0, 1, 2]
+        assert len(calls) == 4 and sum("[REFRESH]" in prompt for prompt in calls) == 1
+        assert "180000" in done['content'] and "Tableau 1.3 : age" in done['content']
+        assert "Comme le montre le Tableau 1.1" in done['content']
+        assert "SECTION 1.1" in calls[-1] and "SECTION 1.2" in calls[-1] and "Tableau 1.2 : salaire" in calls[-1]
+        assert [s['attempts'] for s in done['chapter'].section_results] == [1, 2, 1]
+
+        # Nouvelle tentative du chapitre : aucune section regénérée
+        calls.clear()
+        result = local_workflow.generate_current_chapter()
+        assert result['success'] and calls == []
+        assert all(s['cached'] for s in result['chapter'].section_results)
+
+
+    def test_revision_regenerates_only_targeted_sections(self, local_workflow, monkeypatch):
+        """Demande citant un tableau : sa section est regénérée, les autres reprises avec leurs résultats"""
+        from chapter_sections import affected_sections
+
+        assert affected_sections("Refaire le Tableau 1.2 et la section 1.3", '1', ['Âges', 'Salaires', 'Villes'],
+                                 ["Tableau 1.1", "Tableau 1.2", ""]) == [1, 2]
+        assert affected_sections("Plus concis", '1', ['Âges', 'Salaires'], ["", ""]) == []
+
+        local_workflow.plan = {'chapitres': [{'numero': '1', 'titre': 'Description', 'sections': [
+            {'titre': 'Âges', 'analyses': ['somme']},
+            {'titre': 'Salaires', 'analyses': ['somme']},
+        ]}]}
+        local_workflow.chapters = []
+        local_workflow._initialize_chapters()
+
+        calls = []
+
+        def generate(prompt, task_type="default"):
+            calls.append(prompt)
+            if "VERSION ACTUELLE DE LA SECTION 1.2" in prompt:
+                return "### 1.2. Salaires\nSalaire maximal :\n```python\nprint(df['salaire'].max())\n```\n"
+            return ("## 1. Description\n### 1.1. Âges\n```python\nprint(df['age'].sum())\n```\n"
+                    "### 1.2. Salaires\n```python\nprint(df['salaire'].sum())\n```\n")
+
+        monkeypatch.setattr(local_workflow, '_generate_with_ai', generate)
+        monkeypatch.setenv("PIPELINED_GENERATION", "false")
+        assert local_workflow.generate_current_chapter()['success']
+
+        calls.clear()
+        result = local_workflow.revise_chapter('1', {'request': "Section 1.2 : donner le maximum", 'keep_code': False})
+
+        assert result['success'], result.get('error')
+        assert result['regenerated'] == ['1.2'] and result['reused'] == ['1.1'] and result['reuse_ratio'] == 0.5
+        assert len(calls) == 1 and "RÉGÉNÉRATION DEMANDÉE" in calls[0]
+        assert "130" in result['content'] and "60000" in result['content'] and "180000" not in result['content']
+        assert local_workflow.validate_chapter('1')
+
+    def test_revision_without_sections_regenerates_the_requested_chapter(self, local_workflow, monkeypatch):
+        """Chapitre sans sections révisé alors qu'un autre est en cours : seul le chapitre demandé est regénéré"""
+        local_workflow.plan = {'chapitres': [
+            {'numero': '1', 'titre': 'Description des âges', 'sections': []},
+            {'numero': '2', 'titre': 'Description des salaires', 'sections': []},
+        ]}
+        local_workflow.chapters = []
+        local_workflow._initialize_chapters()
+
+        def generate(prompt, task_type="default"):
+            if "RÉGÉNÉRATION DEMANDÉE" in prompt:
+                return "## 2. Salaires\n```python\nprint(df['salaire'].max())\n```\n"
+            column = 'salaire' if "Description des salaires" in prompt else 'age'
+            return f"## Chapitre\n```python\nprint(df['{column}'].sum())\n```\n"
+
+        monkeypatch.setattr(local_workflow, '_generate_with_ai', generate)
+        local_workflow.generate_drafts(max_workers=1)
+        first_content = local_workflow._find_chapter('1').content
+
+        result = local_workflow.revise_chapter('2', {'request': "Donner le maximum"})
+
+        assert result['success'] and result['chapter'].number == '2'
+        assert "60000" in result['content'] and result['regenerated'] == []
+        assert local_workflow.get_current_chapter().number == '1'
+        assert local_workflow._find_chapter('1').content == first_content
+
+
+class TestLLMProviders:
+    """Tests pour le registre de fournisseurs LLM"""
+
+    def test_registry_shares_instances(self, monkeypatch):
+        """Un fournisseur est créé une fois puis réutilisé"""
+        import llm_providers
+
+        monkeypatch.setattr(llm_providers, '_providers', {})
+
+        fake = llm_providers.get_provider('fake')
+        assert llm_providers.get_provider('fake') is fake
+        with pytest.raises(ValueError):
+            llm_providers.get_provider('inconnu')
+
+    def test_gemini_models_are_cached(self):
+        """Un seul GenerativeModel par nom de modèle"""
+        pytest.importorskip('google.generativeai')
+        from llm_providers import GeminiProvider
+
+        provider = GeminiProvider(api_key='test_key')
+
+        assert provider.get_model('gemini-2.5-flash') is provider.get_model('gemini-2.5-flash')
+        assert provider.get_model('gemini-2.5-pro') is not provider.get_model('gemini-2.5-flash')
+
+    def test_workflow_streams_through_providers(self, local_workflow, monkeypatch):
+        """Le workflow passe par le registre, y compris pour le fallback Claude"""
+        import llm_providers
+        from llm_providers import FakeProvider
+
+        gemini = FakeProvider(error=Exception("429 quota exceeded"))
+        claude = FakeProvider([STREAMED_CHAPTER], chunk_size=4)
+        monkeypatch.setattr(llm_providers, '_providers', {'gemini': gemini, 'anthropic': claude})
+
+        chunks = list(local_workflow._stream_with_ai("prompt", task_type="code"))
+
+        assert "".join(chunks) == STREAMED_CHAPTER and len(chunks) > 1
+        assert gemini.calls[0]['model'] == "gemini-2.5-flash"
+        assert claude.calls[0]['prompt'] == "prompt"
+
+
+class TestAsyncWorkflow:
+    """Tests pour le workflow asyncio (plusieurs utilisateurs sur une boucle, annulation)"""
+
+    def test_concurrent_users_on_one_loop(self, local_workflow, monkeypatch):
+        """Deux générations entrelacées sur la même boucle, blocs exécutés pendant le flux"""
+        import asyncio
+        import llm_providers
+        from llm_providers import FakeProvider, set_provider
+        from async_workflow import AsyncReportGenerationWorkflow
+
+        both_streaming = asyncio.Barrier(2)
+
+        class BarrierProvider(FakeProvider):
+            async def astream(self, prompt, **kwargs):
+                await asyncio.wait_for(both_streaming.wait(), 5)  # échoue si les flux ne sont pas simultanés
+                async for text in super().astream(prompt, **kwargs):
+                    yield text
+
+        monkeypatch.setattr(llm_providers, '_providers', {})
+        set_provider('gemini', BarrierProvider(
+            ["## 1. Description\n```python\nprint(df['age'].sum())\n```\nFin.\n"], chunk_size=8, delay=0.001
+        ))
+
+        async def main():
+            workflows = [
+                AsyncReportGenerationWorkflow(user, local_workflow.plan, local_workflow.csv_path)
+                for user in ('alice', 'bob')
+            ]
+            return workflows, await asyncio.gather(*(w.agenerate_current_chapter() for w in workflows))
+
+        workflows, results = asyncio.run(main())
+
+        assert all(result['success'] for result in results)
+        assert all("130" in result['content'] and "Fin." in result['content'] for result in results)
+        assert asyncio.run(workflows[0].avalidate_chapter('1')) and workflows[0].is_complete()
+
+    def test_cancelled_generation_restores_chapter(self, local_workflow, monkeypatch):
+        """Annuler la tâche interrompt le flux ; le chapitre peut être regénéré ensuite"""
+        import asyncio
+        import llm_providers
+        from llm_providers import FakeProvider, set_provider
+        from async_workflow import AsyncReportGenerationWorkflow
+        from chapter_workflow import ChapterStatus
+
+        monkeypatch.setattr(llm_providers, '_providers', {})
+        fake = FakeProvider(["## 1. Description\n" + "Texte. " * 200], chunk_size=4, delay=0.01)
+        set_provider('gemini', fake)
+        workflow = AsyncReportGenerationWorkflow('carol', local_workflow.plan, local_workflow.csv_path)
+
+        async def main():
+            task = workflow.start_current_chapter()
+            await asyncio.sleep(0.1)
+            assert workflow.get_current_chapter().status == ChapterStatus.GENERATING
+            assert workflow.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(main())
+        assert workflow.get_current_chapter().status == ChapterStatus.PENDING
+
+        fake.delay = 0
+        result = asyncio.run(workflow.agenerate_current_chapter())
+        assert result['success'] and result['content'].count("Texte.") == 200
+
+    def test_section_generation_matches_sync_workflow(self, local_workflow, monkeypatch):
+        """SECTION_GENERATION : le workflow asyncio produit les mêmes sections et le même chapitre"""
+        import asyncio
+        from async_workflow import AsyncReportGenerationWorkflow
+
+        monkeypatch.setenv("SECTION_GENERATION", "true")
+        plan = {'chapitres': [{'numero': '1', 'titre': 'Description', 'sections': [
+            {'titre': 'Âges', 'analyses': ['somme']},
+            {'titre': 'Salaires', 'analyses': ['somme']},
+        ]}]}
+
+        def generate(prompt, task_type="default"):
+            column = 'salaire' if prompt.endswith("1") else 'age'
+            return f"### Section\n```python\nprint(df['{column}'].sum())\n```\n"
+
+        def build_prompt(chapter, context, section_index=None):
+            return f"section {section_index}"
+
+        results = []
+        for workflow in (AsyncReportGenerationWorkflow('dave', plan, local_workflow.csv_path),
+                         type(local_workflow)('erin', plan, local_workflow.csv_path)):
+            monkeypatch.setattr(workflow, '_build_chapter_prompt', build_prompt)
+            monkeypatch.setattr(workflow, '_generate_with_ai', generate)
+            results.append(workflow)
+
+        async def collect():
+            return [event async for event in results[0].astream_current_chapter()]
+
+        async_events = asyncio.run(collect())
+        sync_events = list(results[1].generate_current_chapter_stream())
+
+        assert sorted(e['index'] for e in async_events if e['type'] == 'section_done') == [0, 1]
+        assert async_events[-1]['success'] and "130" in async_events[-1]['content']
+        assert "180000" in async_events[-1]['content']
+        assert async_events[-1]['content'] == sync_events[-1]['content']
+
+
+class TestGenerationJobs:
+    """Tests pour la file de jobs de génération (SQLite, workers)"""
+
+    def test_claim_cancel_and_resume_abandoned_job(self, tmp_path):
+        """Réclamation dans l'ordre, annulation, reprise d'un job dont le worker ne bat plus"""
+        import time
+        from generation_jobs import JobQueue, JOB_CANCELLED, JOB_RUNNING
+
+        queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.2)
+        payload = {'chapters': [('1', 'Introduction')]}
+        first, second, third = (queue.submit('alice', payload) for _ in range(3))
+
+        assert queue.claim('worker-a')['id'] == first
+        assert queue.cancel(second) and queue.status(second)['status'] == JOB_CANCELLED
+        assert queue.claim('worker-b')['id'] == third
+        assert queue.claim('worker-c') is None
+
+        time.sleep(0.3)  # worker-a ne bat plus : son job est repris
+        assert queue.heartbeat(third, 'worker-b')
+        resumed = queue.claim('worker-c')
+        assert resumed['id'] == first and resumed['attempts'] == 2
+        assert not queue.heartbeat(first, 'worker-a')
+
+        assert queue.cancel(first) and queue.cancel_requested(first)
+        assert queue.status(first)['status'] == JOB_RUNNING
+        assert queue.jobs_for_user('alice') == [third, first]
+
+    def test_worker_generates_remaining_chapters(self, local_workflow, tmp_path, monkeypatch):
+        """Le worker reprend les chapitres déjà terminés, génère les autres ; l'interface les récupère"""
+        import time
+        import llm_providers
+        from llm_providers import FakeProvider, set_provider
+        from generation_jobs import (
+            CHAPTER_GENERATED, JOB_DONE, apply_job_results, queue_from_env, run_worker, submit_generation_job
+        )
+        import generation_jobs
+
+        monkeypatch.setenv("JOB_LEASE_SECONDS", "0.2")
+        monkeypatch.setattr(generation_jobs, '_job_queue', queue_from_env(str(tmp_path / "jobs.sqlite3")))
+        monkeypatch.setattr(llm_providers, '_providers', {})
+        fake = FakeProvider(["## 2. Salaires\n```python\nprint(df['salaire'].sum())\n```\n"])
+        set_provider('gemini', fake)
+
+        local_workflow.plan = {'chapitres': [
+            {'numero': '1', 'titre': 'Description des âges', 'sections': []},
+            {'numero': '2', 'titre': 'Description des salaires', 'sections': []},
+        ]}
+        local_workflow.chapters = []
+        local_workflow._initialize_chapters()
+
+        job_id = submit_generation_job(local_workflow)
+        queue = generation_jobs.get_job_queue()
+        # Tentative précédente interrompue après le chapitre 1
+        assert queue.claim('worker-old')['id'] == job_id
+        assert queue.update_chapter(job_id, 'worker-old', '1', CHAPTER_GENERATED,
+                                    content="## 1. Âges\n130", raw_content="## 1. Âges\n130")
+        time.sleep(0.3)
+
+        run_worker(worker_id='worker-test', max_jobs=1)
+
+        status = queue.status(job_id)
+        assert status['status'] == JOB_DONE and status['generated'] == 2
+        assert len(fake.calls) == 1
+
+        assert apply_job_results(local_workflow, status) == ['1', '2']
+        assert "180000" in local_workflow._find_chapter('2').content
+        assert local_workflow.validate_chapter('1') and local_workflow.validate_chapter('2')
+        assert local_workflow.is_complete()
+
+    def test_worker_that_lost_its_lease_writes_nothing(self, local_workflow, tmp_path, monkeypatch):
+        """Un worker dont le job a été repris ne génère plus rien et ne termine pas le job"""
+        import time
+        import llm_providers
+        from llm_providers import FakeProvider, set_provider
+        from generation_jobs import CHAPTER_QUEUED, JOB_RUNNING, JobQueue, job_payload, process_job
+
+        monkeypatch.setattr(llm_providers, '_providers', {})
+        fake = FakeProvider(["## 1. Âges\n"])
+        set_provider('gemini', fake)
+
+        queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.2)
+        job_id = queue.submit('test_user', job_payload(local_workflow))
+        stale_job = queue.claim('worker-a')
+        time.sleep(0.3)  # worker-a en retard : le job est repris par worker-b
+        assert queue.claim('worker-b')['id'] == job_id
+
+        process_job(queue, stale_job, 'worker-a')
+
+        status = queue.status(job_id)
+        assert status['status'] == JOB_RUNNING and status['worker'] == 'worker-b'
+        assert all(chapter['status'] == CHAPTER_QUEUED for chapter in status['chapters'])
+        assert fake.calls == []
+        assert not queue.finish(job_id, 'worker-a', 'done')
+
+
+class TestDatasetHandle:
+    """Tests pour le jeu de données chargé une fois par workflow"""
+
+    def test_loaded_once_and_reloaded_on_change(self, sample_csv_path, monkeypatch):
+        """Un seul parsing tant que le contenu du fichier ne change pas"""
+        import os
+        import dataset_handle
+        from dataset_handle import DatasetHandle
+
+        reads = []
+        read_dataset = dataset_handle.read_dataset
+        monkeypatch.setattr(dataset_handle, 'read_dataset', lambda path: reads.append(path) or read_dataset(path))
+
+        dataset = DatasetHandle(sample_csv_path)
+        assert dataset.columns == ['age', 'salaire', 'ville']
+        assert dataset.schema()[0] == {'name': 'age', 'dtype': 'int64', 'example': '25'}
+        assert dataset.stats().loc['mean', 'age'] == 32.5
+        assert len(reads) == 1
+
+        pd.DataFrame({'note': [1, 2]}).to_csv(sample_csv_path, index=False)
+        os.utime(sample_csv_path, (0, 1))
+
+        assert dataset.columns == ['note'] and dataset.n_rows == 2
+        assert len(reads) == 2
+
+    def test_preloaded_frame_and_encoding_fallback(self, tmp_path, monkeypatch):
+        """Un DataFrame déjà chargé est repris tel quel, les CSV latin-1 sont lus"""
+        import dataset_handle
+        from dataset_handle import DatasetHandle
+
+        csv_path = tmp_path / "latin.csv"
+        csv_path.write_bytes("ville,note\nOrléans,3\n".encode('latin-1'))
+
+        read_dataset = dataset_handle.read_dataset
+        monkeypatch.setattr(dataset_handle, 'read_dataset', lambda path: pytest.fail("fichier relu"))
+        preloaded = DatasetHandle(str(csv_path), df=pd.DataFrame({'ville': ['Orléans'], 'note': [3]}))
+        assert preloaded.n_rows == 1
+
+        monkeypatch.setattr(dataset_handle, 'read_dataset', read_dataset)
+        dataset = DatasetHandle(str(csv_path))
+        assert dataset.df['ville'].iloc[0] == 'Orléans' and dataset.encoding == 'latin-1'
+
+
+class TestColumnarCache:
+    """Tests pour la copie colonnaire (Parquet) des datasets"""
+
+    def test_source_parsed_once_then_read_from_parquet(self, tmp_path, monkeypatch):
+        """Le CSV n'est parsé qu'une fois, types et encodage sont conservés"""
+        import dataset_handle
+        from dataset_handle import read_dataset
+
+        csv_path = tmp_path / "latin.csv"
+        csv_path.write_bytes("ville,note,date\nOrléans,3.5,2024-01-01\nNîmes,4.0,2024-02-01\n".encode('latin-1'))
+
+        first, encoding = read_dataset(str(csv_path))
+        monkeypatch.setattr(dataset_handle, 'parse_dataset', lambda path: pytest.fail("CSV re-parsé"))
+        second, cached_encoding = read_dataset(str(csv_path))
+
+        pd.testing.assert_frame_equal(first, second)
+        assert encoding == cached_encoding == 'latin-1'
+
+    def test_sandbox_receives_parquet_with_fallback(self, sample_csv_path):
+        """Une sandbox distante reçoit la copie Parquet, ou le fichier source si elle ne sait pas la lire"""
+        from dataset_handle import read_dataset
+        from dataset_staging import DatasetStager
+
+        read_dataset(sample_csv_path)
+
+        remote = FakeSandbox()
+        staged = DatasetStager().stage(remote, sample_csv_path)
+        assert staged['extension'] == '.parquet' and list(remote.written) == [staged['remote_path']]
+
+        class NoPyarrowSandbox(FakeSandbox):
+            def run_code(self, code):
+                self.executed.append(code)
+                missing = type('Error', (), {'name': 'ModuleNotFoundError', 'value': "No module named 'pyarrow'"})
+                return FakeExecution(error=missing() if 'read_parquet' in code else None)
+
+        fallback = NoPyarrowSandbox()
+        staged = DatasetStager().stage(fallback, sample_csv_path)
+        assert staged['extension'] == '.csv' and len(fallback.written) == 2
+
+
+class TestSharedDatasets:
+    """Tests pour le partage des datasets en memory map (Arrow IPC)"""
+
+    def test_readers_share_one_mapped_frame(self, sample_csv_path):
+        """Deux lecteurs du processus partagent les mêmes données, sans se voir modifier"""
+        import numpy as np
+        from dataset_handle import read_dataset
+
+        first, _ = read_dataset(sample_csv_path)
+        second, _ = read_dataset(sample_csv_path)
+
+        assert first is not second
+        assert np.shares_memory(first['age'].to_numpy(), second['age'].to_numpy())
+        assert not first['age'].to_numpy().flags.writeable  # vue sur le fichier mappé
+
+        first.loc[0, 'age'] = 99
+        assert second.loc[0, 'age'] == 25
+
+    def test_readers_get_writable_copies_without_copy_on_write(self, sample_csv_path, monkeypatch):
+        """Avant pandas 3 (pas de copy-on-write), chaque lecteur reçoit une copie modifiable"""
+        import numpy as np
+        import columnar_cache
+        from dataset_handle import read_dataset
+
+        monkeypatch.setattr(columnar_cache, 'COPY_ON_WRITE', False)
+
+        first, _ = read_dataset(sample_csv_path)
+        second, _ = read_dataset(sample_csv_path)
+
+        assert not np.shares_memory(first['age'].to_numpy(), second['age'].to_numpy())
+        first.loc[0, 'age'] = 99
+        assert second.loc[0, 'age'] == 25
+
+    def test_local_sandbox_maps_host_file(self, sample_csv_path):
+        """Une sandbox locale mappe le fichier Arrow de l'hôte au lieu d'en recevoir une copie"""
+        from dataset_handle import read_dataset
+        from dataset_staging import DatasetStager
+        from local_sandbox import LocalSandbox
+
+        read_dataset(sample_csv_path)
+
+        sandbox = LocalSandbox()
+        stager = DatasetStager()
+        staged = stager.stage(sandbox, sample_csv_path)
+
+        assert staged['extension'] == '.arrow' and not staged['remote_path'].startswith(sandbox.home_dir)
+        sandbox.run_code(stager.build_binding_code(staged) + "df.loc[0, 'salaire'] = 0\n")
+        assert sandbox.namespace['df']['salaire'].sum() == 150000
+        assert sandbox.namespace['_dataset_df']['salaire'].sum() == 180000
+        sandbox.kill()
+
+
+
+class TestStreamingProfiler:
+    """Tests pour le profilage en flux (fichiers plus gros que la RAM)"""
+
+    def test_chunked_profile_matches_full_analysis(self, tmp_path, monkeypatch):
+        """Lu par blocs de 2 lignes, un petit fichier donne les mêmes métadonnées"""
+        from week2_architect_agent import _analyze_csv_locally
+        from streaming_profiler import profile_file
+
+        csv_path = tmp_path / "mixte.csv"
+        pd.DataFrame({
+            'age': [25, 30, None, 40, 45],
+            'ville': ['Paris', 'Lyon', 'Paris', None, 'Paris'],
+            'note': [1.5, 2.5, 3.5, 4.5, 5.5]
+        }).to_csv(csv_path, index=False)
+
+        monkeypatch.setenv('STREAMING_PROFILE_THRESHOLD_MB', '1000')
+        expected = _analyze_csv_locally(str(csv_path))
+        streamed = profile_file(str(csv_path), chunksize=2)
+
+        assert streamed['dtypes'] == expected['dtypes']
+        assert streamed['missing_values'] == expected['missing_values']
+        assert streamed['basic_stats']['ville'] == expected['basic_stats']['ville']
+        for key, value in expected['basic_stats']['age'].items():
+            assert streamed['basic_stats']['age'][key] == pytest.approx(value)
+
+        monkeypatch.setenv('STREAMING_PROFILE_THRESHOLD_MB', '0')
+        assert _analyze_csv_locally(str(csv_path))['shape'] == expected['shape']
+
+    def test_sketches_are_mergeable_and_bounded(self):
+        """Fusionner deux moitiés équivaut à tout lire ; mémoire bornée, erreur faible"""
+        import numpy as np
+        from streaming_profiler import StreamingProfiler
+
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            'x': rng.normal(50, 10, 200_000),
+            'id': rng.integers(0, 10**9, 200_000).astype(str)
+        })
+
+        left, right = StreamingProfiler(), StreamingProfiler()
+        left.update(df.iloc[:100_000])
+        right.update(df.iloc[100_000:])
+        for col, profile in right.columns.items():
+            merged = left.columns[col]
+            merged.moments.merge(profile.moments)
+            merged.quantiles.merge(profile.quantiles)
+            merged.distinct.merge(profile.distinct)
+            merged.frequent.merge(profile.frequent)
+        left.rows += right.rows
+
+        stats = left.to_metadata({})['basic_stats']
+        assert stats['x']['mean'] == pytest.approx(df['x'].mean())
+        assert stats['x']['std'] == pytest.approx(df['x'].std())
+        assert stats['x']['median'] == pytest.approx(df['x'].median(), abs=0.5)
+        assert stats['id']['unique_count'] == pytest.approx(df['id'].nunique(), rel=0.03)
+        assert sum(len(level) for level in left.columns['x'].quantiles.levels) < 2000
+        assert len(left.columns['id'].frequent.counters) <= 1000
+
+
+
+class TestDataProfiler:
+    """Tests pour le profil vectorisé partagé (architecte, app, DataIntelligence)"""
+
+    def test_block_statistics_match_pandas(self):
+        """Un seul tri du bloc numérique donne les mêmes valeurs que describe() / nunique()"""
+        import numpy as np
+        from data_profiler import profile_dataframe
+
+        df = pd.DataFrame({
+            'age': [25, 30, None, 40, 45, 30],
+            'vide': [np.nan] * 6,
+            'score': pd.array([1, None, 3, 3, 2, 1], dtype='Int64'),
+            'ville': ['Paris', 'Lyon', 'Paris', None, 'Paris', 'Lyon']
+        })
+
+        profile = profile_dataframe(df)
+        described = df.describe().T
+
+        for col in ['age', 'vide', 'score']:
+            stats = profile.numeric_stats[col]
+            expected = described.loc[col]
+            for key, label in [('count', 'count'), ('mean', 'mean'), ('std', 'std'), ('min', 'min'),
+                               ('q25', '25%'), ('median', '50%'), ('q75', '75%'), ('max', 'max')]:
+                assert stats[key] == pytest.approx(expected[label], nan_ok=True)
+
+        assert profile.unique_counts == df.nunique().to_dict()
+        assert profile.missing == df.isna().sum().to_dict()
+        assert profile.categorical_columns == ['ville']
+        assert profile.top_values('ville').to_dict() == {'Paris': 3, 'Lyon': 2}
+
+    def test_data_intelligence_reuses_profile(self, monkeypatch):
+        """DataIntelligence lit le profil et ne détecte les variables numériques qu'une fois"""
+        from data_intelligence import DataIntelligence
+
+        df = pd.DataFrame({
+            'ID': range(100),
+            'Age': [1, 2, 3, 4, 5] * 20,
+            'Salaire': [30000 + i * 1000 for i in range(100)],
+            'Secteur': ['IT', 'Finance', 'Santé'] * 33 + ['IT']
+        })
+
+        calls = []
+        original = DataIntelligence._detect_numeric_vars
+        monkeypatch.setattr(DataIntelligence, '_detect_numeric_vars', lambda self: calls.append(1) or original(self))
+
+        analysis = DataIntelligence(df).analysis
+
+        assert len(calls) == 1
+        assert [v['name'] for v in analysis['numeric_vars']] == ['ID', 'Salaire']
+        assert analysis['encoded_vars'][0]['values'] == [1, 2, 3, 4, 5]
+        assert analysis['recommended_vars'] == {'numeric': ['Salaire'], 'categorical': ['Secteur']}
+        assert analysis['quality_issues']['duplicates'] == 0
+
+
+    def test_profile_computed_once_and_persisted(self, sample_csv_path, monkeypatch):
+        """Le profil calculé à l'upload est relu par l'architecte et le workflow, y compris après redémarrage"""
+        import data_profiler
+        import dataset_handle
+        from data_profiler import get_dataset_profile
+        from dataset_handle import DatasetHandle
+        from week2_architect_agent import _analyze_csv_locally
+
+        df = pd.read_csv(sample_csv_path)
+        uploaded = get_dataset_profile(sample_csv_path, df=df, encoding='utf-8')
+
+        monkeypatch.setattr(data_profiler, '_numeric_block_stats', lambda numeric: pytest.fail("dataset re-profilé"))
+        monkeypatch.setattr(dataset_handle, 'read_dataset', lambda path: pytest.fail("dataset relu"))
+        monkeypatch.setattr(data_profiler, '_profile_store', None)  # nouveau processus : relu depuis le disque
+
+        metadata = _analyze_csv_locally(sample_csv_path)
+        assert metadata['file_info']['encoding'] == 'utf-8'
+        assert metadata['basic_stats']['age']['median'] == 32.5
+        assert metadata['basic_stats']['ville']['unique_count'] == 4
+
+        dataset = DatasetHandle(sample_csv_path)
+        assert dataset.n_rows == 4 and dataset.schema()[2] == {'name': 'ville', 'dtype': 'str', 'example': 'Paris'}
+        assert dataset.profile().numeric_stats == uploaded.numeric_stats
+
+
+
+class TestProfilerPolicy:
+    """Tests pour le choix du profileur (local par défaut, sandbox selon la politique)"""
+
+    def test_local_by_default_with_timings(self, sample_csv_path, monkeypatch):
+        """Aucune sandbox n'est créée pour profiler ; le temps de chaque chemin est mesuré"""
+        import week2_architect_agent
+        from profiler_policy import profiling_metrics
+
+        monkeypatch.setattr(week2_architect_agent, '_analyze_csv_with_e2b', lambda path: pytest.fail("sandbox créée"))
+        profiling_metrics.reset()
+
+        first = week2_architect_agent.analyze_csv(sample_csv_path)
+        second = week2_architect_agent.analyze_csv(sample_csv_path)
+
+        assert first == second and first['shape']['rows'] == 4
+        stats = profiling_metrics.get_stats()
+        assert stats['local']['calls'] == 1 and stats['cached']['calls'] == 1
+        assert stats['sandbox']['calls'] == 0
+        assert stats['local']['total_seconds'] > 0
+
+    def test_sandbox_for_untrusted_format_or_size(self, sample_csv_path, monkeypatch):
+        """Extensions listées et fichiers au-delà du seuil vont en sandbox, si E2B est disponible"""
+        import profiler_policy
+        from profiler_policy import ProfilerPolicy
+
+        monkeypatch.setattr(profiler_policy, 'sandbox_available', lambda: True)
+        assert ProfilerPolicy().choose(sample_csv_path)[0] == 'local'
+        assert ProfilerPolicy(sandbox_extensions=['.CSV']).choose(sample_csv_path)[0] == 'sandbox'
+        assert ProfilerPolicy(sandbox_min_mb=0.00001).choose(sample_csv_path)[0] == 'sandbox'
+        assert ProfilerPolicy(backend='local', sandbox_extensions=['.csv']).choose(sample_csv_path)[0] == 'local'
+
+        monkeypatch.setattr(profiler_policy, 'sandbox_available', lambda: False)
+        path, reason = ProfilerPolicy(backend='sandbox').choose(sample_csv_path)
+        assert path == 'local' and 'indisponible' in reason
+
+
+
+class TestCsvDialect:
+    """Tests pour la détection d'encodage et de séparateur sur un échantillon"""
+
+    def test_sniff_encoding_separator_and_decimal(self, tmp_path):
+        """BOM, UTF-8 coupé en fin d'échantillon, Windows-1252, point-virgule et virgule décimale"""
+        from csv_dialect import sniff_csv
+
+        french = tmp_path / "excel_fr.csv"
+        french.write_bytes("ville;prix;note\nOrléans;12,5;3\nNîmes;8,75 ;4\nÉvry;100,0;5\n".encode('latin-1'))
+        assert sniff_csv(str(french)) == {'encoding': 'latin-1', 'sep': ';', 'decimal': ','}
+
+        euro = tmp_path / "euro.csv"
+        euro.write_bytes("produit\tprix\nœuf\t1.5 €\n".encode('windows-1252'))
+        assert sniff_csv(str(euro))['encoding'] == 'windows-1252'
+        assert sniff_csv(str(euro))['sep'] == '\t'
+
+        bom = tmp_path / "bom.csv"
+        bom.write_bytes("a,b\n1,2\n".encode('utf-8-sig'))
+        assert sniff_csv(str(bom)) == {'encoding': 'utf-8-sig', 'sep': ',', 'decimal': '.'}
+
+        cut = tmp_path / "cut.csv"
+        cut.write_bytes("ville,n\n".encode() + "é,1\n".encode() * 5000)
+        assert sniff_csv(str(cut), sample_size=8 + 3 * 1000 + 1)['encoding'] == 'utf-8'
+
+    def test_readers_receive_explicit_parameters(self, tmp_path, monkeypatch):
+        """Un seul read_csv, avec le dialecte détecté ; la sandbox reçoit les mêmes paramètres"""
+        import dataset_handle
+        from dataset_handle import parse_dataset
+        from dataset_staging import DatasetStager
+
+        csv_path = tmp_path / "excel_fr.csv"
+        csv_path.write_bytes("ville;prix\nOrléans;12,5\nNîmes;8,25\n".encode('latin-1'))
+
+        calls = []
+        read_csv = pd.read_csv
+        monkeypatch.setattr(dataset_handle.pd, 'read_csv', lambda *a, **kw: calls.append(kw) or read_csv(*a, **kw))
+        df, encoding = parse_dataset(str(csv_path))
+        monkeypatch.setattr(dataset_handle.pd, 'read_csv', read_csv)
+
+        assert calls == [{'encoding': 'latin-1', 'sep': ';', 'decimal': ','}]
+        assert encoding == 'latin-1' and df['prix'].sum() == pytest.approx(20.75)
+
+        monkeypatch.setenv('COLUMNAR_CACHE_ENABLED', 'false')
+        sandbox = FakeSandbox()
+        staged = DatasetStager().stage(sandbox, str(csv_path))
+        assert "encoding='latin-1', sep=';', decimal=','" in sandbox.executed[0]
+        assert staged['read_options']['sep'] == ';'
+
+
+class TestDatasetSampling:
+    """Tests pour l'échantillon persisté par dataset"""
+
+    def test_stratified_sample_from_chunks(self, tmp_path, monkeypatch):
+        """Tirage par blocs : taille, proportions des strates, ordre d'origine, persistance"""
+        import numpy as np
+        from dataset_sampling import DatasetSampler
+
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            'region': rng.choice(['Nord', 'Sud', 'Est'], 20000, p=[0.7, 0.28, 0.02]),
+            'valeur': np.arange(20000)
+        })
+        csv_path = tmp_path / "large.csv"
+        df.to_csv(csv_path, index=False)
+        monkeypatch.setenv('STREAMING_PROFILE_CHUNK_ROWS', '3000')
+
+        sampler = DatasetSampler(str(tmp_path / "samples"), sample_rows=500, method='stratified', stratify='region')
+        sample = sampler.sample(str(csv_path))
+
+        assert len(sample) == 500
+        counts = sample['region'].value_counts()
+        expected = df['region'].value_counts() / len(df) * 500
+        assert (counts - expected[counts.index]).abs().max() <= 1
+        assert sample.index.is_monotonic_increasing
+        assert (sample['valeur'] == sample.index).all()  # index = numéro de ligne du fichier
+
+        # Relu depuis le disque, sans relire les données
+        reread = DatasetSampler(str(tmp_path / "samples"), sample_rows=500, method='stratified', stratify='region')
+        monkeypatch.setattr(pd, 'read_csv', None)
+        pd.testing.assert_frame_equal(reread.sample(str(csv_path)), sample)
+
+    def test_missing_values_form_their_own_stratum(self, tmp_path):
+        """Les lignes sans valeur de stratification sont tirées en proportion"""
+        from dataset_sampling import StratifiedSampler
+
+        df = pd.DataFrame({'groupe': ['a', 'b', None, 'b'] * 2500, 'valeur': range(10000)})
+        sampler = StratifiedSampler(100, 'groupe', seed=1)
+        for start in range(0, len(df), 3000):
+            sampler.update(df.iloc[start:start + 3000])
+        sample = sampler.result()
+
+        assert len(sample) == 100
+        assert sample['groupe'].isna().sum() == 25
+        assert (sample['groupe'] == 'b').sum() == 50
+
+    def test_sample_file_depends_on_strata_column(self, tmp_path):
+        """Changer de colonne de stratification tire un nouvel échantillon"""
+        from dataset_sampling import DatasetSampler
+
+        csv_path = tmp_path / "data.csv"
+        pd.DataFrame({'a': ['x', 'y'] * 50, 'b': ['u'] * 90 + ['v'] * 10}).to_csv(csv_path, index=False)
+
+        by_a = DatasetSampler(str(tmp_path / "samples"), sample_rows=10, stratify='a')
+        by_b = DatasetSampler(str(tmp_path / "samples"), sample_rows=10, stratify='b')
+
+        assert by_a.sample_path(str(csv_path)) != by_b.sample_path(str(csv_path))
+        assert (by_a.sample(str(csv_path))['a'] == 'x').sum() == 5
+        assert by_b.sample(str(csv_path))['b'].value_counts().to_dict() == {'u': 8, 'v': 2}
+
+    def test_preview_mode_runs_on_sample_until_validation(self, local_workflow, monkeypatch):
+        """Blocs exécutés sur l'échantillon pendant la rédaction, sur les données complètes à la validation"""
+        import dataset_sampling
+
+        monkeypatch.setenv('DATASET_SAMPLE_ROWS', '2')
+        monkeypatch.setattr(dataset_sampling, '_dataset_sampler', None)
+        monkeypatch.setattr(local_workflow, '_prepare_chapter_prompt', lambda chapter: ("prompt", "default"))
+        monkeypatch.setattr(local_workflow, '_stream_with_ai', lambda prompt, task_type: iter([STREAMED_CHAPTER]))
+        local_workflow.preview_mode = True
+
+        result = local_workflow.generate_current_chapter()
+        chapter = result['chapter']
+
+        assert result['success'] and chapter.preview
+        assert "130" not in chapter.content
+        assert chapter.raw_content.count("```python") == 2
+
+        assert local_workflow.validate_chapter(chapter.number)
+        assert not chapter.preview
+        assert "130" in chapter.content and "180000" in chapter.content
+
+
+class TestDtypeOptimizer:
+    """Tests pour le typage compact des datasets (category, int32)"""
+
+    @pytest.fixture
+    def survey_csv_path(self, tmp_path):
+        survey = pd.DataFrame({
+            'region': ['Nord', 'Sud', 'Est', 'Ouest'] * 250,
+            'identifiant': [f"R{i:05d}" for i in range(1000)],
+            'score': list(range(1000)),
+            'mesure': [i / 3 for i in range(1000)]
+        })
+        csv_path = tmp_path / "enquete.csv"
+        survey.to_csv(csv_path, index=False)
+        return str(csv_path)
+
+    def test_typed_load_is_kept_by_columnar_copy(self, survey_csv_path, monkeypatch):
+        """Texte à peu de modalités en category, entiers en int32 ; la copie Parquet garde les types"""
+        import dataset_handle
+        from dataset_handle import read_dataset
+        from data_profiler import get_profile_store
+
+        monkeypatch.setenv('DTYPE_OPTIMIZATION', 'true')
+        df, _ = read_dataset(survey_csv_path)
+        assert str(df['region'].dtype) == 'category'
+        assert str(df['identifiant'].dtype) != 'category'  # identifiant : une modalité par ligne
+        assert str(df['score'].dtype) == 'int32' and str(df['mesure'].dtype) == 'float64'
+
+        # Le profil décrit le dataset chargé
+        schema = {column['name']: column['dtype'] for column in get_profile_store().lookup(survey_csv_path).schema()}
+        assert schema['region'] == 'category' and schema['score'] == 'int32'
+
+        monkeypatch.setattr(dataset_handle, 'parse_dataset', lambda path: pytest.fail("CSV re-parsé"))
+        reread, _ = read_dataset(survey_csv_path)
+        pd.testing.assert_frame_equal(reread, df)
+
+        original = pd.read_csv(survey_csv_path)
+        assert df['region'].memory_usage(deep=True) * 10 < original['region'].memory_usage(deep=True)
+
+    def test_sandbox_source_fallback_applies_dtypes(self, survey_csv_path, monkeypatch):
+        """Sans copie colonnaire, la sandbox applique les mêmes types au chargement ; désactivable"""
+        from dataset_handle import read_dataset
+        from dataset_staging import DatasetStager
+
+        monkeypatch.setenv('COLUMNAR_CACHE_ENABLED', 'false')
+        monkeypatch.setenv('DTYPE_OPTIMIZATION', 'true')
+        read_dataset(survey_csv_path)
+
+        sandbox = FakeSandbox()
+        DatasetStager().stage(sandbox, survey_csv_path)
+        assert ".astype({'region': 'category', 'score': 'int32'})" in sandbox.executed[0]
+
+        monkeypatch.setenv('DTYPE_OPTIMIZATION', 'false')
+        sandbox = FakeSandbox()
+        DatasetStager().stage(sandbox, survey_csv_path)
+        assert ".astype(" not in sandbox.executed[0]
+
+    def test_disabled_by_default_and_caches_keyed_by_typing(self, survey_csv_path, local_workflow, monkeypatch):
+        """Types d'origine par défaut ; copies, profil et résultats en cache ne passent pas d'un typage à l'autre"""
+        from dataset_handle import read_dataset
+        from data_profiler import get_profile_store
+
+        monkeypatch.setenv('DTYPE_OPTIMIZATION', 'true')
+        typed, _ = read_dataset(survey_csv_path)
+        typed_keys = local_workflow._compute_cache_keys(["print(df.dtypes)"], [[0]])
+        assert str(typed['region'].dtype) == 'category'
+
+        monkeypatch.delenv('DTYPE_OPTIMIZATION')
+        df, _ = read_dataset(survey_csv_path)
+        assert str(df['region'].dtype) != 'category' and str(df['score'].dtype) == 'int64'
+
+        schema = {column['name']: column['dtype'] for column in get_profile_store().get(survey_csv_path).schema()}
+        assert schema['region'] != 'category' and schema['score'] == 'int64'
+        assert local_workflow._compute_cache_keys(["print(df.dtypes)"], [[0]]) != typed_keys
+
+
 # Fixtures globales
+@pytest.fixture(autouse=True)
+def isolated_contextual_memory(monkeypatch, tmp_path):
+    """Mémoire contextuelle (chapitres validés) écrite dans un dossier temporaire, pas dans memory/"""
+    from contextual_memory import contextual_memory
+
+    storage_dir = tmp_path / "memory"
+    storage_dir.mkdir()
+    monkeypatch.setattr(contextual_memory, 'storage_dir', storage_dir)
+    monkeypatch.setattr(contextual_memory, 'memories', {})
+
+
+@pytest.fixture(autouse=True)
+def isolated_columnar_cache(monkeypatch, tmp_path):
+    """Copies Parquet, profils et échantillons écrits dans un dossier temporaire propre à chaque test"""
+    import columnar_cache
+    import data_profiler
+    import dataset_sampling
+
+    monkeypatch.setenv('COLUMNAR_CACHE_DIR', str(tmp_path / "columnar"))
+    monkeypatch.setattr(columnar_cache, '_columnar_cache', None)
+    monkeypatch.setenv('DATASET_PROFILE_DIR', str(tmp_path / "columnar"))
+    monkeypatch.setattr(data_profiler, '_profile_store', None)
+    monkeypatch.setenv('DATASET_SAMPLE_DIR', str(tmp_path / "columnar"))
+    monkeypatch.setattr(dataset_sampling, '_dataset_sampler', None)
+
+
 @pytest.fixture
 def sample_csv_path(tmp_path):
     """Crée un CSV temporaire pour les tests"""
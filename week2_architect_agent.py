@@ -11,9 +11,12 @@ VERSION AMÉLIORÉE avec :
 
 import os
 import json
+import logging
 from pathlib import Path
 from typing import Dict, Any, Optional, Union
 
+logger = logging.getLogger(__name__)
+
 
 # ═══════════════════════════════════════════════════════════════
 # IMPORT DES PROFILS (si disponibles)
@@ -43,17 +46,20 @@ def analyze_csv(csv_path: str) -> Dict[str, Any]:
         Dict contenant les métadonnées du fichier
     """
     
-    # Vérifier si E2B est disponible
-    try:
-        from e2b_code_interpreter import Sandbox
-        USE_E2B = True
-    except ImportError:
-        USE_E2B = False
+    # Local par défaut ; sandbox seulement si la politique l'exige (format, taille)
+    import time
+    from profiler_policy import select_profiler, profiling_metrics
     
-    if USE_E2B:
-        return _analyze_csv_with_e2b(csv_path)
-    else:
+    path, reason = select_profiler(csv_path)
+    logger.info(f"Profiling {Path(csv_path).name} on {path} path: {reason}")
+    
+    start = time.perf_counter()
+    try:
+        if path == 'sandbox':
+            return _analyze_csv_with_e2b(csv_path)
         return _analyze_csv_locally(csv_path)
+    finally:
+        profiling_metrics.record(path, time.perf_counter() - start)
 
 
 def _analyze_csv_locally(csv_path: str) -> Dict[str, Any]:
@@ -64,99 +70,57 @@ def _analyze_csv_locally(csv_path: str) -> Dict[str, Any]:
     file_path = Path(csv_path)
     file_extension = file_path.suffix.lower()
     
-    # Chargement avec gestion encodage
-    if file_extension == '.csv':
-        try:
-            df = pd.read_csv(file_path, encoding='utf-8')
-            encoding_used = 'utf-8'
-        except UnicodeDecodeError:
-            try:
-                df = pd.read_csv(file_path, encoding='latin-1')
-                encoding_used = 'latin-1'
-            except UnicodeDecodeError:
-                try:
-                    df = pd.read_csv(file_path, encoding='iso-8859-1')
-                    encoding_used = 'iso-8859-1'
-                except UnicodeDecodeError:
-                    df = pd.read_csv(file_path, encoding='windows-1252')
-                    encoding_used = 'windows-1252'
-    
-    elif file_extension in ['.xlsx', '.xls']:
-        df = pd.read_excel(file_path, engine='openpyxl' if file_extension == '.xlsx' else None)
-        encoding_used = 'excel'
-    
-    else:
-        raise ValueError(f"Format de fichier non supporté : {file_extension}")
-    
-    # Collecter les métadonnées
-    metadata = {
-        "file_info": {
-            "filename": file_path.name,
-            "extension": file_extension,
-            "encoding": encoding_used
-        },
-        "shape": {
-            "rows": int(df.shape[0]),
-            "columns": int(df.shape[1])
-        },
-        "columns": list(df.columns),
-        "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
-        "numeric_columns": list(df.select_dtypes(include=['number']).columns),
-        "categorical_columns": list(df.select_dtypes(include=['object', 'category']).columns),
-        "missing_values": {},
-        "basic_stats": {}
+    # Profil partagé du dataset : calculé une fois (à l'upload) et relu ensuite,
+    # sans recharger les données (copie Parquet et encodage gérés par read_dataset)
+    from data_profiler import get_dataset_profile, get_profile_store
+    from streaming_profiler import should_stream, profile_file
+    
+    profile = get_profile_store().lookup(csv_path)
+    if profile is None:
+        # Gros fichier jamais chargé : lecture par blocs et sketches (même format de métadonnées)
+        if should_stream(csv_path):
+            return profile_file(csv_path)
+        profile = get_dataset_profile(csv_path)
+    
+    file_info = {
+        "filename": file_path.name,
+        "extension": file_extension,
+        "encoding": profile.encoding
     }
+    if profile.csv_dialect:
+        file_info.update({"delimiter": profile.csv_dialect['sep'], "decimal": profile.csv_dialect['decimal']})
     
-    # Valeurs manquantes
-    for col in df.columns:
-        missing_count = df[col].isnull().sum()
-        metadata["missing_values"][col] = {
-            "count": int(missing_count),
-            "percentage": round((missing_count / len(df)) * 100, 2)
-        }
-    
-    # Statistiques numériques
-    for col in metadata["numeric_columns"]:
-        try:
-            col_data = df[col].dropna()
-            if len(col_data) > 0:
-                metadata["basic_stats"][col] = {
-                    "count": int(len(col_data)),
-                    "mean": float(col_data.mean()),
-                    "median": float(col_data.median()),
-                    "std": float(col_data.std()),
-                    "min": float(col_data.min()),
-                    "max": float(col_data.max()),
-                    "q25": float(col_data.quantile(0.25)),
-                    "q75": float(col_data.quantile(0.75))
-                }
-        except Exception as e:
-            print(f"Warning: Could not compute stats for {col}: {e}")
-    
-    # Statistiques catégorielles
-    for col in metadata["categorical_columns"]:
-        try:
-            value_counts = df[col].value_counts()
-            metadata["basic_stats"][col] = {
-                "unique_count": int(df[col].nunique()),
-                "most_common": {str(k): int(v) for k, v in value_counts.head(10).items()}
-            }
-        except Exception as e:
-            print(f"Warning: Could not compute stats for {col}: {e}")
-    
-    return metadata
+    return profile.to_metadata(file_info)
 
 
 def _analyze_csv_with_e2b(csv_path: str) -> Dict[str, Any]:
     """Analyse le CSV en utilisant E2B (sandbox isolé)"""
     from e2b_code_interpreter import Sandbox
     
-    with open(csv_path, 'rb') as f:
-        file_content = f.read()
-    
     file_path = Path(csv_path)
     file_extension = file_path.suffix.lower()
     
+    # La copie colonnaire (Parquet), si elle existe, est transférée à la place du fichier source
+    upload_path, upload_extension = csv_path, file_extension
+    try:
+        from columnar_cache import get_columnar_cache
+        columnar_cache = get_columnar_cache()
+        columnar_path = columnar_cache.lookup(csv_path) if columnar_cache else None
+        if columnar_path:
+            upload_path, upload_extension = columnar_path, '.parquet'
+    except ImportError:
+        pass
+    
+    with open(upload_path, 'rb') as f:
+        file_content = f.read()
+    
+    # Encodage / séparateur détectés sur l'hôte, passés explicitement au lecteur de la sandbox
+    csv_reader, csv_encoding = "None", None
+    if upload_extension == '.csv':
+        from csv_dialect import get_csv_dialect, read_csv_call
+        dialect = get_csv_dialect(csv_path)
+        csv_reader, csv_encoding = read_csv_call(f'/home/user/data{upload_extension}', dialect), dialect['encoding']
+    
     python_code = f"""
 import pandas as pd
 import numpy as np
@@ -168,17 +132,13 @@ def load_data_file(filepath):
     file_path = Path(filepath)
     file_extension = file_path.suffix.lower()
     
+    if file_extension == '.parquet':
+        import pyarrow.parquet as pq
+        metadata = pq.read_schema(filepath).metadata or {{}}
+        return pd.read_parquet(filepath), metadata.get(b'source_encoding', b'parquet').decode()
+    
     if file_extension == '.csv':
-        encodings = ['utf-8', 'latin-1', 'iso-8859-1', 'windows-1252', 'cp1252']
-        
-        for encoding in encodings:
-            try:
-                df = pd.read_csv(filepath, encoding=encoding)
-                return df, encoding
-            except (UnicodeDecodeError, Exception):
-                continue
-        
-        raise ValueError("Impossible de détecter l'encodage du fichier CSV")
+        return {csv_reader}, {csv_encoding!r}
     
     elif file_extension in ['.xlsx', '.xls']:
         try:
@@ -190,7 +150,7 @@ def load_data_file(filepath):
     else:
         raise ValueError(f"Format de fichier non supporté : {{file_extension}}")
 
-df, encoding_used = load_data_file('/home/user/data{file_extension}')
+df, encoding_used = load_data_file('/home/user/data{upload_extension}')
 
 metadata = {{
     "file_info": {{
@@ -249,7 +209,7 @@ print(json.dumps(metadata))
     
     try:
         sandbox = Sandbox()
-        sandbox.files.write(f'/home/user/data{file_extension}', file_content)
+        sandbox.files.write(f'/home/user/data{upload_extension}', file_content)
         execution = sandbox.run_code(python_code)
         
         if execution.error:
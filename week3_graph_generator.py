@@ -13,8 +13,8 @@ import base64
 from pathlib import Path
 from dotenv import load_dotenv
 from e2b_code_interpreter import Sandbox
-from google.genai import Client as GminiClient
-from langchain_anthropic import ChatAnthropic
+from llm_providers import get_provider
+from csv_dialect import get_csv_dialect, read_csv_call
 
 load_dotenv()
 
@@ -246,22 +246,8 @@ Retourne UNIQUEMENT le JSON, sans markdown ni explications.
         
         if gmini_key:
             try:
-                gclient = GminiClient(api_key=gmini_key)
-                chat = gclient.chats.create(model="gemini-2.5-flash")
-                gres = chat.send_message(prompt)
-                
-                gen = None
-                if hasattr(gres, "candidates") and gres.candidates:
-                    first = gres.candidates[0]
-                    if hasattr(first, "content"):
-                        gen = first.content
-                        if not isinstance(gen, str) and hasattr(gen, "parts"):
-                            parts = getattr(gen, "parts") or []
-                            texts = [getattr(p, "text", "") for p in parts if getattr(p, "text", None)]
-                            gen = "\n".join(texts).strip()
-                
-                if gen:
-                    viz_json = str(gen)
+                viz_json = get_provider("genai").generate(prompt, model="gemini-2.5-flash")
+                if viz_json:
                     print(f"   ✓ Réponse obtenue de Gemini (tentative {attempt + 1})")
             except Exception as e:
                 print(f"   ⚠️ Erreur Gemini: {e}")
@@ -269,13 +255,11 @@ Retourne UNIQUEMENT le JSON, sans markdown ni explications.
         # Fallback sur Anthropic
         if not viz_json:
             try:
-                llm = ChatAnthropic(
+                viz_json = get_provider("anthropic").generate(
+                    prompt,
                     model="claude-sonnet-4-20250514",
-                    api_key=os.getenv("ANTHROPIC_API_KEY"),
                     temperature=0.3
                 )
-                response = llm.invoke(prompt)
-                viz_json = response.content
                 print(f"   ✓ Réponse obtenue de Claude (tentative {attempt + 1})")
             except Exception as e:
                 print(f"   ⚠️ Erreur Anthropic: {e}")
@@ -381,7 +365,7 @@ except:
 sns.set_palette("husl")
 
 # Charger les données
-df = pd.read_csv('/home/user/data.csv')
+df = """ + read_csv_call('/home/user/data.csv', get_csv_dialect(csv_path)) + """
 print(f"Dataset charge: {df.shape[0]} lignes, {df.shape[1]} colonnes")
 """
         try:
@@ -546,7 +530,7 @@ def main():
         code = """
 import pandas as pd
 import json
-df = pd.read_csv('/home/user/data.csv')
+df = """ + read_csv_call('/home/user/data.csv', get_csv_dialect(csv_path)) + """
 metadata = {
     "shape": {"rows": int(df.shape[0]), "columns": int(df.shape[1])},
     "columns": list(df.columns),
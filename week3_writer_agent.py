@@ -9,8 +9,8 @@ import sys
 from pathlib import Path
 from dotenv import load_dotenv
 from e2b_code_interpreter import Sandbox
-from google.genai import Client as GminiClient
-from langchain_anthropic import ChatAnthropic
+from llm_providers import get_provider
+from csv_dialect import get_csv_dialect, read_csv_call
 
 load_dotenv()
 
@@ -58,7 +58,7 @@ def load_csv_metadata(csv_path: str) -> dict:
 import pandas as pd
 import json
 
-df = pd.read_csv('/home/user/data.csv')
+df = """ + read_csv_call('/home/user/data.csv', get_csv_dialect(csv_path)) + """
 
 metadata = {
     "shape": {"rows": int(df.shape[0]), "columns": int(df.shape[1])},
@@ -119,35 +119,18 @@ Code:
     
     if gmini_key:
         try:
-            gclient = GminiClient(api_key=gmini_key)
-            chat = gclient.chats.create(model="gemini-2.5-flash")
-            gres = chat.send_message(prompt)
-            
-            gen = None
-            if hasattr(gres, "candidates") and gres.candidates:
-                first = gres.candidates[0]
-                if hasattr(first, "content"):
-                    gen = first.content
-                    if not isinstance(gen, str) and hasattr(gen, "parts"):
-                        parts = getattr(gen, "parts") or []
-                        texts = [getattr(p, "text", "") for p in parts if getattr(p, "text", None)]
-                        gen = "\n".join(texts).strip()
-            
-            if gen:
-                code = str(gen)
+            code = get_provider("genai").generate(prompt, model="gemini-2.5-flash")
         except Exception as e:
             print(f"   ⚠️ Erreur Gemini: {e}")
     
     # Fallback Anthropic
     if not code:
         try:
-            llm = ChatAnthropic(
+            code = get_provider("anthropic").generate(
+                prompt,
                 model="claude-sonnet-4-20250514",
-                api_key=os.getenv("ANTHROPIC_API_KEY"),
                 temperature=0
             )
-            response = llm.invoke(prompt)
-            code = response.content
         except Exception as e:
             print(f"   ⚠️ Erreur Anthropic: {e}")
             return "print('Erreur: Impossible de générer le code')"
@@ -171,7 +154,7 @@ def execute_analysis(csv_path: str, code: str) -> str:
             sandbox.files.write("data.csv", f)
         
         # Setup
-        setup = "import pandas as pd\nimport numpy as np\ndf = pd.read_csv('/home/user/data.csv')"
+        setup = "import pandas as pd\nimport numpy as np\ndf = " + read_csv_call('/home/user/data.csv', get_csv_dialect(csv_path))
         sandbox.run_code(setup)
         
         # Exécuter l'analyse
@@ -235,35 +218,18 @@ Rédaction:
     
     if gmini_key:
         try:
-            gclient = GminiClient(api_key=gmini_key)
-            chat = gclient.chats.create(model="gemini-2.5-flash")
-            gres = chat.send_message(prompt)
-            
-            gen = None
-            if hasattr(gres, "candidates") and gres.candidates:
-                first = gres.candidates[0]
-                if hasattr(first, "content"):
-                    gen = first.content
-                    if not isinstance(gen, str) and hasattr(gen, "parts"):
-                        parts = getattr(gen, "parts") or []
-                        texts = [getattr(p, "text", "") for p in parts if getattr(p, "text", None)]
-                        gen = "\n".join(texts).strip()
-            
-            if gen:
-                text = str(gen)
+            text = get_provider("genai").generate(prompt, model="gemini-2.5-flash")
         except Exception as e:
             print(f"   ⚠️ Erreur Gemini: {e}")
     
     # Fallback Anthropic
     if not text:
         try:
-            llm = ChatAnthropic(
+            text = get_provider("anthropic").generate(
+                prompt,
                 model="claude-sonnet-4-20250514",
-                api_key=os.getenv("ANTHROPIC_API_KEY"),
                 temperature=0.7
             )
-            response = llm.invoke(prompt)
-            text = response.content
         except Exception as e:
             print(f"   ⚠️ Erreur Anthropic: {e}")
             text = f"## {section_info['titre']}\n\n[Erreur lors de la génération du texte]\n\nRésultats bruts:\n{analysis_results}"